@@ -1,5 +1,7 @@
 from .store import VectorDB
+from .sharded import ShardedVectorDB
+from .aio import AsyncVectorDB
 from .exceptions import NanoVecError, DimensionMismatchError
 
 __version__ = "0.1.0"
-__all__ = ["VectorDB", "NanoVecError", "DimensionMismatchError"]
+__all__ = ["VectorDB", "ShardedVectorDB", "AsyncVectorDB", "NanoVecError", "DimensionMismatchError"]
@@ -0,0 +1,145 @@
+import json
+import asyncio
+import logging
+import numpy as np
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .store import VectorDB
+from .exceptions import DimensionMismatchError
+
+logger = logging.getLogger(__name__)
+
+class AsyncVectorDB:
+    """
+    asyncio front-end for a ``VectorDB`` that never blocks the event loop.
+
+    All database work runs in an executor. Concurrent ``search`` calls are
+    micro-batched: queries arriving within ``max_wait_ms`` of the first
+    pending one (or until ``max_batch_size`` are pending) are scored with
+    one ``search_many`` call, i.e. one matrix multiply over the index, and
+    each caller receives its own results. Queries are batched together when
+    they share ``k`` and the filter.
+
+    Without an explicit executor, work runs on a single thread, which keeps
+    searches and writes ordered for a database that is not ``concurrent``;
+    for a ``concurrent`` database several threads are used.
+
+    Args:
+        db (VectorDB): The database to serve.
+        max_batch_size (int): Queries per batch at most; a full batch is dispatched at once.
+        max_wait_ms (float): How long the first query of a batch waits for more.
+        executor (Optional[Executor]): Where database calls run.
+    """
+    def __init__(self, db: VectorDB, max_batch_size: int = 64, max_wait_ms: float = 1.0,
+                 executor: Optional[Executor] = None):
+        if max_batch_size <= 0:
+            raise ValueError("max_batch_size must be a positive integer.")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must not be negative.")
+        self.db = db
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=None if db.concurrent else 1, thread_name_prefix="nanovec"
+        )
+        # Queries waiting for their batch: (query, future, (k, filter_meta))
+        self._pending: List[Tuple[np.ndarray, "asyncio.Future", Tuple[int, Optional[Dict[str, Any]]]]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.batches = 0
+        self.batched_queries = 0
+
+    async def _run(self, func, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # --- Search ----------------------------------------------------------
+
+    async def search(self, query_vector: List[float], k: int = 5,
+                     filter_meta: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Searches for one query as part of the next micro-batch; see ``VectorDB.search``."""
+        vec_np = np.array(query_vector, dtype=np.float32)
+        if vec_np.shape != (self.db.dimension,):
+            raise DimensionMismatchError(
+                f"Query dimension {vec_np.shape} != index dimension {self.db.dimension}"
+            )
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((vec_np, future, (k, filter_meta)))
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000.0, self._dispatch)
+        return await future
+
+    async def search_many(self, query_vectors: List[List[float]], k: int = 5,
+                          filter_meta: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """Searches an already batched set of queries; see ``VectorDB.search_many``."""
+        return await self._run(self.db.search_many, query_vectors, k, filter_meta)
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        groups: Dict[Tuple[int, str], list] = {}
+        for entry in pending:
+            k, filter_meta = entry[2]
+            key = (k, json.dumps(filter_meta, sort_keys=True, default=str) if filter_meta else "")
+            groups.setdefault(key, []).append(entry)
+        for group in groups.values():
+            task = asyncio.ensure_future(self._search_group(group))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _search_group(self, group: list):
+        k, filter_meta = group[0][2]
+        futures = [future for _, future, _ in group]
+        try:
+            results = await self._run(self.db.search_many, np.stack([query for query, _, _ in group]), k, filter_meta)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.batched_queries += len(group)
+        logger.debug(f"Searched a batch of {len(group)} queries.")
+        for future, result in zip(futures, results):
+            # A caller may have been cancelled while its batch ran
+            if not future.done():
+                future.set_result(result)
+
+    # --- Writes ----------------------------------------------------------
+
+    async def add(self, vector: List[float], metadata: Dict[str, Any] = {}) -> int:
+        """Adds a single vector; see ``VectorDB.add``."""
+        return await self._run(self.db.add, vector, metadata)
+
+    async def add_many(self, vectors: List[List[float]], metadata_list: List[Dict[str, Any]]) -> List[int]:
+        """Adds a batch of vectors; see ``VectorDB.add_many``."""
+        return await self._run(self.db.add_many, vectors, metadata_list)
+
+    async def delete(self, ids: Union[int, List[int]]) -> int:
+        """Deletes documents by ID; see ``VectorDB.delete``."""
+        return await self._run(self.db.delete, ids)
+
+    async def get(self, idx: int) -> Optional[Dict[str, Any]]:
+        """Retrieves the metadata of a document; see ``VectorDB.get``."""
+        return await self._run(self.db.get, idx)
+
+    async def close(self):
+        """Dispatches the pending queries, waits for them and releases the executor."""
+        if self._pending:
+            self._dispatch()
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    async def __aenter__(self) -> "AsyncVectorDB":
+        return self
+
+    async def __aexit__(self, *exc_info: Any):
+        await self.close()
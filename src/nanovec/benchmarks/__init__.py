@@ -0,0 +1,10 @@
+"""
+Benchmarks for NanoVec: latency, throughput, memory and recall per operation.
+
+Run ``python -m nanovec.benchmarks --help`` for the command line, or call
+``run_benchmark`` with a ``Dataset`` from ``synthetic`` or ``from_files``.
+"""
+from .datasets import Dataset, synthetic, from_files
+from .suite import run_benchmark, summarize, recall_at_k
+
+__all__ = ["Dataset", "synthetic", "from_files", "run_benchmark", "summarize", "recall_at_k"]
@@ -0,0 +1,78 @@
+"""Runs the NanoVec benchmark suite and prints (or writes) a report."""
+import sys
+import json
+import argparse
+import logging
+from typing import Any, Dict, List, Optional
+
+from .datasets import synthetic, from_files
+from .suite import run_benchmark
+
+def _index_param(text: str) -> tuple:
+    name, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Expected NAME=VALUE, got '{text}'")
+    try:
+        return name, json.loads(value)
+    except json.JSONDecodeError:
+        return name, value
+
+def _print_summary(report: Dict[str, Any]):
+    dataset, config = report["dataset"], report["config"]
+    print(f"{dataset['name']}: {dataset['vectors']} x {dataset['dimension']}, "
+          f"index={config['index']}, metric={config['metric']}, k={config['k']}")
+    print(f"{'operation':<16}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'qps':>12}{'recall':>8}{'alloc MiB':>11}")
+    for name, result in report["results"].items():
+        recall = f"{result['recall']:.3f}" if "recall" in result else "-"
+        alloc = f"{result['peak_alloc_mb']:.2f}" if result["peak_alloc_mb"] is not None else "-"
+        print(f"{name:<16}{result['count']:>8}{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}"
+              f"{result['qps']:>12.1f}{recall:>8}{alloc:>11}")
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(prog="python -m nanovec.benchmarks", description=__doc__)
+    data = parser.add_argument_group("dataset (synthetic unless --vectors is given)")
+    data.add_argument("--vectors", help=".npy/.npz file of vectors to benchmark with")
+    data.add_argument("--key", help="array to use from an .npz file")
+    data.add_argument("--queries", help=".npy/.npz file of queries (default: perturbed samples of the vectors)")
+    data.add_argument("--metadata", help="JSONL file with one metadata record per vector")
+    data.add_argument("--filter", type=json.loads, help="metadata filter for the filtered search, as JSON")
+    data.add_argument("--num-vectors", type=int, default=10_000, help="synthetic vectors")
+    data.add_argument("--dimension", type=int, default=128, help="synthetic dimension")
+    data.add_argument("--num-queries", type=int, default=200)
+    data.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--index", default="flat", help="flat, ivf or hnsw")
+    parser.add_argument("--metric", default="cosine")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1_000)
+    parser.add_argument("--single-adds", type=int, default=1_000, help="vectors added one at a time first")
+    parser.add_argument("--param", type=_index_param, action="append", default=[], metavar="NAME=VALUE",
+                        help="index option, e.g. --param M=32 (repeatable)")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the passes that trace peak allocations per operation")
+    parser.add_argument("--output", help="write the JSON report to this file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.vectors:
+        dataset = from_files(args.vectors, queries_path=args.queries, metadata_path=args.metadata,
+                             filter_meta=args.filter, num_queries=args.num_queries, key=args.key, seed=args.seed)
+    else:
+        dataset = synthetic(args.num_vectors, args.dimension, num_queries=args.num_queries, seed=args.seed)
+        if args.filter is not None:
+            dataset = dataset._replace(filter_meta=args.filter)
+
+    report = run_benchmark(dataset, index=args.index, metric=args.metric, k=args.k, batch_size=args.batch_size,
+                           single_adds=args.single_adds,
+                           measure_memory=not args.no_memory, **dict(args.param))
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        _print_summary(report)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+    return report
+
+if __name__ == "__main__":
+    main()
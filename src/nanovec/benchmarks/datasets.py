@@ -0,0 +1,67 @@
+import os
+import numpy as np
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+
+from ..ingest import open_vectors, iter_metadata
+
+class Dataset(NamedTuple):
+    """Vectors, their metadata and the queries to benchmark with."""
+    name: str
+    vectors: np.ndarray
+    queries: np.ndarray
+    metadata: List[Dict[str, Any]]
+    # Filter for the filtered-search benchmark (skipped if None)
+    filter_meta: Optional[Dict[str, Any]]
+
+def _sample_queries(vectors: np.ndarray, num_queries: int, rng: np.random.Generator) -> np.ndarray:
+    # Perturbed copies of stored vectors: realistic neighbourhoods, no exact hits
+    rows = rng.choice(vectors.shape[0], size=min(num_queries, vectors.shape[0]), replace=False)
+    base = np.asarray(vectors[np.sort(rows)], dtype=np.float32)
+    scale = 0.05 * float(np.linalg.norm(base, axis=1).mean()) / np.sqrt(base.shape[1])
+    return base + rng.normal(scale=scale, size=base.shape).astype(np.float32)
+
+def synthetic(num_vectors: int = 10_000, dimension: int = 128, num_queries: int = 200,
+              num_clusters: int = 64, num_categories: int = 10, seed: int = 0) -> Dataset:
+    """
+    Clustered Gaussian vectors with a ``category`` and ``year`` field each;
+    the filtered benchmark selects one category.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_clusters, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(num_clusters, size=num_vectors)]
+    vectors += 0.3 * rng.standard_normal((num_vectors, dimension)).astype(np.float32)
+    metadata = [{"category": i % num_categories, "year": 2000 + i % 25} for i in range(num_vectors)]
+    return Dataset(
+        name=f"synthetic-{num_vectors}x{dimension}",
+        vectors=vectors,
+        queries=_sample_queries(vectors, num_queries, rng),
+        metadata=metadata,
+        filter_meta={"category": 0},
+    )
+
+def from_files(vectors_path: Union[str, os.PathLike], queries_path: Optional[Union[str, os.PathLike]] = None,
+               metadata_path: Optional[Union[str, os.PathLike]] = None, filter_meta: Optional[Dict[str, Any]] = None,
+               num_queries: int = 200, key: Optional[str] = None, seed: int = 0) -> Dataset:
+    """
+    A user-supplied dataset: vectors from an .npy/.npz file (memory-mapped),
+    optional queries (else perturbed samples of the vectors) and optional
+    JSONL metadata, one record per vector.
+    """
+    vectors = open_vectors(vectors_path, key=key)
+    if queries_path is not None:
+        queries = np.asarray(open_vectors(queries_path), dtype=np.float32)
+    else:
+        queries = _sample_queries(vectors, num_queries, np.random.default_rng(seed))
+    if metadata_path is not None:
+        metadata = list(iter_metadata(metadata_path))
+        if len(metadata) != vectors.shape[0]:
+            raise ValueError(f"{metadata_path} has {len(metadata)} records for {vectors.shape[0]} vectors.")
+    else:
+        metadata = [{} for _ in range(vectors.shape[0])]
+    return Dataset(
+        name=os.path.basename(os.fspath(vectors_path)),
+        vectors=vectors,
+        queries=queries,
+        metadata=metadata,
+        filter_meta=filter_meta,
+    )
@@ -0,0 +1,193 @@
+import os
+import time
+import logging
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .. import __version__
+from ..store import VectorDB
+from .datasets import Dataset
+
+logger = logging.getLogger(__name__)
+
+# Version of the JSON report layout
+REPORT_VERSION = 1
+
+def _peak_alloc_mb(operation: Callable[[Any], Any], items: Iterable[Any]) -> float:
+    """
+    Peak memory allocated while running ``operation`` over ``items``, in MiB
+    above what was allocated before (traced by ``tracemalloc``, which counts
+    NumPy buffers but not memory-mapped files).
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if was_tracing:
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        for item in items:
+            operation(item)
+        return (tracemalloc.get_traced_memory()[1] - baseline) / (1024 * 1024)
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+def _timed(operation: Callable[[Any], Any], items: Iterable[Any]) -> List[float]:
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        operation(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def summarize(latencies: List[float], items: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Latency percentiles and throughput of a list of call durations (seconds).
+
+    ``qps`` is calls per second; ``items_per_second`` counts ``items`` (e.g.
+    vectors for batched calls) instead.
+    """
+    seconds = np.asarray(latencies, dtype=np.float64)
+    total = float(seconds.sum())
+    summary = {
+        "count": int(seconds.shape[0]),
+        "total_s": total,
+        "mean_ms": float(seconds.mean() * 1000.0) if seconds.shape[0] else 0.0,
+        "p50_ms": float(np.percentile(seconds, 50) * 1000.0) if seconds.shape[0] else 0.0,
+        "p99_ms": float(np.percentile(seconds, 99) * 1000.0) if seconds.shape[0] else 0.0,
+        "qps": seconds.shape[0] / total if total > 0 else 0.0,
+    }
+    if items is not None:
+        summary["items_per_second"] = items / total if total > 0 else 0.0
+    return summary
+
+def recall_at_k(results: List[List[int]], truth: List[List[int]]) -> float:
+    """Mean fraction of the exact top-k found, over queries with a non-empty ground truth."""
+    recalls = [len(set(found) & set(exact)) / len(exact) for found, exact in zip(results, truth) if exact]
+    return float(np.mean(recalls)) if recalls else 1.0
+
+def _ground_truth(dataset: Dataset, metric: str, k: int,
+                  filter_meta: Optional[Dict[str, Any]]) -> List[List[int]]:
+    exact = VectorDB(dataset.vectors.shape[1], metric=metric)
+    exact.ingest(dataset.vectors, metadata=dataset.metadata)
+    return [[r["id"] for r in results] for results in exact.search_many(dataset.queries, k=k, filter_meta=filter_meta)]
+
+def _search_benchmark(db: VectorDB, dataset: Dataset, k: int, filter_meta: Optional[Dict[str, Any]],
+                      truth: List[List[int]], measure_memory: bool) -> Dict[str, Any]:
+    found: List[List[int]] = []
+    search = lambda query: db.search(query, k=k, filter_meta=filter_meta)
+    summary = summarize(_timed(lambda query: found.append([r["id"] for r in search(query)]), dataset.queries))
+    summary["recall"] = recall_at_k(found, truth)
+
+    # Stage timings come from a second pass, so the timer does not slow the one above
+    db.reset_stats()
+    db.profiler.enabled = True
+    try:
+        for query in dataset.queries:
+            search(query)
+    finally:
+        db.profiler.enabled = False
+    summary["stages"] = db.stats()
+    summary["peak_alloc_mb"] = _peak_alloc_mb(search, dataset.queries) if measure_memory else None
+    return summary
+
+def _add_all(db: VectorDB, dataset: Dataset, single_adds: int, batch_size: int) -> Tuple[List[float], List[float]]:
+    # Latencies of the single adds and of the batches
+    vectors, metadata = dataset.vectors, dataset.metadata
+    adds = _timed(lambda i: db.add(np.asarray(vectors[i], dtype=np.float32), metadata[i]), range(single_adds))
+    batches = _timed(
+        lambda start: db.add_many(vectors[start:start + batch_size], metadata[start:start + batch_size]),
+        range(single_adds, vectors.shape[0], batch_size),
+    )
+    return adds, batches
+
+def run_benchmark(dataset: Dataset, index: str = "flat", metric: str = "cosine", k: int = 10,
+                  batch_size: int = 1_000, single_adds: int = 1_000, workdir: Optional[str] = None,
+                  measure_memory: bool = True, **index_params: Any) -> Dict[str, Any]:
+    """
+    Benchmarks one database configuration on a dataset.
+
+    Measures, in order: ``add`` (the first ``single_adds`` vectors one at a
+    time), ``add_many`` (the rest in batches of ``batch_size``), ``search``
+    and, if the dataset has a filter, ``search_filtered`` (one query per
+    call, recall@k against an exact flat search, per-stage timings),
+    ``save``, ``load`` and ``load_mmap``.
+
+    Latencies are timed with profiling and memory tracing off. Per-stage
+    timings and ``peak_alloc_mb`` (the peak memory allocated by the
+    operation) come from separate passes; for the adds that pass loads a
+    second database, which ``measure_memory=False`` skips.
+
+    Returns:
+        Dict[str, Any]: A JSON-serializable report: environment, dataset,
+        configuration and per-operation results.
+    """
+    num_vectors, dimension = dataset.vectors.shape
+    single_adds = min(single_adds, num_vectors)
+    make_db = lambda: VectorDB(dimension, metric=metric, index=index, **index_params)
+    results: Dict[str, Any] = {}
+
+    # Ground truth first, outside every measured region
+    truths = {"search": _ground_truth(dataset, metric, k, None)}
+    if dataset.filter_meta:
+        truths["search_filtered"] = _ground_truth(dataset, metric, k, dataset.filter_meta)
+
+    logger.info(f"Benchmarking {index}/{metric} on {dataset.name}")
+    db = make_db()
+    adds, batches = _add_all(db, dataset, single_adds, batch_size)
+    results["add"] = summarize(adds, items=single_adds)
+    results["add_many"] = summarize(batches, items=num_vectors - single_adds)
+    # Both add phases share one peak, measured by loading a throwaway database
+    results["add"]["peak_alloc_mb"] = results["add_many"]["peak_alloc_mb"] = (
+        _peak_alloc_mb(lambda _: _add_all(make_db(), dataset, single_adds, batch_size), [None])
+        if measure_memory else None
+    )
+
+    for name, truth in truths.items():
+        filter_meta = dataset.filter_meta if name == "search_filtered" else None
+        results[name] = _search_benchmark(db, dataset, k, filter_meta, truth, measure_memory)
+
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        path = os.path.join(tmp, "db")
+        operations = {
+            "save": (db.save, [path]),
+            "load": (lambda _: VectorDB.load(path), [None]),
+            "load_mmap": (lambda _: VectorDB.load(path, mmap=True), [None]),
+        }
+        for name, (operation, items) in operations.items():
+            results[name] = summarize(_timed(operation, items))
+            if name == "save":
+                results[name]["disk_mb"] = sum(
+                    os.path.getsize(os.path.join(root, file)) for root, _, files in os.walk(path) for file in files
+                ) / (1024 * 1024)
+            results[name]["peak_alloc_mb"] = _peak_alloc_mb(operation, items) if measure_memory else None
+
+    return {
+        "report_version": REPORT_VERSION,
+        "environment": {
+            "nanovec": __version__,
+            "numpy": np.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "dataset": {
+            "name": dataset.name,
+            "vectors": num_vectors,
+            "dimension": dimension,
+            "queries": int(dataset.queries.shape[0]),
+            "filter": dataset.filter_meta,
+        },
+        "config": {
+            "index": index,
+            "metric": metric,
+            "k": k,
+            "batch_size": batch_size,
+            "index_params": db.index.get_params(),
+        },
+        "results": results,
+    }
@@ -0,0 +1,103 @@
+import json
+import time
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+class QueryCache:
+    """
+    Bounded LRU cache of search results, with an optional time-to-live.
+
+    Entries are keyed on a digest of the query vector bytes, ``k`` and the
+    canonicalized filter, and tagged with the write generation of the
+    database they were computed from. A lookup under a newer generation
+    drops every entry, so results computed before a write are never served
+    after it.
+
+    Attributes:
+        max_entries (int): Capacity; the least recently used entry is evicted beyond it.
+        ttl (Optional[float]): Seconds an entry stays valid (forever if None).
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that had to search.
+        evictions (int): Entries dropped for capacity or age.
+        invalidations (int): Entries dropped because the database changed.
+    """
+    def __init__(self, max_entries: int, ttl: Optional[float] = None):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be a positive integer.")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive.")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(query: np.ndarray, k: int, filter_meta: Optional[Dict[str, Any]]) -> Hashable:
+        """The cache key of one query: equal vectors, ``k`` and filters give equal keys."""
+        digest = hashlib.blake2b(np.ascontiguousarray(query, dtype=np.float32).tobytes(), digest_size=16)
+        digest.update(str(query.shape).encode())
+        canonical = json.dumps(filter_meta, sort_keys=True, separators=(",", ":"), default=str) if filter_meta else ""
+        return digest.digest(), k, canonical
+
+    def _sync(self, generation: int):
+        # Callers hold the lock
+        if generation != self._generation:
+            if generation > self._generation:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+            self._generation = max(generation, self._generation)
+
+    def get(self, key: Hashable, generation: int) -> Optional[List[Dict[str, Any]]]:
+        """Returns a copy of the cached results, or None on a miss."""
+        with self._lock:
+            self._sync(generation)
+            entry = self._entries.get(key) if generation == self._generation else None
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return [dict(result) for result in entry[1]]
+
+    def put(self, key: Hashable, generation: int, results: List[Dict[str, Any]]):
+        """Stores results computed at ``generation``; results of an older generation are dropped."""
+        with self._lock:
+            self._sync(generation)
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic(), [dict(result) for result in results])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drops every entry; the counters are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """The counters and the current number of entries."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+            }
@@ -0,0 +1,45 @@
+import numpy as np
+
+# Points assigned per GEMM; bounds the (points x centroids) distance temporary.
+_ASSIGN_BLOCK_SIZE = 16384
+
+def nearest_centroids(points: np.ndarray, centroids: np.ndarray, n: int = 1,
+                      block_size: int = _ASSIGN_BLOCK_SIZE) -> np.ndarray:
+    """Returns the ``n`` nearest centroids (squared L2) of every point, closest first."""
+    centroid_sq_norms = np.einsum("ij,ij->i", centroids, centroids)
+    nearest = np.empty((points.shape[0], n), dtype=np.int64)
+    for start in range(0, points.shape[0], block_size):
+        block = points[start:start + block_size]
+        # Ranking by ||c||^2 - 2 p.c is equivalent to ranking by ||p - c||^2.
+        neg_dists = block @ centroids.T
+        neg_dists *= 2
+        neg_dists -= centroid_sq_norms
+        if n == 1:
+            nearest[start:start + block.shape[0], 0] = np.argmax(neg_dists, axis=1)
+            continue
+        if n < centroids.shape[0]:
+            top = np.argpartition(neg_dists, -n, axis=1)[:, -n:]
+        else:
+            top = np.broadcast_to(np.arange(centroids.shape[0]), neg_dists.shape)
+        order = np.argsort(-np.take_along_axis(neg_dists, top, axis=1), axis=1, kind="stable")
+        nearest[start:start + block.shape[0]] = np.take_along_axis(top, order, axis=1)
+    return nearest
+
+def kmeans(points: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Lloyd's k-means on ``points``, initialized from a random sample."""
+    centroids = points[rng.choice(points.shape[0], size=k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        labels = nearest_centroids(points, centroids)[:, 0]
+        counts = np.bincount(labels, minlength=k)
+        nonempty = counts > 0
+
+        # Sum the members of each cluster with one sorted reduceat pass.
+        order = np.argsort(labels, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+        sums = np.add.reduceat(points[order], offsets, axis=0)
+        centroids[nonempty] = sums / counts[nonempty, np.newaxis]
+        # Re-seed empty clusters with random points so every list stays usable.
+        empty = np.nonzero(~nonempty)[0]
+        if empty.size:
+            centroids[empty] = points[rng.choice(points.shape[0], size=empty.size, replace=False)]
+    return centroids
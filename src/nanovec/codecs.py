@@ -0,0 +1,194 @@
+import numpy as np
+import logging
+from typing import Any, Dict, Tuple
+
+from .clustering import kmeans, nearest_centroids
+from .exceptions import DimensionMismatchError, EmptyIndexError
+
+logger = logging.getLogger(__name__)
+
+class Float16Codec:
+    """
+    Half-precision storage: halves memory, near-lossless for normalized embeddings.
+    """
+    name = "float16"
+    dtype = np.float16
+    default_train_size = 0
+    min_train_size = 0
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.code_size = dimension
+
+    @property
+    def is_trained(self) -> bool:
+        return True
+
+    def get_params(self) -> Dict[str, Any]:
+        return {}
+
+    def state_arrays(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        pass
+
+    def train(self, vectors: np.ndarray):
+        pass
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors.astype(np.float16)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32)
+
+    def prepare(self, queries: np.ndarray) -> np.ndarray:
+        return queries
+
+    def dots(self, codes: np.ndarray, prepared: np.ndarray) -> np.ndarray:
+        # Upcast one block at a time; BLAS has no fast float16 path.
+        return prepared @ codes.astype(np.float32).T
+
+
+class ScalarQuantizer:
+    """
+    Per-dimension 8-bit scalar quantization (4x smaller than float32).
+
+    Each dimension is mapped linearly from its trained [min, max] range onto
+    0..255. Inner products are computed directly on the codes:
+    ``q.x ~= (q * scale).codes + q.min``.
+    """
+    name = "sq8"
+    dtype = np.uint8
+    default_train_size = 1024
+    min_train_size = 1
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.code_size = dimension
+        self.vmin = None
+        self.scale = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.vmin is not None
+
+    def get_params(self) -> Dict[str, Any]:
+        return {}
+
+    def state_arrays(self) -> Dict[str, np.ndarray]:
+        return {"sq_min": self.vmin, "sq_scale": self.scale}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        self.vmin = np.asarray(state["sq_min"], dtype=np.float32)
+        self.scale = np.asarray(state["sq_scale"], dtype=np.float32)
+
+    def train(self, vectors: np.ndarray):
+        if vectors.shape[0] == 0:
+            raise EmptyIndexError("Cannot train a scalar quantizer without vectors.")
+        self.vmin = vectors.min(axis=0).astype(np.float32)
+        span = vectors.max(axis=0).astype(np.float32) - self.vmin
+        # Constant dimensions get a unit scale so they encode to 0 exactly.
+        self.scale = np.where(span > 0, span / 255, 1).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((vectors - self.vmin) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) * self.scale + self.vmin
+
+    def prepare(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return queries * self.scale, (queries @ self.vmin)[:, np.newaxis]
+
+    def dots(self, codes: np.ndarray, prepared: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+        scaled_queries, offsets = prepared
+        dots = scaled_queries @ codes.astype(np.float32).T
+        dots += offsets
+        return dots
+
+
+class ProductQuantizer:
+    """
+    Product quantization (PQ) with asymmetric distance computation (ADC).
+
+    Vectors are split into ``pq_m`` sub-vectors, each replaced by the index of
+    its nearest centroid in a per-subspace codebook of 256 entries, so a
+    vector costs ``pq_m`` bytes. At query time a (pq_m, 256) lookup table of
+    sub-query/centroid inner products is built once, and a row's score is
+    the sum of ``pq_m`` table lookups.
+    """
+    name = "pq"
+    dtype = np.uint8
+    ksub = 256
+    default_train_size = 4096
+    min_train_size = ksub
+
+    def __init__(self, dimension: int, pq_m: int = 8):
+        if pq_m <= 0 or dimension % pq_m != 0:
+            raise DimensionMismatchError(
+                f"pq_m={pq_m} must be a positive divisor of dimension {dimension}"
+            )
+        self.dimension = dimension
+        self.m = pq_m
+        self.dsub = dimension // pq_m
+        self.code_size = pq_m
+        self.codebooks = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    def get_params(self) -> Dict[str, Any]:
+        return {"pq_m": self.m}
+
+    def state_arrays(self) -> Dict[str, np.ndarray]:
+        return {"pq_codebooks": self.codebooks}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        self.codebooks = np.asarray(state["pq_codebooks"], dtype=np.float32)
+
+    def train(self, vectors: np.ndarray, iterations: int = 20, seed: int = 0):
+        if vectors.shape[0] < self.min_train_size:
+            raise EmptyIndexError(
+                f"Need at least {self.min_train_size} vectors to train product quantization, have {vectors.shape[0]}"
+            )
+        rng = np.random.default_rng(seed)
+        subvectors = self._split(np.asarray(vectors, dtype=np.float32))
+        self.codebooks = np.stack([
+            kmeans(np.ascontiguousarray(subvectors[:, j]), self.ksub, iterations, rng)
+            for j in range(self.m)
+        ])
+        logger.info(f"Trained product quantizer: m={self.m} on {vectors.shape[0]} vectors.")
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors.reshape(vectors.shape[0], self.m, self.dsub)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        subvectors = self._split(np.asarray(vectors, dtype=np.float32))
+        codes = np.empty((vectors.shape[0], self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = nearest_centroids(np.ascontiguousarray(subvectors[:, j]), self.codebooks[j])[:, 0]
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = [self.codebooks[j][codes[:, j]] for j in range(self.m)]
+        return np.concatenate(parts, axis=1)
+
+    def prepare(self, queries: np.ndarray) -> np.ndarray:
+        # (Q, m, dsub) x (m, ksub, dsub) -> (Q, m, ksub) lookup tables
+        return np.einsum("qmd,mkd->qmk", self._split(queries), self.codebooks)
+
+    def dots(self, codes: np.ndarray, prepared: np.ndarray) -> np.ndarray:
+        dots = np.zeros((prepared.shape[0], codes.shape[0]), dtype=np.float32)
+        for j in range(self.m):
+            dots += prepared[:, j, codes[:, j]]
+        return dots
+
+
+# Storage codecs selectable with VectorIndex(codec=...). "float32" stores raw vectors.
+CODECS = {
+    "float16": Float16Codec,
+    "sq8": ScalarQuantizer,
+    "pq": ProductQuantizer,
+}
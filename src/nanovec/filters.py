@@ -0,0 +1,395 @@
+import os
+import json
+import bisect
+import logging
+import numpy as np
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# On-disk layout of a persisted MetadataIndex
+INDEX_FILE = "filter_index.json"
+POSTINGS_FILE = "filter_postings.npy"
+POSTING_OFFSETS_FILE = "filter_posting_offsets.npy"
+NUMERIC_FILE = "filter_numeric.npy"
+IDS_FILE = "filter_ids.npy"
+
+# Version of the persisted index; others are ignored and rebuilt.
+INDEX_FORMAT_VERSION = 1
+
+# Longest string value given a posting list
+MAX_INDEXED_LENGTH = 64
+
+# Comparison operators answered from the numeric columns
+RANGE_OPERATORS = {
+    "$gt": np.greater,
+    "$gte": np.greater_equal,
+    "$lt": np.less,
+    "$lte": np.less_equal,
+}
+
+_EMPTY_IDS = np.empty(0, dtype=np.int64)
+
+# A posting list: a read-only view of a loaded index, or an array once written to
+Posting = Union[np.ndarray, array]
+
+def _indexable(value: Any) -> bool:
+    # Scalars get posting lists; long strings, lists and dicts would make the
+    # index grow with the distinct values instead of the fields
+    if isinstance(value, str):
+        return len(value) <= MAX_INDEXED_LENGTH
+    return value is None or isinstance(value, (bool, int, float, np.integer, np.floating))
+
+def _posting_ids(posting: Posting) -> np.ndarray:
+    if isinstance(posting, np.ndarray):
+        return posting
+    # Copy: a live view would stop the array from growing on later appends
+    return np.frombuffer(posting, dtype=np.int64).copy()
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, np.integer, np.floating))
+
+def _union(parts: List[np.ndarray]) -> np.ndarray:
+    if not parts:
+        return _EMPTY_IDS
+    return parts[0] if len(parts) == 1 else np.unique(np.concatenate(parts))
+
+def _intersection(parts: List[np.ndarray]) -> np.ndarray:
+    # Smallest first keeps every intersect1d proportional to the rarest clause.
+    parts = sorted(parts, key=len)
+    result = parts[0]
+    for part in parts[1:]:
+        result = np.intersect1d(result, part, assume_unique=True)
+    return result
+
+class MetadataIndex:
+    """
+    Inverted index over metadata fields, used to evaluate filters before scoring.
+
+    Every (field, value) pair of a scalar value (None, a bool, a number or a
+    string of at most ``MAX_INDEXED_LENGTH`` characters) maps to a sorted
+    posting list of the IDs whose record holds that value, so equality and
+    ``$in`` clauses cost time proportional to the matches. Other values
+    (long strings, lists, dicts) only put the ID on a per-field list of
+    unindexed records; a clause on such a value reads those records through
+    ``lookup``. Numeric values are additionally kept in a dense float64
+    column per field (NaN where absent), which answers range clauses with
+    one vectorized comparison.
+
+    A loaded index keeps its posting lists and numeric columns memory-mapped;
+    a list or column is copied into memory only when a write changes it.
+
+    Filters follow the exact-match semantics of ``VectorDB.search``: a
+    ``{field: value}`` clause matches records whose field equals ``value``
+    (a missing field equals None). Supported operators:
+
+    - ``{field: {"$eq": v}}``, ``{"$ne": v}``, ``{"$in": [...]}``, ``{"$nin": [...]}``
+    - ``{field: {"$gt": x, "$lte": y}}`` (and ``$gte``/``$lt``) on numeric values
+    - ``{"$and": [filter, ...]}``, ``{"$or": [filter, ...]}``
+
+    Several clauses in one dict are combined with AND.
+
+    Args:
+        lookup (Callable[[int], Dict[str, Any]]): Returns the record stored under an ID.
+    """
+    def __init__(self, lookup: Callable[[int], Dict[str, Any]]):
+        self._lookup = lookup
+        self._postings: Dict[str, Dict[Any, Posting]] = {}
+        # field -> IDs whose value for the field has no posting list
+        self._unindexed: Dict[str, Posting] = {}
+        self._numeric: Dict[str, np.ndarray] = {}
+        self._present = np.zeros(0, dtype=bool)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple[int, Dict[str, Any]]],
+              lookup: Callable[[int], Dict[str, Any]]) -> "MetadataIndex":
+        """Indexes every (ID, record) pair of ``items``."""
+        index = cls(lookup)
+        for key, record in items:
+            index.add(key, record)
+        return index
+
+    def _ensure_capacity(self, key: int):
+        if key < self._present.shape[0]:
+            return
+        capacity = max(key + 1, 2 * self._present.shape[0], 16)
+        present = np.zeros(capacity, dtype=bool)
+        present[:self._present.shape[0]] = self._present
+        self._present = present
+        for field, column in self._numeric.items():
+            self._numeric[field] = self._grown_column(column, capacity)
+
+    @staticmethod
+    def _grown_column(column: np.ndarray, capacity: int) -> np.ndarray:
+        grown = np.full(capacity, np.nan)
+        grown[:column.shape[0]] = column
+        return grown
+
+    def _postings_of(self, field: str, value: Any) -> Tuple[Dict[Any, Posting], Any]:
+        # The dict holding the posting list of (field, value), and its key there
+        if _indexable(value):
+            return self._postings.setdefault(field, {}), value
+        return self._unindexed, field
+
+    @staticmethod
+    def _writable(postings: Dict[Any, Posting], key: Any) -> array:
+        posting = postings.get(key)
+        if posting is None:
+            posting = postings[key] = array("q")
+        elif isinstance(posting, np.ndarray):
+            posting = postings[key] = array("q", posting.tobytes())
+        return posting
+
+    def _writable_column(self, field: str) -> np.ndarray:
+        column = self._numeric.get(field)
+        if column is None:
+            column = self._numeric[field] = np.full(self._present.shape[0], np.nan)
+        elif not column.flags.writeable:
+            column = self._numeric[field] = np.array(column)
+        return column
+
+    def add(self, key: int, record: Dict[str, Any]):
+        """Indexes the record stored under ``key`` (which must not be indexed yet)."""
+        self._ensure_capacity(key)
+        self._present[key] = True
+        self._count += 1
+        for field, value in record.items():
+            posting = self._writable(*self._postings_of(field, value))
+            if not posting or posting[-1] < key:
+                posting.append(key)
+            else:
+                posting.insert(bisect.bisect_left(posting, key), key)
+            if _is_number(value):
+                self._writable_column(field)[key] = float(value)
+
+    def remove(self, key: int, record: Dict[str, Any]):
+        """Removes the record stored under ``key``, as it was indexed."""
+        self._present[key] = False
+        self._count -= 1
+        for field, value in record.items():
+            postings, posting_key = self._postings_of(field, value)
+            if posting_key not in postings:
+                continue
+            posting = self._writable(postings, posting_key)
+            pos = bisect.bisect_left(posting, key)
+            if pos < len(posting) and posting[pos] == key:
+                del posting[pos]
+            if not posting:
+                del postings[posting_key]
+            if _is_number(value):
+                self._writable_column(field)[key] = np.nan
+
+    # --- Evaluation ------------------------------------------------------
+
+    def all_ids(self) -> np.ndarray:
+        """Sorted IDs of every indexed record."""
+        return np.flatnonzero(self._present)
+
+    def select(self, filter_meta: Dict[str, Any]) -> np.ndarray:
+        """
+        Evaluates a filter.
+
+        Args:
+            filter_meta (Dict[str, Any]): The filter (see the class docstring).
+
+        Returns:
+            np.ndarray: The sorted IDs of the matching records.
+
+        Raises:
+            ValueError: If the filter uses an unknown operator or a malformed clause.
+        """
+        if not isinstance(filter_meta, dict):
+            raise ValueError(f"A filter must be a dict, got {type(filter_meta).__name__}")
+        parts = []
+        for field, condition in filter_meta.items():
+            if field in ("$and", "$or"):
+                if not isinstance(condition, list) or not condition:
+                    raise ValueError(f"'{field}' expects a non-empty list of filters")
+                selected = [self.select(clause) for clause in condition]
+                parts.append(_intersection(selected) if field == "$and" else _union(selected))
+            elif field.startswith("$"):
+                raise ValueError(f"Unknown filter operator '{field}'")
+            else:
+                parts.append(self._select_field(field, condition))
+        return _intersection(parts) if parts else self.all_ids()
+
+    @classmethod
+    def matches(cls, record: Dict[str, Any], filter_meta: Dict[str, Any]) -> bool:
+        """Whether one record matches a filter, with the semantics of ``select``."""
+        for field, condition in filter_meta.items():
+            if field == "$and":
+                if not all(cls.matches(record, clause) for clause in condition):
+                    return False
+            elif field == "$or":
+                if not any(cls.matches(record, clause) for clause in condition):
+                    return False
+            elif not cls._field_matches(record.get(field), condition):
+                return False
+        return True
+
+    @staticmethod
+    def _field_matches(value: Any, condition: Any) -> bool:
+        is_operator_dict = isinstance(condition, dict) and condition and all(
+            isinstance(op, str) and op.startswith("$") for op in condition
+        )
+        if not is_operator_dict:
+            return value == condition
+        for op, argument in condition.items():
+            if op == "$eq":
+                matched = value == argument
+            elif op == "$ne":
+                matched = value != argument
+            elif op in ("$in", "$nin"):
+                matched = any(value == candidate for candidate in argument) == (op == "$in")
+            else:
+                matched = _is_number(value) and bool(RANGE_OPERATORS[op](float(value), argument))
+            if not matched:
+                return False
+        return True
+
+    def _select_field(self, field: str, condition: Any) -> np.ndarray:
+        is_operator_dict = isinstance(condition, dict) and condition and all(
+            isinstance(op, str) and op.startswith("$") for op in condition
+        )
+        if not is_operator_dict:
+            return self._equal(field, condition)
+
+        parts = []
+        for op, argument in condition.items():
+            if op == "$eq":
+                parts.append(self._equal(field, argument))
+            elif op == "$ne":
+                parts.append(np.setdiff1d(self.all_ids(), self._equal(field, argument), assume_unique=True))
+            elif op in ("$in", "$nin"):
+                if not isinstance(argument, (list, tuple, set)):
+                    raise ValueError(f"'{op}' expects a list of values")
+                matches = _union([self._equal(field, value) for value in argument])
+                parts.append(matches if op == "$in" else np.setdiff1d(self.all_ids(), matches, assume_unique=True))
+            elif op in RANGE_OPERATORS:
+                if not _is_number(argument) or isinstance(argument, bool):
+                    raise ValueError(f"'{op}' expects a number, got {argument!r}")
+                column = self._numeric.get(field)
+                if column is None:
+                    parts.append(_EMPTY_IDS)
+                else:
+                    with np.errstate(invalid="ignore"):
+                        parts.append(np.flatnonzero(RANGE_OPERATORS[op](column, argument)))
+            else:
+                raise ValueError(f"Unknown filter operator '{op}'")
+        return _intersection(parts)
+
+    def _equal(self, field: str, value: Any) -> np.ndarray:
+        if value is None:
+            # A missing field compares equal to None
+            with_value = [
+                _posting_ids(posting)
+                for value_key, posting in self._postings.get(field, {}).items() if value_key is not None
+            ]
+            if field in self._unindexed:
+                with_value.append(_posting_ids(self._unindexed[field]))
+            return np.setdiff1d(self.all_ids(), _union(with_value), assume_unique=True)
+        if _indexable(value):
+            posting = self._postings.get(field, {}).get(value)
+            return _EMPTY_IDS if posting is None else _posting_ids(posting)
+        # Only records with an unindexed value for the field can match
+        candidates = self._unindexed.get(field)
+        if candidates is None:
+            return _EMPTY_IDS
+        matches = [key for key in _posting_ids(candidates).tolist() if self._lookup(key).get(field) == value]
+        return np.array(matches, dtype=np.int64)
+
+    # --- Persistence -----------------------------------------------------
+
+    def save(self, path: str, fingerprint: Dict[str, Any]):
+        """
+        Writes the index into directory ``path``.
+
+        Args:
+            path (str): The target directory.
+            fingerprint (Dict[str, Any]): Describes the records the index was
+                built from; ``load`` returns None if it no longer matches.
+        """
+        values: List[Tuple[str, Any]] = []
+        postings: List[np.ndarray] = []
+        for field, field_postings in self._postings.items():
+            for value_key, posting in field_postings.items():
+                values.append((field, value_key))
+                postings.append(_posting_ids(posting))
+        # The unindexed lists follow the value postings, in field order
+        unindexed_fields = list(self._unindexed)
+        postings.extend(_posting_ids(self._unindexed[field]) for field in unindexed_fields)
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([posting.shape[0] for posting in postings])
+        concatenated = np.concatenate(postings) if postings else _EMPTY_IDS
+        numeric_fields = list(self._numeric)
+        numeric = np.stack([self._numeric[field] for field in numeric_fields]) if numeric_fields else np.empty((0, 0))
+
+        arrays = (
+            (IDS_FILE, self.all_ids()),
+            (POSTINGS_FILE, concatenated),
+            (POSTING_OFFSETS_FILE, offsets),
+            (NUMERIC_FILE, numeric),
+        )
+        for name, data in arrays:
+            file_path = os.path.join(path, name)
+            with open(file_path + ".tmp", "wb") as f:
+                np.save(f, data)
+            os.replace(file_path + ".tmp", file_path)
+
+        # The description is written last and names the arrays above
+        header = {
+            "version": INDEX_FORMAT_VERSION,
+            "fingerprint": fingerprint,
+            "values": values,
+            "unindexed_fields": unindexed_fields,
+            "numeric_fields": numeric_fields,
+        }
+        index_path = os.path.join(path, INDEX_FILE)
+        with open(index_path + ".tmp", "w") as f:
+            json.dump(header, f)
+        os.replace(index_path + ".tmp", index_path)
+
+    @classmethod
+    def load(cls, path: str, fingerprint: Dict[str, Any],
+             lookup: Callable[[int], Dict[str, Any]]) -> Optional["MetadataIndex"]:
+        """
+        Opens an index written by ``save``, memory-mapping its posting lists
+        and numeric columns.
+
+        Returns:
+            Optional[MetadataIndex]: The index, or None if ``path`` has none, it
+            has another format version, or it was built from different records
+            than ``fingerprint`` describes.
+        """
+        index_path = os.path.join(path, INDEX_FILE)
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path, "r") as f:
+            header = json.load(f)
+        if header.get("version") != INDEX_FORMAT_VERSION or header.get("fingerprint") != fingerprint:
+            logger.info(f"Ignoring stale metadata index in {path}")
+            return None
+
+        concatenated = np.load(os.path.join(path, POSTINGS_FILE), mmap_mode="r")
+        offsets = np.load(os.path.join(path, POSTING_OFFSETS_FILE))
+        numeric = np.load(os.path.join(path, NUMERIC_FILE), mmap_mode="r")
+        ids = np.load(os.path.join(path, IDS_FILE))
+
+        index = cls(lookup)
+        capacity = max(int(ids[-1]) + 1 if ids.shape[0] else 0, numeric.shape[-1])
+        index._present = np.zeros(capacity, dtype=bool)
+        index._present[ids] = True
+        index._count = int(ids.shape[0])
+        values = header["values"]
+        for i, (field, value) in enumerate(values):
+            index._postings.setdefault(field, {})[value] = concatenated[offsets[i]:offsets[i + 1]]
+        for i, field in enumerate(header["unindexed_fields"], start=len(values)):
+            index._unindexed[field] = concatenated[offsets[i]:offsets[i + 1]]
+        for field, column in zip(header["numeric_fields"], numeric):
+            index._numeric[field] = column if column.shape[0] == capacity else index._grown_column(column, capacity)
+        return index
@@ -0,0 +1,393 @@
+import heapq
+import math
+import numpy as np
+import logging
+from typing import Any, Dict, List, Tuple, Optional
+
+from .index import VectorIndex, DEFAULT_BLOCK_SIZE, _row_sq_norms
+
+logger = logging.getLogger(__name__)
+
+# Growth policy of the upper-layer adjacency arena (rows of M neighbors).
+_MIN_UPPER_ROWS = 16
+
+# Filters matching at most this fraction of the nodes are searched by
+# exact subset scoring instead of a masked graph walk.
+_SUBSET_WALK_FRACTION = 0.1
+
+class HNSWIndex(VectorIndex):
+    """
+    Hierarchical Navigable Small World (HNSW) graph index.
+
+    Every vector is a node in a layered proximity graph; a query greedily
+    descends the sparse upper layers and then runs a best-first search of
+    width ``ef_search`` on the dense bottom layer, scoring only the nodes
+    it visits.
+
+    Adjacency is kept in flat NumPy arrays rather than per-node objects:
+    layer 0 is a (capacity, 2*M) int32 matrix, and the upper layers of a node
+    occupy consecutive rows of a shared (rows, M) matrix starting at
+    ``upper_offset[node]``. Unused slots hold -1.
+
+    A ``snapshot()`` shares the adjacency arrays with the live index: an
+    insert rewrites whole neighbor rows in single assignments, and a
+    snapshot's walk skips nodes added after it was taken.
+
+    Attributes:
+        M (int): Maximum neighbors per node on the upper layers (2*M on layer 0).
+        ef_construction (int): Candidate list size used while inserting.
+        ef_search (int): Candidate list size used while searching.
+    """
+    index_type = "hnsw"
+
+    def __init__(self, dimension: int, metric: str = "cosine", M: int = 16, ef_construction: int = 200,
+                 ef_search: int = 50, seed: int = 0, block_size: int = DEFAULT_BLOCK_SIZE,
+                 **storage_params: Any):
+        super().__init__(dimension, metric=metric, block_size=block_size, **storage_params)
+        if M < 2 or ef_construction <= 0 or ef_search <= 0:
+            raise ValueError("M must be >= 2 and ef_construction/ef_search must be positive.")
+
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.seed = seed
+        self._level_mult = 1 / math.log(M)
+        self._rng = np.random.default_rng(seed)
+        self._reset_graph()
+
+    def _reset_graph(self):
+        capacity = self.capacity
+        self._levels = np.zeros(capacity, dtype=np.int8)
+        self._neighbors0 = np.full((capacity, 2 * self.M), -1, dtype=np.int32)
+        self._upper_offset = np.full(capacity, -1, dtype=np.int64)
+        self._upper = np.full((0, self.M), -1, dtype=np.int32)
+        self._upper_rows = 0
+        self.entry_point = -1
+        self.max_level = -1
+
+    def get_params(self) -> Dict[str, Any]:
+        params = super().get_params()
+        params.update({
+            "M": self.M,
+            "ef_construction": self.ef_construction,
+            "ef_search": self.ef_search,
+            "seed": self.seed,
+        })
+        return params
+
+    def state_arrays(self) -> Dict[str, np.ndarray]:
+        state = super().state_arrays()
+        state.update({
+            "hnsw_levels": self._levels[:self._size],
+            "hnsw_neighbors0": self._neighbors0[:self._size],
+            "hnsw_upper_offset": self._upper_offset[:self._size],
+            "hnsw_upper": self._upper[:self._upper_rows],
+            "hnsw_entry": np.array([self.entry_point, self.max_level], dtype=np.int64),
+        })
+        return state
+
+    def restore(self, vectors: Optional[np.ndarray], sq_norms: Optional[np.ndarray] = None,
+                state: Optional[Dict[str, np.ndarray]] = None):
+        if not state or "hnsw_neighbors0" not in state:
+            self.set_vectors(vectors, sq_norms=sq_norms)
+            return
+        self._restore_storage(vectors, sq_norms, state)
+        # Arrays may be read-only memory maps; _insert copies them on first write.
+        self._levels = np.asarray(state["hnsw_levels"], dtype=np.int8)
+        self._neighbors0 = np.asarray(state["hnsw_neighbors0"], dtype=np.int32)
+        self._upper_offset = np.asarray(state["hnsw_upper_offset"], dtype=np.int64)
+        self._upper = np.asarray(state["hnsw_upper"], dtype=np.int32)
+        self._upper_rows = self._upper.shape[0]
+        self.entry_point, self.max_level = (int(x) for x in state["hnsw_entry"])
+
+    def set_vectors(self, vectors: np.ndarray, sq_norms: Optional[np.ndarray] = None):
+        """Replaces the contents of the index and rebuilds the graph."""
+        super().set_vectors(vectors, sq_norms=sq_norms)
+        self._reset_graph()
+        for node in range(self._size):
+            self._insert(node)
+
+    def keep_rows(self, rows: np.ndarray):
+        """
+        Keeps only ``rows`` and renumbers the graph instead of rebuilding it.
+
+        The adjacency rows of the kept nodes are gathered and remapped, which
+        drops the edges to removed nodes. Every node that lost a neighbor is
+        then reconnected to the best of its remaining neighbors and of the
+        removed neighbors' own neighbors, so only the affected nodes are rescored.
+        """
+        old_size = self._size
+        # Old node -> new node; the extra last entry maps the -1 padding to itself
+        remap = np.full(old_size + 1, -1, dtype=np.int32)
+        remap[rows] = np.arange(rows.shape[0], dtype=np.int32)
+        removed = np.ones(old_size + 1, dtype=bool)
+        removed[rows] = False
+        removed[-1] = False
+
+        old_neighbors0 = self._neighbors0[:old_size]
+        old_offset = self._upper_offset[:old_size]
+        old_upper = self._upper[:self._upper_rows]
+        levels = self._levels[rows]
+        counts = levels.astype(np.int64)
+        starts = np.cumsum(counts) - counts
+        upper_offset = np.where(counts > 0, starts, -1)
+        # Old upper row of every new upper row, and the (node, level) owning it
+        owners = np.repeat(np.arange(rows.shape[0]), counts)
+        row_levels = np.arange(int(counts.sum())) - starts[owners] + 1
+        gather = old_offset[rows][owners] + row_levels - 1
+
+        # (new node, level, removed old neighbors) of every row that lost an edge
+        damaged: List[Tuple[int, int, np.ndarray]] = []
+        kept0 = old_neighbors0[rows]
+        for node in np.flatnonzero(removed[kept0].any(axis=1)).tolist():
+            damaged.append((node, 0, kept0[node][removed[kept0[node]]]))
+        kept_upper = old_upper[gather]
+        for row in np.flatnonzero(removed[kept_upper].any(axis=1)).tolist():
+            damaged.append((int(owners[row]), int(row_levels[row]), kept_upper[row][removed[kept_upper[row]]]))
+        lost_lists = {
+            (int(lost), level): (old_neighbors0[lost] if level == 0 else old_upper[old_offset[lost] + level - 1])
+            for _, level, lost_nodes in damaged for lost in lost_nodes.tolist()
+        }
+
+        super().keep_rows(rows)
+        self._levels = levels
+        self._neighbors0 = remap[kept0]
+        self._upper_offset = upper_offset
+        self._upper = remap[kept_upper]
+        self._upper_rows = self._upper.shape[0]
+        if self._size == 0:
+            self.entry_point, self.max_level = -1, -1
+        elif removed[self.entry_point]:
+            self.entry_point = int(np.argmax(levels))
+            self.max_level = int(levels[self.entry_point])
+        else:
+            self.entry_point = int(remap[self.entry_point])
+
+        for node, level, lost_nodes in damaged:
+            self._repair(node, level, [remap[lost_lists[(int(lost), level)]] for lost in lost_nodes.tolist()])
+        logger.debug(f"Repaired {len(damaged)} adjacency lists after removing {old_size - self._size} nodes")
+
+    def _repair(self, node: int, level: int, replacements: List[np.ndarray]):
+        """Refills the neighbors of ``node`` on ``level`` from its own and ``replacements``."""
+        pool = np.unique(np.concatenate([self._neighbors(node, level), *replacements]))
+        pool = pool[(pool >= 0) & (pool != node)].astype(np.int64)
+        if pool.shape[0] == 0:
+            return
+        scores = self._score_nodes(*self._node_query(node), pool)
+        order = np.argsort(-scores, kind="stable")
+        ranked = [(float(scores[i]), int(pool[i])) for i in order]
+        self._set_neighbors(node, level, self._select_neighbors(ranked, 2 * self.M if level == 0 else self.M))
+
+    def _reallocate(self, capacity: int):
+        super()._reallocate(capacity)
+        size = self._size
+        levels = np.zeros(capacity, dtype=np.int8)
+        levels[:size] = self._levels[:size]
+        neighbors0 = np.full((capacity, 2 * self.M), -1, dtype=np.int32)
+        neighbors0[:size] = self._neighbors0[:size]
+        upper_offset = np.full(capacity, -1, dtype=np.int64)
+        upper_offset[:size] = self._upper_offset[:size]
+        self._levels, self._neighbors0, self._upper_offset = levels, neighbors0, upper_offset
+
+    def add(self, vector: np.ndarray) -> int:
+        idx = super().add(vector)
+        self._insert(idx)
+        return idx
+
+    def add_many(self, vectors: np.ndarray) -> List[int]:
+        indices = super().add_many(vectors)
+        for idx in indices:
+            self._insert(idx)
+        return indices
+
+    # --- Graph storage -------------------------------------------------
+
+    def _neighbors(self, node: int, level: int) -> np.ndarray:
+        if level == 0:
+            row = self._neighbors0[node]
+        else:
+            row = self._upper[self._upper_offset[node] + level - 1]
+        return row[(row >= 0) & (row < self._size)]
+
+    def _set_neighbors(self, node: int, level: int, neighbors: np.ndarray):
+        row = self._neighbors0[node] if level == 0 else self._upper[self._upper_offset[node] + level - 1]
+        # One assignment, so a concurrent snapshot walk never sees a half-written row
+        padded = np.full(row.shape[0], -1, dtype=np.int32)
+        padded[:len(neighbors)] = neighbors
+        row[:] = padded
+
+    def _allocate_upper(self, node: int, level: int):
+        if level == 0:
+            return
+        needed = self._upper_rows + level
+        if needed > self._upper.shape[0]:
+            upper = np.full((max(needed, 2 * self._upper.shape[0], _MIN_UPPER_ROWS), self.M), -1, dtype=np.int32)
+            upper[:self._upper_rows] = self._upper[:self._upper_rows]
+            self._upper = upper
+        self._upper_offset[node] = self._upper_rows
+        self._upper_rows = needed
+
+    # --- Scoring ---------------------------------------------------------
+
+    def _node_query(self, node: int) -> Tuple[Any, float]:
+        """A node's own vector, prepared for scoring as a query."""
+        vector = self._row_vectors(np.array([node]))
+        return self._prepare(vector), float(self._sq_norms[node])
+
+    def _score_nodes(self, prepared: Any, query_sq_norm: float, nodes: np.ndarray) -> np.ndarray:
+        dots = self._gather_dots(prepared, nodes)[0]
+        return self._scores_from_dots(dots, self._norms[nodes], self._sq_norms[nodes], query_sq_norm)
+
+    def _search_layer(self, prepared: Any, query_sq_norm: float, entry_points: List[Tuple[float, int]],
+                      ef: int, level: int, mask: Optional[np.ndarray] = None) -> List[Tuple[float, int]]:
+        """
+        Best-first search of one layer.
+
+        Args:
+            entry_points: (score, node) pairs to start from.
+            mask: If given, nodes where it is False are traversed but never returned.
+
+        Returns:
+            List[Tuple[float, int]]: Up to ``ef`` (score, node) pairs, best first.
+        """
+        visited = {node for _, node in entry_points}
+        candidates = [(-score, node) for score, node in entry_points]
+        heapq.heapify(candidates)
+        results = [entry for entry in entry_points if mask is None or mask[entry[1]]]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            neg_score, node = heapq.heappop(candidates)
+            if len(results) >= ef and -neg_score < results[0][0]:
+                break
+            neighbors = [n for n in self._neighbors(node, level).tolist() if n not in visited]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            scores = self._score_nodes(prepared, query_sq_norm, np.array(neighbors, dtype=np.int64))
+            for neighbor, score in zip(neighbors, scores.tolist()):
+                if len(results) < ef or score > results[0][0]:
+                    heapq.heappush(candidates, (-score, neighbor))
+                    if mask is not None and not mask[neighbor]:
+                        continue
+                    heapq.heappush(results, (score, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+
+        return sorted(results, reverse=True)
+
+    def _select_neighbors(self, candidates: List[Tuple[float, int]], m: int) -> np.ndarray:
+        """
+        Neighbor selection heuristic: walk candidates best first and keep one
+        only if it is closer to the base node than to every neighbor kept so
+        far, which keeps the graph connected across clusters.
+        """
+        if len(candidates) <= m:
+            return np.array([node for _, node in candidates], dtype=np.int32)
+
+        nodes = np.array([node for _, node in candidates], dtype=np.int64)
+        base_scores = np.array([score for score, _ in candidates], dtype=np.float32)
+        vectors = self._row_vectors(nodes)
+        pairwise = self._scores_from_dots(
+            vectors @ vectors.T, self._norms[nodes], self._sq_norms[nodes], self._sq_norms[nodes][:, np.newaxis]
+        )
+
+        selected: List[int] = []
+        for i in range(len(nodes)):
+            if all(pairwise[i, j] < base_scores[i] for j in selected):
+                selected.append(i)
+                if len(selected) == m:
+                    break
+        return nodes[selected].astype(np.int32)
+
+    # --- Insertion -------------------------------------------------------
+
+    def _ensure_writable_graph(self):
+        # Inserts rewrite the adjacency rows of existing nodes in place.
+        if not self._upper.flags.writeable:
+            self._upper = np.array(self._upper)
+        if not self._neighbors0.flags.writeable:
+            self._levels = np.array(self._levels)
+            self._neighbors0 = np.array(self._neighbors0)
+            self._upper_offset = np.array(self._upper_offset)
+
+    def _insert(self, node: int):
+        self._ensure_writable_graph()
+        level = int(-math.log(1.0 - self._rng.random()) * self._level_mult)
+        self._levels[node] = level
+        self._allocate_upper(node, level)
+
+        if self.entry_point < 0:
+            self.entry_point, self.max_level = node, level
+            return
+
+        prepared, query_sq_norm = self._node_query(node)
+        entry = self._entry_points(prepared, query_sq_norm, level)
+
+        for lc in range(min(level, self.max_level), -1, -1):
+            found = self._search_layer(prepared, query_sq_norm, entry, self.ef_construction, lc)
+            max_degree = 2 * self.M if lc == 0 else self.M
+            neighbors = self._select_neighbors(found, self.M)
+            self._set_neighbors(node, lc, neighbors)
+
+            for neighbor in neighbors.tolist():
+                current = self._neighbors(neighbor, lc)
+                if current.shape[0] < max_degree:
+                    self._set_neighbors(neighbor, lc, np.append(current, node))
+                    continue
+                # Full: re-select among the old neighbors plus the new node.
+                pool = np.append(current, node).astype(np.int64)
+                scores = self._score_nodes(*self._node_query(neighbor), pool)
+                order = np.argsort(-scores, kind="stable")
+                ranked = [(float(scores[i]), int(pool[i])) for i in order]
+                self._set_neighbors(neighbor, lc, self._select_neighbors(ranked, max_degree))
+            entry = found
+
+        if level > self.max_level:
+            self.entry_point, self.max_level = node, level
+
+    def _entry_points(self, prepared: Any, query_sq_norm: float, level: int) -> List[Tuple[float, int]]:
+        """Greedy descent from the top layer down to ``level + 1``."""
+        entry_score = float(self._score_nodes(prepared, query_sq_norm, np.array([self.entry_point]))[0])
+        entry = [(entry_score, self.entry_point)]
+        for lc in range(self.max_level, level, -1):
+            entry = self._search_layer(prepared, query_sq_norm, entry, 1, lc)
+        return entry
+
+    # --- Search ----------------------------------------------------------
+
+    def max_subset_rows(self) -> int:
+        # A masked walk visits roughly 1/selectivity times more nodes, so
+        # exact subset scoring wins for all but permissive filters.
+        return max(int(self._size * _SUBSET_WALK_FRACTION), self.ef_search * 2 * self.M)
+
+    def search_many(self, query_vectors: np.ndarray, k: int = 5,
+                    mask: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Searches several queries by walking the graph with ``max(ef_search, k)`` candidates.
+
+        With a ``mask`` (and for tombstoned nodes) the walk still passes
+        through excluded nodes, but only allowed nodes are collected as results.
+        """
+        query_vectors = self._check_queries(query_vectors)
+        if self._size == 0:
+            return [[] for _ in range(query_vectors.shape[0])]
+
+        mask = self._live_mask(mask)
+        query_sq_norms = _row_sq_norms(query_vectors)
+
+        results = []
+        fetch_k = self._fetch_k(k)
+        for query, query_sq_norm in zip(query_vectors, query_sq_norms):
+            with self.profiler.stage("graph"):
+                prepared = self._prepare(query[np.newaxis, :])
+                entry = self._entry_points(prepared, query_sq_norm, 0)
+                found = self._search_layer(prepared, query_sq_norm, entry, max(self.ef_search, fetch_k), 0, mask=mask)[:fetch_k]
+            indices = np.array([node for _, node in found], dtype=np.int64)
+            scores = np.array([score for score, _ in found], dtype=np.float32)
+            with self.profiler.stage("rerank"):
+                indices, scores = self._rerank(query, query_sq_norm, indices, scores, k)
+                results.append(self._to_results(indices, scores, query_sq_norm))
+        return results
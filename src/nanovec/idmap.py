@@ -0,0 +1,175 @@
+import copy
+import logging
+import numpy as np
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# How far past ``next_id`` a caller-chosen ID may be. Both mappings are dense,
+# so every ID skipped over costs memory here and in the metadata field index.
+MAX_ID_GAP = 1 << 20
+
+class IdMap:
+    """
+    Stable external ID <-> index row mapping.
+
+    ``VectorDB`` hands out IDs that never change, while index rows move when
+    a document is updated (the new version is appended) or when ``compact``
+    drops deleted rows. Both directions are dense NumPy arrays, so whole
+    result sets and filter matches are translated with one gather:
+
+    - ``row_ids[row]`` is the ID stored in a row (tombstoned rows keep theirs);
+    - ``_rows[id]`` is the live row of an ID, or -1 if it has none.
+
+    ``snapshot()`` returns a frozen view for concurrent readers; ``_rows``,
+    the only array rewritten in place, is copied on the next such write.
+
+    Attributes:
+        next_id (int): The ID ``add`` assigns next (one past the largest ID used).
+    """
+    def __init__(self):
+        self._row_ids = np.empty(0, dtype=np.int64)
+        self._rows = np.empty(0, dtype=np.int64)
+        self._num_rows = 0
+        self.next_id = 0
+        # Whether a snapshot shares _rows
+        self._shared = False
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._rows[:self.next_id] >= 0))
+
+    def __contains__(self, id_: object) -> bool:
+        return self.row(id_) >= 0
+
+    @property
+    def row_ids(self) -> np.ndarray:
+        """The ID of every row, shape (rows,)."""
+        return self._row_ids[:self._num_rows]
+
+    def row(self, id_) -> int:
+        """The live row of an ID, or -1."""
+        if not isinstance(id_, (int, np.integer)) or not 0 <= id_ < self.next_id:
+            return -1
+        return int(self._rows[id_])
+
+    def rows_of(self, ids: np.ndarray) -> np.ndarray:
+        """The live rows of ``ids`` (-1 for unknown or deleted IDs)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        rows = np.full(ids.shape, -1, dtype=np.int64)
+        known = (ids >= 0) & (ids < self.next_id)
+        rows[known] = self._rows[ids[known]]
+        return rows
+
+    def live_ids(self) -> np.ndarray:
+        """Sorted IDs that currently have a row."""
+        return np.flatnonzero(self._rows[:self.next_id] >= 0)
+
+    def unused_ids(self) -> np.ndarray:
+        """Sorted IDs below ``next_id`` without a live row (deleted, or never used)."""
+        return np.flatnonzero(self._rows[:self.next_id] < 0)
+
+    def check_new_ids(self, ids: np.ndarray):
+        """
+        Rejects caller-chosen IDs more than ``MAX_ID_GAP`` past ``next_id``.
+
+        Raises:
+            ValueError: If an ID is that far ahead.
+        """
+        largest = int(np.max(ids))
+        if largest >= self.next_id + MAX_ID_GAP:
+            raise ValueError(
+                f"ID {largest} is too far beyond the next free ID {self.next_id}; IDs index dense "
+                f"arrays, so they may be at most {MAX_ID_GAP} past it."
+            )
+
+    def assign(self, ids: np.ndarray, first_row: int):
+        """
+        Maps ``ids`` to the consecutive new rows starting at ``first_row``.
+
+        The rows must directly follow the existing ones. Previous rows of
+        these IDs are simply unmapped; tombstoning them is up to the caller.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        count = ids.shape[0]
+        if first_row != self._num_rows:
+            raise ValueError(f"New rows must start at row {self._num_rows}, got {first_row}")
+        if count == 0:
+            return
+        if ids.min() < 0:
+            raise ValueError("IDs must be non-negative integers.")
+
+        if ids.min() < self.next_id:
+            self._unshare()
+        stop = self._num_rows + count
+        if stop > self._row_ids.shape[0]:
+            self._row_ids = _grown(self._row_ids, self._num_rows, stop, fill=0)
+        self._row_ids[self._num_rows:stop] = ids
+        max_id = int(ids.max())
+        if max_id >= self._rows.shape[0]:
+            self._rows = _grown(self._rows, self.next_id, max_id + 1, fill=-1)
+        self.next_id = max(self.next_id, max_id + 1)
+        self._rows[ids] = np.arange(self._num_rows, stop, dtype=np.int64)
+        self._num_rows = stop
+
+    def reserve_ids(self, next_id: int):
+        """Raises ``next_id`` so that IDs below it are never handed out by ``add``."""
+        if next_id > self._rows.shape[0]:
+            self._rows = _grown(self._rows, self.next_id, next_id, fill=-1)
+        self.next_id = max(self.next_id, next_id)
+
+    def unmap(self, ids: np.ndarray):
+        """Removes the rows of ``ids`` (which must be known IDs)."""
+        self._unshare()
+        self._rows[np.asarray(ids, dtype=np.int64)] = -1
+
+    def keep_rows(self, rows: np.ndarray):
+        """Follows ``VectorIndex.keep_rows``: the kept rows are renumbered 0..len(rows)-1."""
+        self._row_ids = self._row_ids[rows]
+        self._num_rows = rows.shape[0]
+        # The kept rows are exactly the live ones, one per live ID
+        self._rows = np.full(self._rows.shape[0], -1, dtype=np.int64)
+        self._rows[self._row_ids] = np.arange(self._num_rows, dtype=np.int64)
+        self._shared = False
+
+    def snapshot(self) -> "IdMap":
+        """A read-only view of the current mapping; later writes do not show through."""
+        view = copy.copy(self)
+        self._shared = True
+        return view
+
+    def _unshare(self):
+        if self._shared:
+            self._rows = self._rows.copy()
+            self._shared = False
+
+    @classmethod
+    def identity(cls, num_rows: int) -> "IdMap":
+        """The mapping of a database without updates or deletes: ID == row."""
+        return cls.from_rows(np.arange(num_rows, dtype=np.int64), num_rows)
+
+    @classmethod
+    def from_rows(cls, row_ids: np.ndarray, next_id: int, deleted: Optional[np.ndarray] = None) -> "IdMap":
+        """
+        Rebuilds the mapping from persisted ``row_ids``.
+
+        Args:
+            row_ids (np.ndarray): The ID of every row.
+            next_id (int): The persisted ``next_id``.
+            deleted (Optional[np.ndarray]): Tombstone flag of every row; those rows stay unmapped.
+        """
+        id_map = cls()
+        id_map._row_ids = np.array(row_ids, dtype=np.int64)
+        id_map._num_rows = id_map._row_ids.shape[0]
+        id_map.next_id = int(next_id)
+        id_map._rows = np.full(id_map.next_id, -1, dtype=np.int64)
+        live_rows = np.arange(id_map._num_rows, dtype=np.int64)
+        if deleted is not None:
+            live_rows = live_rows[~np.asarray(deleted, dtype=bool)]
+        id_map._rows[id_map._row_ids[live_rows]] = live_rows
+        return id_map
+
+
+def _grown(array: np.ndarray, size: int, needed: int, fill: int) -> np.ndarray:
+    grown = np.full(max(needed, 2 * array.shape[0], 16), fill, dtype=array.dtype)
+    grown[:size] = array[:size]
+    return grown
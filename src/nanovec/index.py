@@ -1,26 +1,418 @@
-import numpy as np
+import os
+import copy
 import logging
-from typing import List, Tuple, Optional
+import tempfile
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple, Optional
+from .codecs import CODECS
+from .profiling import StageTimer
 from .exceptions import DimensionMismatchError
 
 logger = logging.getLogger(__name__)
 
+# Arena growth policy: capacity at least doubles on reallocation so that
+# single-row inserts cost amortized O(dimension).
+_GROWTH_FACTOR = 2
+_MIN_CAPACITY = 16
+
+# Rows scored per GEMM in the exact scan. Bounds the score temporaries to
+# (queries x block_size) floats independently of the corpus size.
+DEFAULT_BLOCK_SIZE = 16384
+
+# Scans shorter than this many rows per thread are not worth sharding.
+_MIN_SHARD_ROWS = 4096
+
+# Filtered searches score only the matching rows when they are at most this
+# fraction of the index (row gathers cost more per row than a contiguous
+# GEMM), and otherwise scan everything with the non-matching rows masked.
+_SUBSET_SCAN_FRACTION = 0.2
+
+# Supported similarity metrics. Scores are always "higher is better";
+# for "l2" the score is the negated squared Euclidean distance.
+METRICS = ("cosine", "ip", "l2")
+
 class VectorIndex:
     """
     Manages the dense vector storage and similarity search using NumPy.
     
+    Vectors live in a capacity-managed buffer that grows geometrically;
+    only the live ``[:size]`` rows are exposed through ``vectors``. Row norms
+    are computed once at insert time and cached alongside the vectors.
+    
+    With a compressed ``codec`` ("float16", "sq8" or "pq") the buffer holds
+    codes instead of float32 rows and the scan scores the codes directly.
+    Trainable codecs keep float32 rows until ``codec_train_size`` vectors have
+    been added (or ``train_codec()`` is called), then encode them. With
+    ``rerank`` > 0 the full-precision vectors are kept as well (memory-mapped
+    from disk after a load) and the top ``rerank * k`` candidates of the
+    compressed scan are rescored exactly.
+    
+    Rows can be tombstoned with ``delete_rows``: they stay in place but are
+    masked out of every search until ``compact()`` drops them.
+    
+    With ``threads`` > 1 the exact scan is split into contiguous row shards
+    scored in parallel on a shared thread pool (NumPy releases the GIL in
+    the GEMM and reductions), and the per-shard top-k are merged.
+    
+    ``snapshot()`` returns a frozen view for concurrent readers. Rows are
+    append-only and a reallocation makes new arrays, so the view shares the
+    buffers; the only array rewritten in place (the tombstones) is copied on
+    the next delete.
+    
     Attributes:
         dimension (int): The dimensionality of the vectors.
-        vectors (np.ndarray): The 2D array storing all vectors.
+        metric (str): The similarity metric, one of ``METRICS``.
+        vectors (np.ndarray): The 2D array of live vectors (a view into the buffer
+            for float32 storage, otherwise full-precision or decoded rows).
+        norms (np.ndarray): The cached L2 norm of every live vector.
+        block_size (int): Rows scored per block during an exact scan.
+        codec: The storage codec, or None for float32 storage.
+        rerank (int): Candidate multiplier for exact reranking; 0 disables it.
+        threads (int): Threads used by the exact scan; 0 uses every core.
     """
-    def __init__(self, dimension: int):
+    index_type = "flat"
+
+    def __init__(self, dimension: int, metric: str = "cosine", block_size: int = DEFAULT_BLOCK_SIZE,
+                 codec: str = "float32", rerank: int = 0, codec_train_size: Optional[int] = None,
+                 threads: int = 1, **codec_params: Any):
         if dimension <= 0:
             raise ValueError("Dimension must be a positive integer.")
+        if block_size <= 0:
+            raise ValueError("Block size must be a positive integer.")
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}'. Expected one of {METRICS}.")
+        if codec != "float32" and codec not in CODECS:
+            raise ValueError(f"Unknown codec '{codec}'. Expected 'float32' or one of {list(CODECS)}.")
+        if rerank < 0:
+            raise ValueError("Rerank factor must be non-negative.")
+        if threads < 0:
+            raise ValueError("Thread count must be non-negative.")
+        if codec == "float32" and codec_params:
+            raise TypeError(f"Unknown index options: {sorted(codec_params)}")
             
         self.dimension = dimension
-        # Pre-allocate? For now, keep dynamic but use float32 explicitly.
-        self.vectors = np.empty((0, dimension), dtype=np.float32)
-        logger.debug(f"Initialized VectorIndex with dimension={dimension}")
+        self.metric = metric
+        self.block_size = block_size
+        self.threads = threads
+        self.codec = CODECS[codec](dimension, **codec_params) if codec != "float32" else None
+        self.rerank = rerank if self.codec is not None else 0
+        self.codec_train_size = (
+            codec_train_size if codec_train_size is not None
+            else self.codec.default_train_size if self.codec is not None else 0
+        )
+        if self.codec is not None and self.codec_train_size < self.codec.min_train_size:
+            raise ValueError(
+                f"codec_train_size must be at least {self.codec.min_train_size} for codec '{codec}'."
+            )
+        self._buffer = np.empty((0, dimension), dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+        # Tombstone bitmap over rows, sized like the norms
+        self._deleted = np.zeros(0, dtype=bool)
+        self._deleted_count = 0
+        # Whether a snapshot shares _deleted (copied before the next in-place write)
+        self._shared = False
+        self._size = 0
+        # Whether _buffer holds codec codes (True) or float32 rows (False)
+        self._encoded = False
+        # Full-precision rows kept for reranking: a read-only base loaded from
+        # disk (rows [0, len(base))) followed by an in-memory tail arena.
+        self._raw_base: Optional[np.ndarray] = None
+        self._raw = np.empty((0, dimension), dtype=np.float32)
+        # Per-stage search timings (disabled; VectorDB shares its own timer)
+        self.profiler = StageTimer()
+        if self.codec is not None and self.codec.is_trained:
+            self._switch_to_codes()
+        logger.debug(f"Initialized VectorIndex with dimension={dimension}, metric={metric}, codec={codec}")
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """
+        The live vectors, shape (size, dimension).
+        
+        A view into the buffer for float32 storage. With a compressed codec
+        this is the full-precision copy when reranking, otherwise the lossy
+        decoded rows.
+        """
+        return self._row_vectors(slice(0, self._size))
+
+    @vectors.setter
+    def vectors(self, value: np.ndarray):
+        self.set_vectors(value)
+
+    @property
+    def norms(self) -> np.ndarray:
+        """The cached L2 norms of the live rows, shape (size,)."""
+        return self._norms[:self._size]
+
+    @property
+    def sq_norms(self) -> np.ndarray:
+        """The cached squared L2 norms of the live rows, shape (size,)."""
+        return self._sq_norms[:self._size]
+
+    @property
+    def deleted(self) -> np.ndarray:
+        """The tombstone flags of the rows, shape (size,)."""
+        return self._deleted[:self._size]
+
+    @property
+    def live_count(self) -> int:
+        """Number of rows that are not tombstoned."""
+        return self._size - self._deleted_count
+
+    @property
+    def codes(self) -> np.ndarray:
+        """The live rows of the buffer as stored (codes once a codec is active)."""
+        return self._buffer[:self._size]
+
+    @property
+    def has_full_vectors(self) -> bool:
+        """Whether full-precision vectors are kept (False if only lossy codes are)."""
+        return not (self._encoded and not self.rerank)
+
+    @property
+    def full_vectors(self) -> Optional[np.ndarray]:
+        """
+        The full-precision vectors, or None if only lossy codes are kept.
+        
+        This is a copy when part of them is memory-mapped; use
+        ``iter_full_vectors`` to stream them instead.
+        """
+        return self.vectors if self.has_full_vectors else None
+
+    def iter_full_vectors(self, rows: Optional[np.ndarray] = None) -> Iterator[np.ndarray]:
+        """
+        Yields the full-precision vectors of ``rows`` (every row if None) in
+        blocks of ``block_size`` rows, so memory-mapped vectors are never
+        loaded into RAM as a whole.
+        """
+        count = self._size if rows is None else rows.shape[0]
+        for start in range(0, count, self.block_size):
+            stop = min(start + self.block_size, count)
+            yield self._row_vectors(slice(start, stop) if rows is None else rows[start:stop])
+
+    @property
+    def mmap_full_vectors(self) -> bool:
+        """Whether persisted full-precision vectors should stay on disk when loaded."""
+        return self.codec is not None and self.rerank > 0
+
+    @property
+    def capacity(self) -> int:
+        """Number of rows the buffer can hold before reallocating."""
+        return self._buffer.shape[0]
+
+    def set_vectors(self, vectors: np.ndarray, sq_norms: Optional[np.ndarray] = None):
+        """
+        Replaces the contents of the index.
+
+        Args:
+            vectors (np.ndarray): A 2D array of shape (N, dimension).
+            sq_norms (Optional[np.ndarray]): Precomputed squared row norms. Computed if omitted.
+
+        Raises:
+            DimensionMismatchError: If the array shape does not match the index.
+        """
+        self._set_storage(vectors, sq_norms)
+
+    def _set_storage(self, vectors: np.ndarray, sq_norms: Optional[np.ndarray]):
+        if vectors.ndim != 2 or vectors.shape[1] != self.dimension:
+            raise DimensionMismatchError(
+                f"Expected shape (N, {self.dimension}), got {vectors.shape}"
+            )
+        if sq_norms is None:
+            sq_norms = _row_sq_norms(np.asarray(vectors, dtype=np.float32))
+        elif sq_norms.shape != (vectors.shape[0],):
+            raise ValueError(f"Expected {vectors.shape[0]} norms, got {sq_norms.shape}")
+        self._sq_norms = np.asarray(sq_norms, dtype=np.float32)
+        self._norms = np.sqrt(self._sq_norms)
+        self._size = vectors.shape[0]
+        self._deleted = np.zeros(self._size, dtype=bool)
+        self._deleted_count = 0
+        self._shared = False
+        self._raw_base = None
+        self._raw = np.empty((0, self.dimension), dtype=np.float32)
+        
+        if self._encoded:
+            self._buffer = self._encode_blocks(vectors)
+            if self.rerank:
+                self._raw = np.array(vectors, dtype=np.float32)
+        else:
+            # Adopt the array as the buffer; the first append past its end
+            # reallocates, so read-only arrays are never written to.
+            self._buffer = np.asanyarray(vectors, dtype=np.float32)
+            self._maybe_train_codec()
+
+    def get_params(self) -> Dict[str, Any]:
+        """Constructor parameters, besides dimension and metric, needed to rebuild this index."""
+        params: Dict[str, Any] = {"block_size": self.block_size, "threads": self.threads}
+        if self.codec is not None:
+            params.update({
+                "codec": self.codec.name,
+                "rerank": self.rerank,
+                "codec_train_size": self.codec_train_size,
+            })
+            params.update(self.codec.get_params())
+        return params
+
+    def state_arrays(self) -> Dict[str, np.ndarray]:
+        """Index structures to persist alongside the vectors and norms."""
+        state: Dict[str, np.ndarray] = {}
+        if self._deleted_count:
+            state["deleted"] = self.deleted
+        if self._encoded:
+            state["codes"] = self.codes
+            state.update(self.codec.state_arrays())
+        return state
+
+    def restore(self, vectors: Optional[np.ndarray], sq_norms: Optional[np.ndarray] = None,
+                state: Optional[Dict[str, np.ndarray]] = None):
+        """
+        Restores the index from persisted vectors, squared norms and ``state_arrays``.
+        
+        ``vectors`` may be None when only codes were persisted.
+        """
+        self._restore_storage(vectors, sq_norms, state or {})
+
+    def _restore_storage(self, vectors: Optional[np.ndarray], sq_norms: Optional[np.ndarray],
+                         state: Dict[str, np.ndarray]):
+        if "codes" not in state:
+            self._set_storage(vectors, sq_norms)
+            self._restore_tombstones(state)
+            return
+        
+        self.codec.load_state(state)
+        self._encoded = True
+        self._buffer = np.asanyarray(state["codes"], dtype=self.codec.dtype)
+        self._size = self._buffer.shape[0]
+        self._sq_norms = np.asarray(sq_norms, dtype=np.float32)
+        self._norms = np.sqrt(self._sq_norms)
+        # Full-precision rows stay where the loader put them (usually a
+        # read-only memory map); new rows go to the in-memory tail.
+        self._raw_base = vectors if self.rerank else None
+        self._raw = np.empty((0, self.dimension), dtype=np.float32)
+        self._restore_tombstones(state)
+
+    def _restore_tombstones(self, state: Dict[str, np.ndarray]):
+        # Always an in-memory copy: deletes write to it
+        if "deleted" in state:
+            self._deleted = np.array(state["deleted"], dtype=bool)
+        else:
+            self._deleted = np.zeros(self._size, dtype=bool)
+        self._deleted_count = int(np.count_nonzero(self._deleted))
+        self._shared = False
+
+    def train_codec(self, vectors: Optional[np.ndarray] = None):
+        """
+        Trains the storage codec and converts the stored float32 rows to codes.
+        
+        Args:
+            vectors (Optional[np.ndarray]): Training sample. Defaults to the stored vectors.
+        """
+        if self.codec is None or self._encoded:
+            return
+        self.codec.train(self._buffer[:self._size] if vectors is None else vectors)
+        self._switch_to_codes()
+        logger.info(f"Encoded {self._size} vectors with codec={self.codec.name}")
+
+    def _maybe_train_codec(self):
+        if self.codec is not None and not self._encoded and self._size >= max(self.codec_train_size, 1):
+            self.train_codec()
+
+    def _switch_to_codes(self):
+        staging = self._buffer
+        codes = np.empty((staging.shape[0], self.codec.code_size), dtype=self.codec.dtype)
+        codes[:self._size] = self._encode_blocks(staging[:self._size])
+        self._buffer = codes
+        self._encoded = True
+        if self.rerank:
+            self._raw = staging
+            
+    def _encode_blocks(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((vectors.shape[0], self.codec.code_size), dtype=self.codec.dtype)
+        for start in range(0, vectors.shape[0], self.block_size):
+            block = np.asarray(vectors[start:start + self.block_size], dtype=np.float32)
+            codes[start:start + block.shape[0]] = self.codec.encode(block)
+        return codes
+
+    def _row_vectors(self, rows) -> np.ndarray:
+        """
+        Float32 vectors for ``rows`` (a slice or an index array).
+        
+        Returns a view for float32 storage, full-precision copies when
+        reranking, and decoded codes otherwise.
+        """
+        if not self._encoded:
+            return self._buffer[rows]
+        if not self.rerank:
+            return self.codec.decode(self._buffer[rows])
+        base = self._raw_base
+        if base is None:
+            return self._raw[rows]
+        if isinstance(rows, slice):
+            rows = np.arange(*rows.indices(self._size))
+        rows = np.atleast_1d(rows)
+        out = np.empty((rows.shape[0], self.dimension), dtype=np.float32)
+        in_base = rows < base.shape[0]
+        out[in_base] = base[rows[in_base]]
+        out[~in_base] = self._raw[rows[~in_base] - base.shape[0]]
+        return out
+
+    def get_vectors(self, rows) -> np.ndarray:
+        """
+        Float32 vectors of ``rows`` (a slice or an index array).
+        
+        Full precision unless a codec keeps only lossy codes, in which case
+        the rows are decoded.
+        """
+        return self._row_vectors(rows)
+
+    def reserve(self, n: int):
+        """
+        Ensures the buffer can hold at least ``n`` vectors without reallocating.
+        
+        Args:
+            n (int): The total number of vectors to make room for.
+        """
+        if n > self.capacity:
+            self._reallocate(n)
+
+    def shrink_to_fit(self):
+        """Releases unused buffer capacity."""
+        if self.capacity != self._size:
+            self._reallocate(self._size)
+
+    def _reallocate(self, capacity: int):
+        self._buffer = _resized(self._buffer, self._size, capacity)
+        if self._encoded and self.rerank:
+            base_rows = self._raw_base.shape[0] if self._raw_base is not None else 0
+            self._raw = _resized(self._raw, self._size - base_rows, capacity - base_rows)
+        self._norms = _resized(self._norms, self._size, capacity)
+        self._sq_norms = _resized(self._sq_norms, self._size, capacity)
+        self._deleted = _resized(self._deleted, self._size, capacity)
+        logger.debug(f"Reallocated vector buffer to capacity={capacity}")
+
+    def _grow(self, needed: int):
+        if needed > self.capacity:
+            self._reallocate(max(needed, self.capacity * _GROWTH_FACTOR, _MIN_CAPACITY))
+
+    def _write_rows(self, start: int, vectors: np.ndarray):
+        stop = start + vectors.shape[0]
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self._sq_norms[start:stop] = _row_sq_norms(vectors)
+        np.sqrt(self._sq_norms[start:stop], out=self._norms[start:stop])
+        self._deleted[start:stop] = False
+        if not self._encoded:
+            self._buffer[start:stop] = vectors
+            return
+        self._buffer[start:stop] = self.codec.encode(vectors)
+        if self.rerank:
+            base_rows = self._raw_base.shape[0] if self._raw_base is not None else 0
+            self._raw[start - base_rows:stop - base_rows] = vectors
         
     def add(self, vector: np.ndarray) -> int:
         """
@@ -40,8 +432,11 @@ class VectorIndex:
                 f"Expected dimension {self.dimension}, got {vector.shape}"
             )
             
-        new_idx = self.vectors.shape[0]
-        self.vectors = np.vstack([self.vectors, vector.astype(np.float32)])
+        new_idx = self._size
+        self._grow(new_idx + 1)
+        self._write_rows(new_idx, vector[np.newaxis, :])
+        self._size += 1
+        self._maybe_train_codec()
         return new_idx
 
     def add_many(self, vectors: np.ndarray) -> List[int]:
@@ -54,20 +449,133 @@ class VectorIndex:
         Returns:
             List[int]: A list of assigned indices.
         """
-        if vectors.shape[1] != self.dimension:
+        if vectors.ndim != 2 or vectors.shape[1] != self.dimension:
             raise DimensionMismatchError(
-                f"Expected dimension {self.dimension}, got {vectors.shape[1]}"
+                f"Expected dimension {self.dimension}, got {vectors.shape[-1]}"
             )
             
-        start_idx = self.vectors.shape[0]
+        start_idx = self._size
         count = vectors.shape[0]
-        self.vectors = np.vstack([self.vectors, vectors.astype(np.float32)])
+        self._grow(start_idx + count)
+        self._write_rows(start_idx, vectors)
+        self._size += count
+        self._maybe_train_codec()
         
         return list(range(start_idx, start_idx + count))
 
+    def delete_rows(self, rows: np.ndarray):
+        """
+        Tombstones rows: they are excluded from search results from now on.
+        
+        Args:
+            rows (np.ndarray): Row indices; already deleted rows are ignored.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if rows.shape[0] == 0:
+            return
+        if self._shared:
+            self._deleted = self._deleted.copy()
+            self._shared = False
+        self._deleted_count += int(np.count_nonzero(~self._deleted[rows]))
+        self._deleted[rows] = True
+
+    def compact(self) -> Optional[np.ndarray]:
+        """
+        Drops the tombstoned rows, renumbering the remaining rows in order.
+        
+        Returns:
+            Optional[np.ndarray]: The old indices of the kept rows, or None if
+            nothing was deleted (rows are then unchanged).
+        """
+        if self._deleted_count == 0:
+            return None
+        kept = np.flatnonzero(~self.deleted)
+        dropped = self._deleted_count
+        self.keep_rows(kept)
+        logger.info(f"Compacted index: dropped {dropped} deleted rows, {self._size} remain")
+        return kept
+
+    def keep_rows(self, rows: np.ndarray):
+        """
+        Keeps only ``rows`` (ascending old indices) and releases the rest.
+        
+        The buffer is rebuilt at exactly the new size, so this also releases
+        spare capacity; memory-mapped storage is copied into memory, except
+        for full-precision rerank vectors, which are rewritten block by block
+        into a new memory-mapped file.
+        """
+        if self._encoded and self.rerank:
+            if self._raw_base is None:
+                self._raw = self._raw[rows]
+            else:
+                self._raw_base = self._spill_full_vectors(rows)
+                self._raw = np.empty((0, self.dimension), dtype=np.float32)
+        self._buffer = self._buffer[rows]
+        self._norms = self._norms[rows]
+        self._sq_norms = self._sq_norms[rows]
+        self._size = rows.shape[0]
+        self._deleted = np.zeros(self._size, dtype=bool)
+        self._deleted_count = 0
+        self._shared = False
+
+    def truncate(self, size: int):
+        """
+        Drops the rows from ``size`` on, keeping the tombstones of the others.
+        Used to undo an append that failed part way (e.g. while training).
+        """
+        if size >= self._size:
+            return
+        deleted = np.flatnonzero(self._deleted[:size])
+        self.keep_rows(np.arange(size))
+        self.delete_rows(deleted)
+
+    def _spill_full_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Copies the full-precision vectors of ``rows`` into a new read-only
+        memory map, next to the mapped base file when that directory is writable.
+        """
+        directory = os.path.dirname(getattr(self._raw_base, "filename", None) or "") or None
+        try:
+            fd, path = tempfile.mkstemp(suffix=".npy", dir=directory)
+        except OSError:
+            fd, path = tempfile.mkstemp(suffix=".npy")
+        os.close(fd)
+        out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(rows.shape[0], self.dimension))
+        start = 0
+        for block in self.iter_full_vectors(rows):
+            out[start:start + block.shape[0]] = block
+            start += block.shape[0]
+        out.flush()
+        del out
+        spilled = np.load(path, mmap_mode="r")
+        try:
+            # The mapping outlives the name on POSIX; elsewhere the file stays until deleted
+            os.remove(path)
+        except OSError:
+            pass
+        return spilled
+
+    def snapshot(self) -> "VectorIndex":
+        """
+        Returns a read-only view of the current rows for concurrent searches.
+        
+        Later writes to this index do not show through the view. It must
+        not be written to.
+        """
+        view = copy.copy(self)
+        self._shared = True
+        return view
+
+    def _live_mask(self, mask: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Combines a caller's row mask with the tombstones (None: every row allowed)."""
+        if self._deleted_count == 0:
+            return mask
+        live = ~self.deleted
+        return live if mask is None else mask & live
+
     def search(self, query_vector: np.ndarray, k: int = 5) -> List[Tuple[int, float]]:
         """
-        Performs cosine similarity search.
+        Performs similarity search using the index metric.
         
         Args:
             query_vector (np.ndarray): The query vector.
@@ -76,7 +584,7 @@ class VectorIndex:
         Returns:
             List[Tuple[int, float]]: List of (index, score) sorted by score descending.
         """
-        if self.vectors.shape[0] == 0:
+        if self._size == 0:
             return []
             
         if query_vector.shape != (self.dimension,):
@@ -84,33 +592,273 @@ class VectorIndex:
                 f"Query dimension {query_vector.shape} != index dimension {self.dimension}"
             )
 
-        # 1. Dot Product
-        dot_products = np.dot(self.vectors, query_vector)
-        
-        # 2. Norms
-        query_norm = np.linalg.norm(query_vector)
-        vector_norms = np.linalg.norm(self.vectors, axis=1)
+        return self.search_many(query_vector[np.newaxis, :], k=k)[0]
+
+    def search_many(self, query_vectors: np.ndarray, k: int = 5,
+                    mask: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Searches several queries at once, scoring them with a single matrix multiply.
         
-        if query_norm == 0:
-            logger.warning("Query vector has zero norm. Returning empty results.")
-            return []
+        Args:
+            query_vectors (np.ndarray): A 2D array of shape (Q, dimension).
+            k (int): Number of nearest neighbors to return per query.
+            mask (Optional[np.ndarray]): Boolean array of shape (size,); only
+                rows where it is True can be returned.
             
-        # 3. Cosine Similarity
-        with np.errstate(divide='ignore', invalid='ignore'):
-            scores = dot_products / (vector_norms * query_norm)
+        Returns:
+            List[List[Tuple[int, float]]]: One result list per query, in the
+            same format as ``search``.
+        """
+        query_vectors = self._check_queries(query_vectors)
+        if self._size == 0:
+            return [[] for _ in range(query_vectors.shape[0])]
             
-        # Handle zero vectors in DB (NaNs become -1)
-        scores = np.nan_to_num(scores, nan=-1.0)
+        query_sq_norms = _row_sq_norms(query_vectors)[:, np.newaxis]
+        prepared = self._prepare(query_vectors)
+        mask = self._live_mask(mask)
+        top_indices, top_scores = self._scan(prepared, query_sq_norms, self._fetch_k(k), 0, self._size, mask=mask)
+        return self._finish(query_vectors, query_sq_norms, top_indices, top_scores, k)
+
+    def search_rows(self, query_vectors: np.ndarray, rows: np.ndarray, k: int = 5) -> List[List[Tuple[int, float]]]:
+        """
+        Searches several queries among an explicit set of rows only.
         
-        # 4. Top K
-        # Check if we have fewer vectors than k
-        k = min(k, len(scores))
+        Scores exactly the given rows (from the codes when a codec is
+        active), so the cost is proportional to ``len(rows)`` rather than to
+        the index size. Used for selective metadata filters.
         
-        # Argsort is ascending, so we reverse it
-        top_indices = np.argsort(scores)[::-1][:k]
+        Args:
+            query_vectors (np.ndarray): A 2D array of shape (Q, dimension).
+            rows (np.ndarray): The candidate row indices.
+            k (int): Number of nearest neighbors to return per query.
+            
+        Returns:
+            List[List[Tuple[int, float]]]: One result list per query, in the
+            same format as ``search``.
+        """
+        query_vectors = self._check_queries(query_vectors)
+        rows = np.asarray(rows, dtype=np.int64)
+        if self._deleted_count:
+            rows = rows[~self._deleted[rows]]
+        query_sq_norms = _row_sq_norms(query_vectors)[:, np.newaxis]
+        prepared = self._prepare(query_vectors)
+        fetch_k = self._fetch_k(k)
         
+        best_indices = np.empty((query_vectors.shape[0], 0), dtype=np.int64)
+        best_scores = np.empty((query_vectors.shape[0], 0), dtype=np.float32)
+        for block_start in range(0, rows.shape[0], self.block_size):
+            block = rows[block_start:block_start + self.block_size]
+            with self.profiler.stage("score"):
+                dots = self._gather_dots(prepared, block)
+                scores = self._scores_from_dots(dots, self._norms[block], self._sq_norms[block], query_sq_norms)
+            with self.profiler.stage("top_k"):
+                positions, block_scores = _top_k(scores, fetch_k)
+                best_indices, best_scores = _merge_top_k(best_indices, best_scores, block[positions], block_scores, fetch_k)
+        return self._finish(query_vectors, query_sq_norms, best_indices, best_scores, k)
+
+    def max_subset_rows(self) -> int:
+        """
+        Largest number of filter matches for which ``search_rows`` is
+        expected to beat a masked ``search_many``.
+        """
+        return int(self._size * _SUBSET_SCAN_FRACTION)
+
+    def _check_queries(self, query_vectors: np.ndarray) -> np.ndarray:
+        if query_vectors.ndim != 2 or query_vectors.shape[1] != self.dimension:
+            raise DimensionMismatchError(
+                f"Query shape {query_vectors.shape} != (Q, {self.dimension})"
+            )
+        return query_vectors.astype(np.float32, copy=False)
+
+    def _finish(self, query_vectors: np.ndarray, query_sq_norms: np.ndarray, top_indices: np.ndarray,
+                top_scores: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+        """Reranks and formats per-query first-stage candidates, dropping masked-out rows."""
         results = []
-        for idx in top_indices:
-            results.append((int(idx), float(scores[idx])))
-            
+        with self.profiler.stage("rerank"):
+            for row, (indices, row_scores) in enumerate(zip(top_indices, top_scores)):
+                valid = row_scores > -np.inf
+                indices, row_scores = indices[valid], row_scores[valid]
+                indices, row_scores = self._rerank(query_vectors[row], query_sq_norms[row, 0], indices, row_scores, k)
+                results.append(self._to_results(indices, row_scores, query_sq_norms[row, 0]))
         return results
+
+    def _prepare(self, query_vectors: np.ndarray):
+        """Per-batch query preprocessing for the codec (e.g. PQ lookup tables)."""
+        return self.codec.prepare(query_vectors) if self._encoded else query_vectors
+
+    def _fetch_k(self, k: int) -> int:
+        """Number of candidates to take from the first stage before reranking."""
+        return k * self.rerank if self._encoded and self.rerank else k
+
+    def _block_dots(self, prepared, start: int, stop: int) -> np.ndarray:
+        """(Q, rows) inner products between prepared queries and rows ``[start, stop)``."""
+        if self._encoded:
+            return self.codec.dots(self._buffer[start:stop], prepared)
+        return prepared @ self._buffer[start:stop].T
+
+    def _gather_dots(self, prepared, rows: np.ndarray) -> np.ndarray:
+        """(Q, len(rows)) inner products between prepared queries and an explicit row set."""
+        if self._encoded:
+            return self.codec.dots(self._buffer[rows], prepared)
+        return prepared @ self._buffer[rows].T
+
+    def _rerank(self, query: np.ndarray, query_sq_norm: float, indices: np.ndarray,
+                scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Rescores first-stage candidates against full-precision vectors, if enabled."""
+        if not (self._encoded and self.rerank) or indices.shape[0] == 0:
+            return indices[:k], scores[:k]
+        dots = self._row_vectors(indices) @ query
+        exact = self._scores_from_dots(dots, self._norms[indices], self._sq_norms[indices], query_sq_norm)
+        positions, top_scores = _top_k(exact, k)
+        return indices[positions], top_scores
+            
+    def _to_results(self, indices: np.ndarray, scores: np.ndarray, query_sq_norm: float) -> List[Tuple[int, float]]:
+        if self.metric == "cosine" and query_sq_norm == 0:
+            logger.warning("Query vector has zero norm. Returning empty results.")
+            return []
+        return [(int(idx), float(score)) for idx, score in zip(indices, scores)]
+
+    def _scan(self, prepared, query_sq_norms: np.ndarray, k: int, start: int, stop: int,
+              mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Brute-force scan of rows ``[start, stop)`` in blocks of ``block_size`` rows.
+        
+        Exact for float32 storage; with a codec the scores come from the codes.
+        
+        Each block is scored with one GEMM and reduced to its own top-k, which
+        is merged into the running top-k, so extra memory stays at
+        O(Q * block_size) per thread whatever the corpus size.
+        
+        Rows excluded by ``mask`` score -inf.
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (Q, k) row indices and scores, best first.
+        """
+        threads = self.threads or os.cpu_count() or 1
+        blocks = -(-(stop - start) // self.block_size)
+        shards = min(threads, (stop - start) // _MIN_SHARD_ROWS, blocks)
+        if shards < 2:
+            return self._scan_shard(prepared, query_sq_norms, k, start, stop, mask)
+        
+        # Shard bounds on block boundaries; the calling thread scans the first shard
+        bounds = [min(start + (blocks * i // shards) * self.block_size, stop) for i in range(shards + 1)]
+        pool = _thread_pool(shards - 1)
+        futures = [
+            pool.submit(self._scan_shard, prepared, query_sq_norms, k, shard_start, shard_stop, mask)
+            for shard_start, shard_stop in zip(bounds[1:-1], bounds[2:])
+        ]
+        best_indices, best_scores = self._scan_shard(prepared, query_sq_norms, k, bounds[0], bounds[1], mask)
+        for future in futures:
+            shard_indices, shard_scores = future.result()
+            with self.profiler.stage("top_k"):
+                best_indices, best_scores = _merge_top_k(best_indices, best_scores, shard_indices, shard_scores, k)
+        return best_indices, best_scores
+
+    def _scan_shard(self, prepared, query_sq_norms: np.ndarray, k: int, start: int, stop: int,
+                    mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        num_queries = query_sq_norms.shape[0]
+        best_indices = np.empty((num_queries, 0), dtype=np.int64)
+        best_scores = np.empty((num_queries, 0), dtype=np.float32)
+        # Adding 0/-inf per row is far cheaper than a boolean scatter per block
+        penalty = np.where(mask[start:stop], np.float32(0), np.float32(-np.inf)) if mask is not None else None
+        
+        for block_start in range(start, stop, self.block_size):
+            block_stop = min(block_start + self.block_size, stop)
+            
+            with self.profiler.stage("score"):
+                # 1. Dot products for the block: (Q, d) x (d, B) -> (Q, B)
+                dots = self._block_dots(prepared, block_start, block_stop)
+                
+                # 2. Metric, using the cached norms
+                scores = self._scores_from_dots(
+                    dots, self._norms[block_start:block_stop], self._sq_norms[block_start:block_stop], query_sq_norms
+                )
+                if penalty is not None:
+                    scores += penalty[block_start - start:block_stop - start]
+            
+            # 3. Block top-k, merged into the running top-k
+            with self.profiler.stage("top_k"):
+                block_indices, block_scores = _top_k(scores, k)
+                block_indices += block_start
+                best_indices, best_scores = _merge_top_k(best_indices, best_scores, block_indices, block_scores, k)
+            
+        return best_indices, best_scores
+
+    def _scores_from_dots(self, dots: np.ndarray, norms: np.ndarray, sq_norms: np.ndarray,
+                          query_sq_norms) -> np.ndarray:
+        """
+        Converts raw dot products into metric scores in place.
+        
+        ``dots`` is either (rows,) for one query or (Q, rows) for a batch, in
+        which case ``query_sq_norms`` has shape (Q, 1). ``norms`` and
+        ``sq_norms`` are the cached norms of the scored rows.
+        """
+        query_sq_norms = np.asarray(query_sq_norms, dtype=np.float32)
+        if self.metric == "cosine":
+            # Zero vectors in the DB score -1. (Zero queries are rejected by callers.)
+            zero_rows = norms == 0
+            np.divide(dots, norms, out=dots, where=~zero_rows)
+            dots /= np.maximum(np.sqrt(query_sq_norms), np.finfo(np.float32).tiny)
+            if zero_rows.any():
+                dots[..., zero_rows] = -1.0
+        elif self.metric == "l2":
+            # -||v - q||^2 = 2 v.q - ||v||^2 - ||q||^2
+            dots *= 2
+            dots -= sq_norms
+            dots -= query_sq_norms
+            np.minimum(dots, 0, out=dots)
+        return dots
+
+
+def _top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Selects the ``k`` highest scores along the last axis, sorted descending.
+    
+    Uses ``argpartition`` so only the selected ``k`` entries are sorted.
+    
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The positions and the scores of the top entries.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        empty = np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+        return empty, empty.astype(scores.dtype)
+    if k < n:
+        indices = np.argpartition(scores, n - k, axis=-1)[..., n - k:]
+    else:
+        indices = np.broadcast_to(np.arange(n), scores.shape)
+    top_scores = np.take_along_axis(scores, indices, axis=-1)
+    order = np.argsort(-top_scores, axis=-1, kind="stable")
+    return np.take_along_axis(indices, order, axis=-1), np.take_along_axis(top_scores, order, axis=-1)
+
+def _merge_top_k(indices_a: np.ndarray, scores_a: np.ndarray,
+                 indices_b: np.ndarray, scores_b: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merges two per-row top-k candidate sets into a single top-k, sorted descending.
+    """
+    if indices_a.shape[-1] == 0:
+        return indices_b, scores_b
+    indices = np.concatenate([indices_a, indices_b], axis=-1)
+    scores = np.concatenate([scores_a, scores_b], axis=-1)
+    positions, top_scores = _top_k(scores, k)
+    return np.take_along_axis(indices, positions, axis=-1), top_scores
+
+# Scan thread pools shared by every index, by size
+_THREAD_POOLS: Dict[int, ThreadPoolExecutor] = {}
+_THREAD_POOLS_LOCK = threading.Lock()
+
+def _thread_pool(workers: int) -> ThreadPoolExecutor:
+    with _THREAD_POOLS_LOCK:
+        pool = _THREAD_POOLS.get(workers)
+        if pool is None:
+            pool = _THREAD_POOLS[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nanovec-scan")
+        return pool
+
+def _row_sq_norms(vectors: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", vectors, vectors, dtype=np.float32)
+
+def _resized(array: np.ndarray, size: int, capacity: int) -> np.ndarray:
+    resized = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+    resized[:size] = array[:size]
+    return resized
@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import struct
+import logging
+import zipfile
+import itertools
+import numpy as np
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Union
+
+from .exceptions import DimensionMismatchError
+
+logger = logging.getLogger(__name__)
+
+# Default number of vectors written per add_many call
+DEFAULT_BATCH_SIZE = 10_000
+
+# Fixed part of a zip local file header; the name and extra field lengths end it
+_ZIP_LOCAL_HEADER = struct.Struct("<4s5H3I2H")
+
+VectorSource = Union[str, os.PathLike, np.ndarray, Iterable[Any]]
+MetadataSource = Union[str, os.PathLike, Iterable[Dict[str, Any]]]
+
+def open_vectors(path: Union[str, os.PathLike], key: Optional[str] = None) -> np.ndarray:
+    """
+    Opens the vectors stored in an .npy or .npz file, memory-mapped read-only.
+
+    Arrays in an .npz archive are mapped in place when stored uncompressed
+    (``np.savez``); members of a compressed archive are read into memory.
+
+    Args:
+        path: The file to open.
+        key (Optional[str]): The .npz member to use (default: "vectors", else the first array).
+    """
+    path = os.fspath(path)
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    if not path.endswith(".npz"):
+        raise ValueError(f"Unsupported vector file '{path}'; expected .npy or .npz.")
+
+    with zipfile.ZipFile(path) as archive:
+        names = [name[:-4] for name in archive.namelist() if name.endswith(".npy")]
+        if key is None:
+            if not names:
+                raise ValueError(f"{path} contains no arrays.")
+            key = "vectors" if "vectors" in names else names[0]
+        if key not in names:
+            raise KeyError(f"{path} has no array '{key}'; it contains {names}.")
+        info = archive.getinfo(key + ".npy")
+
+    if info.compress_type != zipfile.ZIP_STORED:
+        logger.warning(f"Array '{key}' in {path} is compressed and is read into memory.")
+        with np.load(path) as archive:
+            return archive[key]
+    with open(path, "rb") as f:
+        f.seek(info.header_offset)
+        local_header = _ZIP_LOCAL_HEADER.unpack(f.read(_ZIP_LOCAL_HEADER.size))
+        f.seek(info.header_offset + _ZIP_LOCAL_HEADER.size + local_header[-2] + local_header[-1])
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape, order="F" if fortran_order else "C")
+
+def iter_vector_batches(source: VectorSource, batch_size: int = DEFAULT_BATCH_SIZE,
+                        key: Optional[str] = None) -> Iterator[np.ndarray]:
+    """
+    Yields float32 batches of at most ``batch_size`` rows from a vector source.
+
+    Slices of a contiguous float32 array (including a memory-mapped file) are
+    yielded as views, without copying; other arrays are converted one batch
+    at a time. An iterable may yield single vectors, which are grouped into
+    batches, or 2D arrays, which are split into batches.
+
+    Args:
+        source: An array, an .npy/.npz path or an iterable of vectors or 2D arrays.
+        batch_size (int): The maximum number of rows per batch.
+        key (Optional[str]): The member of an .npz file (see ``open_vectors``).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        source = open_vectors(source, key=key)
+    if isinstance(source, np.ndarray):
+        if source.ndim != 2:
+            raise ValueError(f"Expected a 2D array of vectors, got shape {source.shape}")
+        for start in range(0, source.shape[0], batch_size):
+            yield np.ascontiguousarray(source[start:start + batch_size], dtype=np.float32)
+        return
+
+    pending = []
+    for item in source:
+        item = np.asarray(item, dtype=np.float32)
+        if item.ndim == 1:
+            pending.append(item)
+            if len(pending) == batch_size:
+                yield np.stack(pending)
+                pending = []
+            continue
+        if pending:
+            yield np.stack(pending)
+            pending = []
+        yield from iter_vector_batches(item, batch_size)
+    if pending:
+        yield np.stack(pending)
+
+def iter_metadata(source: Optional[MetadataSource]) -> Iterator[Dict[str, Any]]:
+    """
+    Yields metadata records from a JSONL file (one object per line, blank
+    lines skipped) or an iterable of dicts; empty records forever if None.
+    """
+    if source is None:
+        yield from itertools.repeat({})
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from source
+
+def ingest(db: Any, source: VectorSource, metadata: Optional[MetadataSource] = None,
+           batch_size: int = DEFAULT_BATCH_SIZE, key: Optional[str] = None,
+           progress: Optional[Callable[[Dict[str, float]], None]] = None) -> Dict[str, float]:
+    """
+    Streams vectors and metadata into ``db`` in bounded-memory batches.
+
+    Only one batch of vectors and metadata is held at a time, so inputs
+    larger than RAM can be loaded from memory-mapped files or generators.
+    When the number of vectors is known up front the index buffer is sized
+    once for all of them.
+
+    Args:
+        db: The ``VectorDB`` to write to.
+        source: The vectors (see ``iter_vector_batches``).
+        metadata: One record per vector, in the same order (see ``iter_metadata``).
+        batch_size (int): Vectors per ``add_many`` call.
+        key (Optional[str]): The member of an .npz file (see ``open_vectors``).
+        progress (Optional[Callable]): Called with the running statistics after every batch.
+
+    Returns:
+        Dict[str, float]: ``vectors``, ``batches``, ``seconds`` and ``vectors_per_second``.
+
+    Raises:
+        ValueError: If ``metadata`` does not have exactly one record per vector.
+    """
+    if batch_size <= 0:
+        raise ValueError("batch_size must be a positive integer.")
+    if isinstance(source, (str, os.PathLike)):
+        source = open_vectors(source, key=key)
+    if isinstance(source, np.ndarray) and source.ndim == 2:
+        if source.shape[1] != db.dimension:
+            raise DimensionMismatchError(f"Expected dimension {db.dimension}, got {source.shape[1]}")
+        with db._write_lock:
+            db.index.reserve(len(db.index) + source.shape[0])
+
+    records = iter_metadata(metadata)
+    stats = {"vectors": 0, "batches": 0, "seconds": 0.0, "vectors_per_second": 0.0}
+    started = time.perf_counter()
+    try:
+        for batch in iter_vector_batches(source, batch_size):
+            batch_metadata = list(itertools.islice(records, batch.shape[0]))
+            if len(batch_metadata) != batch.shape[0]:
+                raise ValueError(f"Metadata ran out after {stats['vectors'] + len(batch_metadata)} records.")
+            db.add_many(batch, batch_metadata)
+
+            stats["vectors"] += batch.shape[0]
+            stats["batches"] += 1
+            stats["seconds"] = time.perf_counter() - started
+            stats["vectors_per_second"] = stats["vectors"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+            logger.info(f"Ingested {stats['vectors']} vectors ({stats['vectors_per_second']:.0f} vectors/s).")
+            if progress is not None:
+                progress(dict(stats))
+        if metadata is not None and next(records, None) is not None:
+            raise ValueError(f"More metadata records than the {stats['vectors']} vectors.")
+    finally:
+        records.close()
+    return stats
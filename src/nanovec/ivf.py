@@ -0,0 +1,245 @@
+import numpy as np
+import logging
+from typing import Any, Dict, List, Tuple, Optional
+
+from .index import VectorIndex, DEFAULT_BLOCK_SIZE, _top_k, _row_sq_norms
+from .clustering import kmeans, nearest_centroids
+from .exceptions import EmptyIndexError
+
+logger = logging.getLogger(__name__)
+
+# Vectors per centroid needed before the index trains itself, and the
+# sample size per centroid used for training.
+_MIN_POINTS_PER_CENTROID = 39
+_MAX_POINTS_PER_CENTROID = 256
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted-file (IVF) approximate index.
+
+    Vectors are partitioned into ``nlist`` k-means clusters. A query only
+    scores the vectors of its ``nprobe`` closest clusters instead of the
+    whole corpus. Until the index is trained, search falls back to an exact
+    scan; training happens automatically once ``train_size`` vectors have
+    been added, or explicitly with ``train()``.
+
+    Attributes:
+        nlist (int): Number of clusters (inverted lists).
+        nprobe (int): Number of clusters probed per query.
+        centroids (Optional[np.ndarray]): The (nlist, dimension) centroids, None until trained.
+    """
+    index_type = "ivf"
+
+    def __init__(self, dimension: int, metric: str = "cosine", nlist: int = 100, nprobe: int = 8,
+                 train_size: Optional[int] = None, block_size: int = DEFAULT_BLOCK_SIZE, **storage_params: Any):
+        super().__init__(dimension, metric=metric, block_size=block_size, **storage_params)
+        if nlist <= 0 or nprobe <= 0:
+            raise ValueError("nlist and nprobe must be positive integers.")
+
+        if train_size is not None and train_size < nlist:
+            raise ValueError(f"train_size must be at least nlist={nlist}.")
+
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size if train_size is not None else nlist * _MIN_POINTS_PER_CENTROID
+        self.centroids: Optional[np.ndarray] = None
+        self._reset_lists()
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def get_params(self) -> Dict[str, Any]:
+        params = super().get_params()
+        params.update({"nlist": self.nlist, "nprobe": self.nprobe, "train_size": self.train_size})
+        return params
+
+    def state_arrays(self) -> Dict[str, np.ndarray]:
+        state = super().state_arrays()
+        if self.is_trained:
+            state.update({"ivf_centroids": self.centroids, "ivf_assignments": self.assignments})
+        return state
+
+    def restore(self, vectors: Optional[np.ndarray], sq_norms: Optional[np.ndarray] = None,
+                state: Optional[Dict[str, np.ndarray]] = None):
+        self._restore_storage(vectors, sq_norms, state or {})
+        self._reset_lists()
+        if state and "ivf_centroids" in state:
+            self.centroids = np.asarray(state["ivf_centroids"], dtype=np.float32)
+            self._append_to_lists(0, np.asarray(state["ivf_assignments"], dtype=np.int32))
+
+    @property
+    def assignments(self) -> np.ndarray:
+        """The inverted list of every live vector, shape (size,)."""
+        return self._assignments[:self._size]
+
+    def set_vectors(self, vectors: np.ndarray, sq_norms: Optional[np.ndarray] = None):
+        super().set_vectors(vectors, sq_norms=sq_norms)
+        self._reset_lists()
+        if self.is_trained:
+            self._assign_rows(0)
+
+    def keep_rows(self, rows: np.ndarray):
+        assignments = self._assignments[rows]
+        super().keep_rows(rows)
+        self._reset_lists()
+        if self.is_trained:
+            self._append_to_lists(0, assignments)
+
+    def snapshot(self) -> "IVFIndex":
+        view = super().snapshot()
+        # Appends fill the list arrays in place past their sizes: the view keeps its own sizes
+        view._lists = list(self._lists)
+        view._list_sizes = self._list_sizes.copy()
+        return view
+
+    def _reset_lists(self):
+        self._assignments = np.full(self.capacity, -1, dtype=np.int32)
+        self._lists: List[np.ndarray] = [np.empty(0, dtype=np.int64) for _ in range(self.nlist)]
+        self._list_sizes = np.zeros(self.nlist, dtype=np.int64)
+
+    def _reallocate(self, capacity: int):
+        super()._reallocate(capacity)
+        assignments = np.full(capacity, -1, dtype=np.int32)
+        assignments[:self._size] = self._assignments[:self._size]
+        self._assignments = assignments
+
+    def add(self, vector: np.ndarray) -> int:
+        idx = super().add(vector)
+        self._index_new_rows(idx)
+        return idx
+
+    def add_many(self, vectors: np.ndarray) -> List[int]:
+        indices = super().add_many(vectors)
+        if indices:
+            self._index_new_rows(indices[0])
+        return indices
+
+    def _index_new_rows(self, start: int):
+        if self.is_trained:
+            self._assign_rows(start)
+        elif self._size >= self.train_size:
+            self.train()
+
+    def train(self, iterations: int = 20, seed: int = 0):
+        """
+        Learns the cluster centroids with k-means and assigns every vector to a list.
+
+        Args:
+            iterations (int): Number of k-means iterations.
+            seed (int): Seed for centroid initialization and sampling.
+
+        Raises:
+            EmptyIndexError: If the index holds fewer vectors than ``nlist``.
+        """
+        if self._size < self.nlist:
+            raise EmptyIndexError(
+                f"Need at least nlist={self.nlist} vectors to train, have {self._size}"
+            )
+
+        rng = np.random.default_rng(seed)
+        sample_size = min(self._size, self.nlist * _MAX_POINTS_PER_CENTROID)
+        sample_rows = np.sort(rng.choice(self._size, size=sample_size, replace=False))
+        sample = self._clustering_space(self._row_vectors(sample_rows), self._norms[sample_rows])
+
+        self.centroids = kmeans(sample, self.nlist, iterations, rng)
+        self._reset_lists()
+        self._assign_rows(0)
+        logger.info(f"Trained IVF index: nlist={self.nlist} on {sample_size} vectors.")
+
+    def _clustering_space(self, vectors: np.ndarray, norms: np.ndarray) -> np.ndarray:
+        # Cosine clusters on the unit sphere; l2 and ip cluster the raw vectors.
+        if self.metric != "cosine":
+            return vectors
+        with np.errstate(divide='ignore', invalid='ignore'):
+            unit = vectors / norms[:, np.newaxis]
+        return np.nan_to_num(unit, copy=False)
+
+    def _assign_rows(self, start: int):
+        """Assigns rows ``[start, size)`` to their nearest list, one block at a time."""
+        for block_start in range(start, self._size, self.block_size):
+            block_stop = min(block_start + self.block_size, self._size)
+            points = self._clustering_space(
+                self._row_vectors(slice(block_start, block_stop)), self._norms[block_start:block_stop]
+            )
+            assignments = nearest_centroids(points, self.centroids)[:, 0].astype(np.int32)
+            self._append_to_lists(block_start, assignments)
+
+    def _append_to_lists(self, start: int, assignments: np.ndarray):
+        stop = start + assignments.shape[0]
+        self._assignments[start:stop] = assignments
+
+        # Group the new rows by list and append each group in one copy.
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=self.nlist)
+        rows = (order + start).astype(np.int64)
+        offset = 0
+        for list_id in np.nonzero(counts)[0]:
+            count = counts[list_id]
+            size = self._list_sizes[list_id]
+            ids = self._lists[list_id]
+            if size + count > ids.shape[0]:
+                grown = np.empty(max(size + count, 2 * ids.shape[0]), dtype=np.int64)
+                grown[:size] = ids[:size]
+                ids = self._lists[list_id] = grown
+            ids[size:size + count] = rows[offset:offset + count]
+            self._list_sizes[list_id] = size + count
+            offset += count
+
+    def list_ids(self, list_id: int) -> np.ndarray:
+        """Returns the row indices stored in one inverted list."""
+        return self._lists[list_id][:self._list_sizes[list_id]]
+
+    def search_many(self, query_vectors: np.ndarray, k: int = 5,
+                    mask: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Searches several queries, probing the ``nprobe`` closest lists of each.
+
+        With a ``mask`` only the allowed rows of the probed lists are scored.
+        Falls back to an exact scan while the index is untrained.
+        """
+        if not self.is_trained:
+            return super().search_many(query_vectors, k=k, mask=mask)
+
+        query_vectors = self._check_queries(query_vectors)
+        mask = self._live_mask(mask)
+        query_sq_norms = _row_sq_norms(query_vectors)[:, np.newaxis]
+        with self.profiler.stage("probe"):
+            probes = self._probe(query_vectors, query_sq_norms)
+
+        results = []
+        for row, query in enumerate(query_vectors):
+            candidates = np.concatenate([self.list_ids(list_id) for list_id in probes[row]])
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+            indices, scores = self._score_rows(query, query_sq_norms[row, 0], candidates, self._fetch_k(k))
+            with self.profiler.stage("rerank"):
+                indices, scores = self._rerank(query, query_sq_norms[row, 0], indices, scores, k)
+                results.append(self._to_results(indices, scores, query_sq_norms[row, 0]))
+
+        return results
+
+    def max_subset_rows(self) -> int:
+        if not self.is_trained:
+            return super().max_subset_rows()
+        # About as many rows as one unfiltered query scores in its probed lists
+        return int(self._size * min(self.nprobe, self.nlist) / self.nlist)
+
+    def _probe(self, query_vectors: np.ndarray, query_sq_norms: np.ndarray) -> np.ndarray:
+        nprobe = min(self.nprobe, self.nlist)
+        if self.metric == "ip":
+            scores = query_vectors @ self.centroids.T
+            return _top_k(scores, nprobe)[0]
+        points = self._clustering_space(query_vectors, np.sqrt(query_sq_norms[:, 0]))
+        return nearest_centroids(points, self.centroids, nprobe)
+
+    def _score_rows(self, query: np.ndarray, query_sq_norm: float, rows: np.ndarray,
+                    k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Scores an explicit set of rows against one query and keeps the top-k."""
+        with self.profiler.stage("score"):
+            dots = self._gather_dots(self._prepare(query[np.newaxis, :]), rows)[0]
+            scores = self._scores_from_dots(dots, self._norms[rows], self._sq_norms[rows], query_sq_norm)
+        with self.profiler.stage("top_k"):
+            positions, top_scores = _top_k(scores, k)
+        return rows[positions], top_scores
+
@@ -0,0 +1,323 @@
+import os
+import json
+import mmap
+import logging
+import threading
+import numpy as np
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .filters import MetadataIndex
+
+logger = logging.getLogger(__name__)
+
+# On-disk layout of a persisted MetadataStore
+DATA_FILE = "metadata.bin"
+IDS_FILE = "metadata_ids.npy"
+OFFSETS_FILE = "metadata_offsets.npy"
+
+class _DiskPart:
+    """One saved store: sorted IDs, record offsets and the concatenated blobs."""
+    def __init__(self, ids: np.ndarray, offsets: np.ndarray, data: Any, path: Optional[str] = None):
+        self.ids = ids
+        self.offsets = offsets
+        self.data = data
+        self.path = path
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: bool) -> "_DiskPart":
+        ids = np.load(os.path.join(path, IDS_FILE), mmap_mode="r" if mmap_mode else None)
+        offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r" if mmap_mode else None)
+        with open(os.path.join(path, DATA_FILE), "rb") as f:
+            if mmap_mode and os.fstat(f.fileno()).st_size > 0:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = f.read()
+        return cls(ids, offsets, data, path=path)
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        """Whether each of ``keys`` is in this part, as a boolean mask."""
+        if self.ids.shape[0] == 0:
+            return np.zeros(keys.shape[0], dtype=bool)
+        pos = np.minimum(np.searchsorted(self.ids, keys), self.ids.shape[0] - 1)
+        return np.asarray(self.ids[pos] == keys)
+
+    def position(self, key: int) -> int:
+        pos = int(np.searchsorted(self.ids, key))
+        if pos < self.ids.shape[0] and self.ids[pos] == key:
+            return pos
+        return -1
+
+    def blob(self, pos: int) -> bytes:
+        return self.data[int(self.offsets[pos]):int(self.offsets[pos + 1])]
+
+
+class MetadataStore(MutableMapping):
+    """
+    Mapping of vector ID -> metadata dict with a lazily decoded on-disk part.
+
+    Persisted records are stored as compact JSON blobs concatenated in
+    ``metadata.bin``, with the sorted IDs and the byte offsets of every
+    record in two .npy arrays. Loading only opens these files; a record is
+    decoded when it is accessed, so lookups and result formatting touch just
+    the records they need. Records written after loading live in memory and
+    shadow the on-disk copy until the next save.
+
+    A store can span several saved directories (see ``attach``); later
+    parts take precedence over earlier ones.
+
+    ``field_index`` is an inverted index over the record fields used to
+    evaluate search filters. It is opened from the saved copy (or built) on
+    first use, so loading and unfiltered searches never read it; it is then
+    kept up to date by every write, and saved with the store.
+
+    Records are copied when written and when read, so changing a dict
+    passed in or handed out never reaches the store (or the field index);
+    assign it back (``store[id] = meta``) to persist changes.
+
+    Every operation holds an internal lock, so the store can be read from
+    several threads while another one writes.
+    """
+    def __init__(self):
+        self._records: Dict[int, Dict[str, Any]] = {}
+        self._removed: Set[int] = set()
+        self._parts: List[_DiskPart] = []
+        self._len = 0
+        self._field_index: Optional[MetadataIndex] = None
+        # The saved field index not opened yet: its directory and the part it indexes
+        self._saved_index: Optional[Tuple[str, _DiskPart]] = None
+        # IDs written since loading, while the saved field index is not open
+        self._stale: Set[int] = set()
+        self._lock = threading.RLock()
+
+    @property
+    def field_index(self) -> MetadataIndex:
+        """The inverted index over record fields, opened or built on first access."""
+        with self._lock:
+            if self._field_index is None:
+                self._field_index = self._open_saved_index()
+            if self._field_index is None:
+                self._field_index = MetadataIndex.build(self.items(), lookup=self.__getitem__)
+                logger.debug(f"Built metadata index over {len(self)} records")
+            return self._field_index
+
+    def _open_saved_index(self) -> Optional[MetadataIndex]:
+        if self._saved_index is None:
+            return None
+        path, part = self._saved_index
+        self._saved_index = None
+        index = MetadataIndex.load(path, _fingerprint(part.ids.shape[0], int(part.offsets[-1])), lookup=self.__getitem__)
+        if index is None:
+            return None
+        # Bring the saved index up to date with the writes made since loading
+        for key in sorted(self._stale):
+            pos = part.position(key)
+            if pos >= 0:
+                index.remove(key, json.loads(part.blob(pos)))
+            if key in self:
+                index.add(key, self[key])
+        self._stale.clear()
+        return index
+
+    def select(self, filter_meta: Dict[str, Any]) -> np.ndarray:
+        """
+        Returns the sorted IDs of the records matching a filter.
+
+        See ``MetadataIndex`` for the filter syntax.
+        """
+        with self._lock:
+            return self.field_index.select(filter_meta)
+
+    def _disk_position(self, key: int) -> Tuple[Optional[_DiskPart], int]:
+        if key in self._removed:
+            return None, -1
+        for part in reversed(self._parts):
+            pos = part.position(key)
+            if pos >= 0:
+                return part, pos
+        return None, -1
+
+    def __getitem__(self, key: int) -> Dict[str, Any]:
+        with self._lock:
+            if key in self._records:
+                return dict(self._records[key])
+            part, pos = self._disk_position(key)
+            if part is None:
+                raise KeyError(key)
+            blob = part.blob(pos)
+        return json.loads(blob)
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, (int, np.integer)):
+            return False
+        with self._lock:
+            return key in self._records or self._disk_position(int(key))[0] is not None
+
+    def __setitem__(self, key: int, value: Dict[str, Any]):
+        value = dict(value)
+        with self._lock:
+            if key not in self:
+                self._len += 1
+            elif self._field_index is not None:
+                self._field_index.remove(key, self[key])
+            if self._field_index is not None:
+                self._field_index.add(key, value)
+            elif self._saved_index is not None:
+                self._stale.add(key)
+            self._records[key] = value
+
+    def __delitem__(self, key: int):
+        with self._lock:
+            if key not in self:
+                raise KeyError(key)
+            if self._field_index is not None:
+                self._field_index.remove(key, self[key])
+            elif self._saved_index is not None:
+                self._stale.add(key)
+            self._records.pop(key, None)
+            if self._disk_position(key)[0] is not None:
+                self._removed.add(key)
+            self._len -= 1
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _disk_keys(self) -> np.ndarray:
+        if not self._parts:
+            return np.empty(0, dtype=np.int64)
+        if len(self._parts) == 1:
+            return np.asarray(self._parts[0].ids)
+        return np.unique(np.concatenate([part.ids for part in self._parts]))
+
+    def __iter__(self) -> Iterator[int]:
+        with self._lock:
+            disk_keys = [
+                key for key in self._disk_keys().tolist()
+                if key not in self._removed and key not in self._records
+            ]
+            return iter(sorted([*disk_keys, *self._records]))
+
+    def _encoded_record(self, key: int) -> bytes:
+        with self._lock:
+            if key in self._records:
+                return json.dumps(self._records[key], separators=(",", ":")).encode("utf-8")
+            part, pos = self._disk_position(key)
+            # Untouched records are copied byte-for-byte without decoding.
+            return bytes(part.blob(pos))
+
+    def save(self, path: str, keys: Optional[Iterable[int]] = None):
+        """
+        Writes the store into directory ``path``.
+
+        Each file is written to a temporary name and renamed into place, so
+        a store memory-mapped from the previous files stays readable.
+
+        Saving the whole store also saves ``field_index``.
+
+        Args:
+            path (str): The target directory.
+            keys (Optional[Iterable[int]]): Write only these IDs, in ascending
+                order (all records, plus the field index, if None).
+        """
+        save_index = keys is None
+        keys = list(self) if keys is None else list(keys)
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        data_path = os.path.join(path, DATA_FILE)
+        with open(data_path + ".tmp", "wb") as f:
+            for i, key in enumerate(keys):
+                blob = self._encoded_record(key)
+                f.write(blob)
+                offsets[i + 1] = offsets[i] + len(blob)
+        os.replace(data_path + ".tmp", data_path)
+
+        for name, array in ((IDS_FILE, np.array(keys, dtype=np.int64)), (OFFSETS_FILE, offsets)):
+            file_path = os.path.join(path, name)
+            with open(file_path + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(file_path + ".tmp", file_path)
+
+        if save_index:
+            with self._lock:
+                self.field_index.save(path, _fingerprint(len(keys), int(offsets[-1])))
+
+    def attach(self, path: str, mmap_mode: bool = False):
+        """
+        Adds the records saved in ``path`` as a new on-disk part.
+
+        The attached records take precedence over older parts, and in-memory
+        records for the same IDs are dropped, which is how a store releases
+        records once they have been flushed to disk.
+
+        Args:
+            path (str): A directory written by ``save``.
+            mmap_mode (bool): Memory-map the files instead of reading them into RAM.
+        """
+        part = _DiskPart.load(path, mmap_mode)
+        with self._lock:
+            ids = np.asarray(part.ids)
+            # Membership tests per attached ID, so attaching costs time in the
+            # size of the new part rather than of the whole store
+            on_disk = np.zeros(ids.shape[0], dtype=bool)
+            for other in self._parts:
+                on_disk |= other.contains(ids)
+            if self._removed:
+                on_disk &= ~np.fromiter((key in self._removed for key in ids.tolist()), dtype=bool, count=ids.shape[0])
+            in_memory = np.zeros(ids.shape[0], dtype=bool)
+            if self._records:
+                in_memory = np.fromiter((key in self._records for key in ids.tolist()), dtype=bool, count=ids.shape[0])
+            self._len += int(ids.shape[0] - np.count_nonzero(on_disk | in_memory))
+
+            # In-memory records were indexed when written and are what was saved;
+            # the other attached records are new or replace older on-disk versions.
+            reindexed = ids[~in_memory].tolist() if self._field_index is not None else []
+            if self._saved_index is not None:
+                self._stale.update(ids.tolist())
+            replaced = [(key, self[key]) for key in ids[on_disk & ~in_memory].tolist()] if reindexed else []
+
+            if self._records or self._removed:
+                for key in ids.tolist():
+                    self._records.pop(key, None)
+                    self._removed.discard(key)
+            self._parts.append(part)
+
+            for key, record in replaced:
+                self._field_index.remove(key, record)
+            for key in reindexed:
+                self._field_index.add(key, self[key])
+
+    def replace_parts(self, paths: List[str], path: str, mmap_mode: bool = False):
+        """
+        Replaces the parts attached from ``paths`` with the part saved in
+        ``path``, which must hold the same records (e.g. ``paths`` merged).
+
+        The new part takes the place of the first replaced one, so it keeps
+        precedence over older parts and yields to newer ones. The store's
+        contents are unchanged, and the replaced parts are released.
+        """
+        part = _DiskPart.load(path, mmap_mode)
+        replaced = set(paths)
+        with self._lock:
+            parts = [old for old in self._parts if old.path not in replaced]
+            first = next((i for i, old in enumerate(self._parts) if old.path in replaced), len(self._parts))
+            parts.insert(first, part)
+            self._parts = parts
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: bool = False) -> "MetadataStore":
+        """
+        Opens a store saved with ``save`` without decoding any record or
+        reading the saved field index.
+
+        Args:
+            path (str): The database directory.
+            mmap_mode (bool): Memory-map the files instead of reading them into RAM.
+        """
+        store = cls()
+        store.attach(path, mmap_mode=mmap_mode)
+        store._saved_index = (path, store._parts[0])
+        return store
+
+
+def _fingerprint(count: int, data_size: int) -> Dict[str, Any]:
+    # Identifies the saved records a persisted field index was built from.
+    return {"count": count, "data_size": data_size}
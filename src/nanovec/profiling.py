@@ -0,0 +1,71 @@
+import time
+import threading
+import contextlib
+from typing import Dict, List
+
+# Returned by a disabled timer, so instrumented code pays one attribute check
+_NULL_STAGE = contextlib.nullcontext()
+
+class _Stage:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer: "StageTimer", name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timer.record(self.name, time.perf_counter() - self.start)
+
+
+class StageTimer:
+    """
+    Accumulates wall-clock time per named search stage.
+
+    Instrumented code wraps each stage in ``with timer.stage(name):``; while
+    the timer is disabled this is a no-op. Stages run by the scan threads of
+    one query are summed, so a stage can total more than the query's latency.
+
+    Attributes:
+        enabled (bool): Whether stages are timed.
+    """
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # name -> [count, total seconds, max seconds]
+        self._stages: Dict[str, List[float]] = {}
+
+    def stage(self, name: str):
+        """Context manager timing one run of stage ``name``."""
+        return _Stage(self, name) if self.enabled else _NULL_STAGE
+
+    def record(self, name: str, seconds: float):
+        """Adds one run of stage ``name`` that took ``seconds``."""
+        with self._lock:
+            totals = self._stages.get(name)
+            if totals is None:
+                self._stages[name] = [1, seconds, seconds]
+            else:
+                totals[0] += 1
+                totals[1] += seconds
+                totals[2] = max(totals[2], seconds)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per stage: ``count``, ``total_ms``, ``mean_ms`` and ``max_ms``."""
+        with self._lock:
+            return {
+                name: {
+                    "count": int(count),
+                    "total_ms": total * 1000.0,
+                    "mean_ms": total * 1000.0 / count,
+                    "max_ms": longest * 1000.0,
+                }
+                for name, (count, total, longest) in sorted(self._stages.items())
+            }
+
+    def reset(self):
+        """Clears the accumulated timings."""
+        with self._lock:
+            self._stages.clear()
@@ -0,0 +1,645 @@
+import os
+import json
+import shutil
+import struct
+import zlib
+import logging
+import threading
+import numpy as np
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from .exceptions import NanoVecError
+from .metadata import MetadataStore
+from .utils import _save_array, _save_index, _load_index
+
+logger = logging.getLogger(__name__)
+
+# Version of the segmented layout described by MANIFEST.json.
+#   1: segments cover row ranges; row number == document ID
+#   2: segments also store their rows' IDs and the IDs deleted before them
+SEGMENT_FORMAT_VERSION = 2
+
+MANIFEST_FILE = "MANIFEST.json"
+SEGMENT_VECTORS_FILE = "vectors.npy"
+SEGMENT_IDS_FILE = "ids.npy"
+SEGMENT_DELETED_FILE = "deleted.npy"
+
+# A flush writes a new checkpoint once the index has grown by this fraction
+# since the last one, so checkpoints cost amortized O(1) per row
+CHECKPOINT_GROWTH = 0.25
+
+# WAL record: op, vector count, ID count, metadata byte length, CRC32,
+# followed by the float32 vectors, the int64 IDs and a JSON metadata list.
+_RECORD_HEADER = struct.Struct("<BIIII")
+OP_PUT = 1            # new rows for IDs (replacing their previous rows), with metadata
+OP_SET_METADATA = 2   # metadata of existing IDs
+OP_DELETE = 3         # IDs
+
+# Format 1 record: op (always an add), first row ID, row count, metadata
+# byte length, CRC32, followed by the vectors and the metadata list.
+_V1_RECORD_HEADER = struct.Struct("<BqIII")
+
+def _record_crc(op: int, num_vectors: int, payload: bytes, meta_bytes: bytes) -> int:
+    crc = zlib.crc32(struct.pack("<BII", op, num_vectors, len(meta_bytes)))
+    return zlib.crc32(meta_bytes, zlib.crc32(payload, crc))
+
+def _v1_record_crc(op: int, start: int, count: int, vector_bytes: bytes, meta_bytes: bytes) -> int:
+    crc = zlib.crc32(struct.pack("<BqII", op, start, count, len(meta_bytes)))
+    return zlib.crc32(meta_bytes, zlib.crc32(vector_bytes, crc))
+
+class WriteAheadLog:
+    """
+    Append-only log of the writes made since the last flush.
+
+    Every record carries a CRC32 of its contents, so a record torn by a crash
+    mid-append is detected on replay and discarded along with anything after it.
+
+    Args:
+        path (str): The log file.
+        dimension (int): The vector dimensionality, used to size records.
+        sync (bool): fsync after every append instead of leaving it to the OS.
+    """
+    def __init__(self, path: str, dimension: int, sync: bool = False):
+        self.path = path
+        self.dimension = dimension
+        self.sync = sync
+        self._file = open(path, "ab")
+
+    def append(self, op: int, ids: np.ndarray, vectors: Optional[np.ndarray] = None,
+               metadata_list: Optional[List[Dict[str, Any]]] = None):
+        """Appends one record and flushes it to the OS (and to disk with ``sync``)."""
+        num_vectors = 0 if vectors is None else vectors.shape[0]
+        payload = b"" if vectors is None else np.ascontiguousarray(vectors, dtype=np.float32).tobytes()
+        payload += np.ascontiguousarray(ids, dtype=np.int64).tobytes()
+        meta_bytes = b"" if metadata_list is None else json.dumps(metadata_list, separators=(",", ":")).encode("utf-8")
+        crc = _record_crc(op, num_vectors, payload, meta_bytes)
+        self._file.write(_RECORD_HEADER.pack(op, num_vectors, len(ids), len(meta_bytes), crc) + payload + meta_bytes)
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    @staticmethod
+    def replay(path: str, dimension: int, format_version: int = SEGMENT_FORMAT_VERSION
+               ) -> Iterator[Tuple[int, np.ndarray, np.ndarray, Optional[List[Dict[str, Any]]]]]:
+        """
+        Yields the (op, ids, vectors, metadata_list) records of a log, stopping
+        at the first incomplete or corrupt record, which is truncated away.
+
+        Logs of segment format 1 are read as ``OP_PUT`` records of their row IDs.
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+
+        parse = _parse_record if format_version >= 2 else _parse_v1_record
+        pos = 0
+        while True:
+            parsed = parse(data, pos, dimension)
+            if parsed is None:
+                break
+            record, pos = parsed
+            yield record
+
+        if pos < len(data):
+            logger.warning(f"Discarding {len(data) - pos} bytes of incomplete write-ahead log at {path}")
+            with open(path, "r+b") as f:
+                f.truncate(pos)
+
+
+def _parse_record(data: bytes, pos: int, dimension: int):
+    # Returns ((op, ids, vectors, metadata_list), end) or None if no intact record starts at pos
+    if pos + _RECORD_HEADER.size > len(data):
+        return None
+    op, num_vectors, num_ids, meta_len, crc = _RECORD_HEADER.unpack_from(data, pos)
+    body_start = pos + _RECORD_HEADER.size
+    vector_len = num_vectors * dimension * 4
+    payload_stop = body_start + vector_len + num_ids * 8
+    body_stop = payload_stop + meta_len
+    if body_stop > len(data):
+        return None
+    payload = data[body_start:payload_stop]
+    meta_bytes = data[payload_stop:body_stop]
+    if _record_crc(op, num_vectors, payload, meta_bytes) != crc:
+        return None
+    vectors = np.frombuffer(payload, dtype=np.float32, count=num_vectors * dimension).reshape(num_vectors, dimension)
+    ids = np.frombuffer(payload, dtype=np.int64, offset=vector_len)
+    return (op, ids, vectors, json.loads(meta_bytes) if meta_len else None), body_stop
+
+def _parse_v1_record(data: bytes, pos: int, dimension: int):
+    if pos + _V1_RECORD_HEADER.size > len(data):
+        return None
+    op, start, count, meta_len, crc = _V1_RECORD_HEADER.unpack_from(data, pos)
+    body_start = pos + _V1_RECORD_HEADER.size
+    vector_len = count * dimension * 4
+    body_stop = body_start + vector_len + meta_len
+    if body_stop > len(data):
+        return None
+    vector_bytes = data[body_start:body_start + vector_len]
+    meta_bytes = data[body_start + vector_len:body_stop]
+    if _v1_record_crc(op, start, count, vector_bytes, meta_bytes) != crc:
+        return None
+    vectors = np.frombuffer(vector_bytes, dtype=np.float32).reshape(count, dimension)
+    ids = np.arange(start, start + count, dtype=np.int64)
+    return (OP_PUT, ids, vectors, json.loads(meta_bytes)), body_stop
+
+def _fsync_dir(path: str):
+    # Makes new and renamed entries of a directory durable (not possible on Windows)
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _fsync_segment(path: str):
+    """Forces every file of a segment directory, and the directory itself, to disk."""
+    for name in os.listdir(path):
+        with open(os.path.join(path, name), "rb") as f:
+            os.fsync(f.fileno())
+    _fsync_dir(path)
+
+def _live_rows(segment_ids: List[np.ndarray], segment_deleted: List[np.ndarray]) -> np.ndarray:
+    """
+    Which rows of consecutive segments are live.
+
+    A segment's deleted IDs kill the rows of those IDs in earlier segments;
+    its own rows then replace any earlier row of the same ID.
+    """
+    row_ids = np.concatenate([np.empty(0, dtype=np.int64), *segment_ids])
+    known = [row_ids, *segment_deleted]
+    size = max((int(ids.max()) + 1 for ids in known if ids.shape[0]), default=0)
+    latest = np.full(size, -1, dtype=np.int64)
+    live = np.ones(row_ids.shape[0], dtype=bool)
+    offset = 0
+    for ids, deleted in zip(segment_ids, segment_deleted):
+        for dead in (deleted, ids):
+            rows = latest[dead]
+            live[rows[rows >= 0]] = False
+            latest[dead] = -1
+        latest[ids] = np.arange(offset, offset + ids.shape[0], dtype=np.int64)
+        offset += ids.shape[0]
+    return live
+
+
+class SegmentStore:
+    """
+    Segmented on-disk layout with a write-ahead log.
+
+    The directory holds immutable segments (``seg-NNNNNN/``), a write-ahead
+    log of the writes made since the last flush, and ``MANIFEST.json``
+    naming the live segments and log. Every change to the set of files is
+    published by atomically replacing the manifest, so a crash at any point
+    leaves either the old or the new version; files not named by the
+    manifest are removed on open.
+
+    A segment holds the rows written during one flush interval that were
+    still live at the flush (``vectors.npy`` and their document IDs in
+    ``ids.npy``), the metadata written in that interval, and the IDs deleted
+    in it (``deleted.npy``). Loading the segments in order reproduces the
+    database: a segment's deleted IDs drop the rows of earlier segments, and
+    its rows replace earlier rows of the same IDs. On-disk rows are
+    therefore independent of the in-memory row numbers.
+
+    Writes are appended to the log as they happen. ``flush`` turns the
+    logged writes into a new segment (cost proportional to the writes)
+    and starts an empty log; ``compact`` merges the segments into one
+    without the dead rows.
+
+    Indexes with derived structures (an HNSW graph, IVF lists, codes and
+    codebooks) are also written to a checkpoint (``ckpt-NNNNNN/``) that
+    covers a prefix of the segments. Opening restores the index from it and
+    replays only the later segments and the log, instead of re-training and
+    re-inserting every row; lossy codes are restored as written rather than
+    re-encoded from decoded vectors. Checkpoints are written by ``compact``
+    and by ``flush`` once the index has grown by ``CHECKPOINT_GROWTH``.
+
+    Args:
+        path (str): The database directory.
+        sync (bool): fsync the log after every write.
+    """
+    def __init__(self, path: str, sync: bool = False):
+        self.path = path
+        self.sync = sync
+        self.manifest: Dict[str, Any] = {}
+        self._wal: Optional[WriteAheadLog] = None
+        # In-memory rows already covered by segments (rows past it are new)
+        self._synced_rows = 0
+        # IDs written / deleted since the last flush
+        self._written: Set[int] = set()
+        self._deleted: Set[int] = set()
+        # Serializes manifest updates between flushes and background compaction
+        self._lock = threading.Lock()
+        # Held for a whole compaction: one merge may not delete another's inputs
+        self._compacting = threading.Lock()
+        self._compaction: Optional[threading.Thread] = None
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        """Whether ``path`` holds a segmented database."""
+        return os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+    @property
+    def segments(self) -> List[Dict[str, Any]]:
+        """The live segments as ``{"name", "start", "count"}`` entries, in row order."""
+        return list(self.manifest["segments"])
+
+    @property
+    def flushed_rows(self) -> int:
+        """Number of rows stored in segments."""
+        return sum(segment["count"] for segment in self.manifest["segments"])
+
+    def _file_path(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _next_name(self, prefix: str, suffix: str = "") -> str:
+        self.manifest["next_file"] += 1
+        return f"{prefix}-{self.manifest['next_file']:06d}{suffix}"
+
+    def _write_manifest(self):
+        manifest_path = self._file_path(MANIFEST_FILE)
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump(self.manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(manifest_path + ".tmp", manifest_path)
+        _fsync_dir(self.path)
+
+    def _open_wal(self):
+        self._wal = WriteAheadLog(self._file_path(self.manifest["wal"]), self.manifest["dimension"], sync=self.sync)
+
+    def _segment_arrays(self, segment: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """The row IDs and deleted IDs of a segment (format 1 segments: IDs are rows)."""
+        segment_path = self._file_path(segment["name"])
+        ids_path = os.path.join(segment_path, SEGMENT_IDS_FILE)
+        if not os.path.exists(ids_path):
+            return np.arange(segment["start"], segment["start"] + segment["count"], dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.load(ids_path), np.load(os.path.join(segment_path, SEGMENT_DELETED_FILE))
+
+    def create(self, db: Any):
+        """
+        Initializes an empty segmented database in ``path`` for ``db``.
+
+        Raises:
+            NanoVecError: If ``path`` already holds a database.
+        """
+        if self.exists(self.path) or os.path.exists(self._file_path("config.json")):
+            raise NanoVecError(f"A database already exists at {self.path}")
+        os.makedirs(self.path, exist_ok=True)
+        self.manifest = {
+            "format_version": SEGMENT_FORMAT_VERSION,
+            "dimension": db.dimension,
+            "metric": db.metric,
+            "index": db.index.index_type,
+            "index_params": db.index.get_params(),
+            "segments": [],
+            "next_file": 0,
+            "next_id": db.ids.next_id,
+        }
+        self.manifest["wal"] = self._next_name("wal", ".log")
+        open(self._file_path(self.manifest["wal"]), "wb").close()
+        self._write_manifest()
+        self._open_wal()
+        # Documents already in memory go straight into the first segment
+        self._written.update(db.ids.live_ids().tolist())
+        self.flush(db)
+
+    def open(self, db_class: Any) -> Any:
+        """
+        Loads the database: restores the checkpoint, applies the segments
+        written after it and replays the log.
+
+        Returns:
+            A new ``db_class`` instance holding every flushed and logged write.
+        """
+        with open(self._file_path(MANIFEST_FILE), "r") as f:
+            self.manifest = json.load(f)
+        format_version = self.manifest.get("format_version", 1)
+        if format_version > SEGMENT_FORMAT_VERSION:
+            raise NanoVecError(
+                f"Database at {self.path} uses segment format version {format_version}; "
+                f"this NanoVec supports up to {SEGMENT_FORMAT_VERSION}."
+            )
+        self._remove_orphans()
+
+        db = db_class(
+            dimension=self.manifest["dimension"],
+            metric=self.manifest["metric"],
+            index=self.manifest["index"],
+            **self.manifest["index_params"],
+        )
+        checkpoint = self.manifest.get("checkpoint")
+        covered = 0
+        if checkpoint is not None:
+            _load_index(db, self._file_path(checkpoint["name"]), checkpoint["index_state"], checkpoint["next_id"])
+            covered = checkpoint["segments"]
+        segments = self.manifest["segments"]
+        db.index.reserve(len(db.index) + sum(segment["count"] for segment in segments[covered:]))
+        deleted_ids = []
+        for position, segment in enumerate(segments):
+            segment_path = self._file_path(segment["name"])
+            db.metadata_store.attach(segment_path, mmap_mode=True)
+            ids, deleted = self._segment_arrays(segment)
+            deleted_ids.append(deleted)
+            if position < covered:
+                continue
+            vectors = np.load(os.path.join(segment_path, SEGMENT_VECTORS_FILE), mmap_mode="r")
+            if vectors.shape[0] != segment["count"] or ids.shape[0] != segment["count"]:
+                raise NanoVecError(f"Segment {segment['name']} does not hold {segment['count']} rows")
+            self._apply_segment(db, ids, deleted, vectors)
+
+        db.ids.reserve_ids(self.manifest.get("next_id", 0))
+        for idx in np.unique(np.concatenate([np.empty(0, dtype=np.int64), *deleted_ids])).tolist():
+            if idx not in db.ids and idx in db.metadata_store:
+                del db.metadata_store[idx]
+        self._synced_rows = len(db.index)
+
+        replayed = 0
+        wal_path = self._file_path(self.manifest["wal"])
+        for op, ids, vectors, metadata_list in WriteAheadLog.replay(wal_path, db.dimension, format_version):
+            if op == OP_PUT:
+                db._put(ids, vectors, metadata_list)
+            elif op == OP_SET_METADATA:
+                db._set_metadata(ids, metadata_list)
+            elif op == OP_DELETE:
+                db.delete(ids)
+            else:
+                raise NanoVecError(f"Unknown write-ahead log record type {op}")
+            self._track(op, ids)
+            replayed += 1
+
+        self._open_wal()
+        if format_version < SEGMENT_FORMAT_VERSION:
+            # New records use the current log format: move the old log into a segment first
+            self.flush(db)
+            self.manifest["format_version"] = SEGMENT_FORMAT_VERSION
+            self._write_manifest()
+        logger.info(
+            f"Opened {len(segments)} segments ({covered} from a checkpoint) and "
+            f"replayed {replayed} log records from {self.path}"
+        )
+        return db
+
+    @staticmethod
+    def _apply_segment(db: Any, ids: np.ndarray, deleted: np.ndarray, vectors: np.ndarray):
+        # The segment's deleted IDs drop earlier rows; its rows then replace earlier rows of their IDs
+        rows = db.ids.rows_of(deleted)
+        found = rows >= 0
+        db.index.delete_rows(rows[found])
+        db.ids.unmap(deleted[found])
+        db._put(ids, vectors, None)
+
+    def _remove_orphans(self):
+        # Leftovers of a flush or compaction interrupted before its manifest update
+        live = {segment["name"] for segment in self.manifest["segments"]} | {self.manifest["wal"]}
+        if "checkpoint" in self.manifest:
+            live.add(self.manifest["checkpoint"]["name"])
+        for name in os.listdir(self.path):
+            if name in live or not name.startswith(("seg-", "wal-", "ckpt-")):
+                continue
+            orphan = self._file_path(name)
+            if os.path.isdir(orphan):
+                shutil.rmtree(orphan)
+            else:
+                os.remove(orphan)
+            logger.debug(f"Removed orphaned file {orphan}")
+
+    def _track(self, op: int, ids: np.ndarray):
+        if op == OP_DELETE:
+            self._deleted.update(ids.tolist())
+        else:
+            self._written.update(ids.tolist())
+
+    def log_put(self, ids: np.ndarray, vectors: np.ndarray, metadata_list: List[Dict[str, Any]]):
+        """Records new rows for ``ids`` (replacing their previous rows) in the write-ahead log."""
+        self._wal.append(OP_PUT, ids, vectors, metadata_list)
+        self._track(OP_PUT, ids)
+
+    def log_set_metadata(self, ids: np.ndarray, metadata_list: List[Dict[str, Any]]):
+        """Records new metadata for existing ``ids`` in the write-ahead log."""
+        self._wal.append(OP_SET_METADATA, ids, metadata_list=metadata_list)
+        self._track(OP_SET_METADATA, ids)
+
+    def log_delete(self, ids: np.ndarray):
+        """Records the deletion of ``ids`` in the write-ahead log."""
+        self._wal.append(OP_DELETE, ids)
+        self._track(OP_DELETE, ids)
+
+    def rows_compacted(self, num_rows: int):
+        """
+        Follows a compaction of the in-memory index down to ``num_rows`` rows.
+
+        Must directly follow a flush: every remaining row is then in a segment.
+        """
+        self._synced_rows = num_rows
+
+    def flush(self, db: Any) -> Optional[str]:
+        """
+        Writes the changes logged since the last flush into a new segment.
+
+        Only the new live rows, the written metadata and the deleted IDs are
+        written. The segment and a fresh, empty log are published with one
+        manifest replace, after which the old log is deleted.
+
+        Returns:
+            Optional[str]: The name of the new segment, or None if there was nothing to flush.
+        """
+        with self._lock:
+            if len(db.index) == self._synced_rows and not self._written and not self._deleted:
+                return None
+
+            rows = np.arange(self._synced_rows, len(db.index), dtype=np.int64)
+            rows = rows[~db.index.deleted[rows]]
+            written = sorted(idx for idx in self._written if idx in db.ids)
+            name = self._next_name("seg")
+            segment_path = self._file_path(name)
+            os.makedirs(segment_path + ".tmp")
+            _save_array(os.path.join(segment_path + ".tmp", SEGMENT_VECTORS_FILE), db.index.get_vectors(rows))
+            _save_array(os.path.join(segment_path + ".tmp", SEGMENT_IDS_FILE), db.ids.row_ids[rows])
+            _save_array(os.path.join(segment_path + ".tmp", SEGMENT_DELETED_FILE), np.array(sorted(self._deleted), dtype=np.int64))
+            db.metadata_store.save(segment_path + ".tmp", keys=written)
+            _fsync_segment(segment_path + ".tmp")
+            os.rename(segment_path + ".tmp", segment_path)
+
+            old_wal = self.manifest["wal"]
+            self.manifest["wal"] = self._next_name("wal", ".log")
+            open(self._file_path(self.manifest["wal"]), "wb").close()
+            _fsync_dir(self.path)
+            self.manifest["segments"].append({"name": name, "start": self.flushed_rows, "count": int(rows.shape[0])})
+            self.manifest["next_id"] = db.ids.next_id
+            self._write_manifest()
+
+            self._wal.close()
+            os.remove(self._file_path(old_wal))
+            self._open_wal()
+            self._synced_rows = len(db.index)
+            self._written.clear()
+            self._deleted.clear()
+
+        # The flushed records are now served from the segment instead of memory
+        db.metadata_store.attach(segment_path, mmap_mode=True)
+        logger.info(f"Flushed {rows.shape[0]} rows and {len(written)} records to segment {name}")
+        checkpoint = self.manifest.get("checkpoint")
+        checkpoint_rows = checkpoint["rows"] if checkpoint is not None else 0
+        if len(db.index) > checkpoint_rows * (1 + CHECKPOINT_GROWTH):
+            self.checkpoint(db)
+        return name
+
+    @staticmethod
+    def _needs_checkpoint(db: Any) -> bool:
+        # Tombstones alone are cheap to replay; anything else is derived state
+        return any(name != "deleted" for name in db.index.state_arrays())
+
+    def checkpoint(self, db: Any) -> Optional[str]:
+        """
+        Writes the in-memory index as a checkpoint of the flushed segments.
+
+        Must directly follow a flush, so that the index holds exactly the
+        segments. The previous checkpoint is removed once the new one is
+        published.
+
+        Returns:
+            Optional[str]: The name of the checkpoint, or None if the index has no derived structures.
+        """
+        if not self._needs_checkpoint(db):
+            return None
+        with self._lock:
+            name = self._next_name("ckpt")
+            segments = self.manifest["segments"]
+            last = segments[-1]["name"] if segments else None
+
+        checkpoint_path = self._file_path(name)
+        os.makedirs(checkpoint_path + ".tmp")
+        index_state = _save_index(db, checkpoint_path + ".tmp")
+        _fsync_segment(checkpoint_path + ".tmp")
+        os.rename(checkpoint_path + ".tmp", checkpoint_path)
+        _fsync_dir(self.path)
+
+        with self._lock:
+            names = [segment["name"] for segment in self.manifest["segments"]]
+            # A merge published meanwhile folds the covered prefix into its first segment
+            covered = names.index(last) + 1 if last in names else int(last is not None)
+            previous = self.manifest.get("checkpoint")
+            self.manifest["checkpoint"] = {
+                "name": name,
+                "segments": covered,
+                "rows": len(db.index),
+                "next_id": db.ids.next_id,
+                "index_state": index_state,
+            }
+            self._write_manifest()
+
+        if previous is not None:
+            # May still be memory-mapped (rerank vectors); leftovers are removed on open
+            shutil.rmtree(self._file_path(previous["name"]), ignore_errors=True)
+        logger.info(f"Wrote checkpoint {name} of {len(db.index)} rows covering {covered} segments")
+        return name
+
+    def compact(self, db: Any, background: bool = False) -> Optional[threading.Thread]:
+        """
+        Merges all segments into one, dropping deleted and replaced rows.
+
+        Segments are immutable, so the merge reads them without blocking
+        writers; flushes made meanwhile are kept after the merged segment.
+        With a checkpoint, only the segments it covers are merged, so that
+        it keeps covering a prefix. Compactions never overlap: a new one
+        first waits for the running one. Once published, the merged segment
+        replaces the merged ones in ``db.metadata_store``.
+
+        Args:
+            background (bool): Run in a daemon thread and return it.
+
+        Returns:
+            Optional[threading.Thread]: The compaction thread when ``background`` is set.
+        """
+        if not background:
+            self._compact(db)
+            return None
+        if self._compaction is not None:
+            # Keeps a single compaction thread, the one ``close`` joins
+            self._compaction.join()
+        self._compaction = threading.Thread(target=self._compact, args=(db,), name="nanovec-compaction", daemon=True)
+        self._compaction.start()
+        return self._compaction
+
+    def _compact(self, db: Any):
+        with self._compacting:
+            self._merge_segments(db)
+
+    def _merge_segments(self, db: Any):
+        with self._lock:
+            segments = list(self.manifest["segments"])
+            if "checkpoint" in self.manifest:
+                segments = segments[:self.manifest["checkpoint"]["segments"]]
+            if not segments:
+                return
+            name = self._next_name("seg")
+
+        segment_ids, segment_deleted = zip(*(self._segment_arrays(segment) for segment in segments))
+        live = _live_rows(list(segment_ids), list(segment_deleted))
+        if len(segments) < 2 and live.all() and not segment_deleted[0].shape[0]:
+            return
+
+        segment_path = self._file_path(name)
+        tmp_path = segment_path + ".tmp"
+        os.makedirs(tmp_path)
+        total = int(np.count_nonzero(live))
+        merged = np.lib.format.open_memmap(
+            os.path.join(tmp_path, SEGMENT_VECTORS_FILE), mode="w+", dtype=np.float32,
+            shape=(total, self.manifest["dimension"]),
+        )
+        metadata = MetadataStore()
+        offset, out = 0, 0
+        for segment, ids, deleted in zip(segments, segment_ids, segment_deleted):
+            source = self._file_path(segment["name"])
+            kept = live[offset:offset + ids.shape[0]]
+            vectors = np.load(os.path.join(source, SEGMENT_VECTORS_FILE), mmap_mode="r")
+            merged[out:out + np.count_nonzero(kept)] = vectors[kept]
+            out += int(np.count_nonzero(kept))
+            offset += ids.shape[0]
+            for idx in deleted.tolist():
+                if idx in metadata:
+                    del metadata[idx]
+            metadata.attach(source, mmap_mode=True)
+        merged.flush()
+        del merged
+        row_ids = np.concatenate(segment_ids)[live]
+        _save_array(os.path.join(tmp_path, SEGMENT_IDS_FILE), row_ids)
+        _save_array(os.path.join(tmp_path, SEGMENT_DELETED_FILE), np.empty(0, dtype=np.int64))
+        # Explicit keys: segments carry records only, not the field index
+        metadata.save(tmp_path, keys=list(metadata))
+        _fsync_segment(tmp_path)
+        os.rename(tmp_path, segment_path)
+        _fsync_dir(self.path)
+
+        with self._lock:
+            current = self.manifest["segments"]
+            remaining = current[len(segments):]
+            start = total
+            for segment in remaining:
+                segment["start"] = start
+                start += segment["count"]
+            self.manifest["segments"] = [{"name": name, "start": 0, "count": total}] + remaining
+            if "checkpoint" in self.manifest:
+                self.manifest["checkpoint"]["segments"] -= len(segments) - 1
+            self._write_manifest()
+
+        # Served from the merged segment from now on; the old ones are released
+        db.metadata_store.replace_parts([self._file_path(segment["name"]) for segment in segments],
+                                        segment_path, mmap_mode=True)
+        for segment in segments:
+            shutil.rmtree(self._file_path(segment["name"]))
+        logger.info(f"Compacted {len(segments)} segments into {name} ({total} live rows)")
+
+    def close(self):
+        """Waits for a background compaction and closes the log."""
+        if self._compaction is not None:
+            self._compaction.join()
+            self._compaction = None
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
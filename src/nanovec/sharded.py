@@ -0,0 +1,303 @@
+import os
+import json
+import heapq
+import logging
+import threading
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .store import VectorDB, INDEX_TYPES
+from .exceptions import NanoVecError, DimensionMismatchError
+
+logger = logging.getLogger(__name__)
+
+# Version of the sharded layout described by shards.json.
+SHARDED_FORMAT_VERSION = 1
+
+SHARDS_FILE = "shards.json"
+
+# Shards opened by this process, memory-mapped: path -> (version, db)
+_OPEN_SHARDS: Dict[str, Tuple[str, VectorDB]] = {}
+
+def _open_shard(path: str, version: str) -> VectorDB:
+    cached = _OPEN_SHARDS.get(path)
+    if cached is None or cached[0] != version:
+        cached = _OPEN_SHARDS[path] = (version, VectorDB.load(path, mmap=True))
+    return cached[1]
+
+def _search_shard(path: str, version: str, shard: int, num_shards: int, queries: np.ndarray, k: int,
+                  filter_meta: Optional[Dict[str, Any]]) -> List[List[Tuple[int, float, Dict[str, Any]]]]:
+    """
+    Worker task: searches one shard and returns (global ID, score, metadata) per query.
+
+    The shard is memory-mapped read-only on first use and reopened only when
+    its own version changes, so workers share the vectors through the page
+    cache and a commit costs them only the shards it rewrote.
+    """
+    db = _open_shard(path, version)
+    return [
+        [(result["id"] * num_shards + shard, result["score"], result["metadata"]) for result in results]
+        for results in db.search_many(queries, k=k, filter_meta=filter_meta)
+    ]
+
+
+class ShardedVectorDB:
+    """
+    A database partitioned into on-disk shards that are searched in parallel processes.
+
+    Each shard is a directory in the ``save``/``load`` format. Document ``id``
+    lives in shard ``id % num_shards`` under the local ID ``id // num_shards``,
+    so routing needs no lookup table and consecutive IDs spread evenly.
+
+    Searches fan out to a process pool with one task per shard. Workers
+    memory-map the shard files read-only (no vector copies, one page cache
+    for all workers), search, filter and format their results outside the
+    parent's GIL, and the parent merges the per-shard top-k.
+
+    Writes go to in-memory copies of the affected shards in the parent
+    (``get`` and ``len`` see them at once). Searches read the committed
+    shards: ``commit()`` saves the shards changed since the last commit and
+    bumps their versions, and workers reopen only those shards. Batching
+    many writes per commit keeps the number of shard rewrites down.
+
+    Args:
+        path (str): The database directory.
+        dimension (Optional[int]): Vector dimensionality; required to create a new database.
+        num_shards (Optional[int]): Number of shards for a new database (default: one per core).
+        metric (str): Similarity metric for a new database.
+        index (str): Index type of the shards of a new database.
+        processes (Optional[int]): Worker processes (default: one per shard);
+            0 searches the shards in this process, one after the other.
+        **index_params: Index options for the shards of a new database.
+    """
+    def __init__(self, path: str, dimension: Optional[int] = None, num_shards: Optional[int] = None,
+                 metric: str = "cosine", index: str = "flat", processes: Optional[int] = None,
+                 **index_params: Any):
+        self.path = path
+        config_path = os.path.join(path, SHARDS_FILE)
+        if os.path.exists(config_path):
+            with open(config_path, "r") as f:
+                self.config = json.load(f)
+            format_version = self.config.get("format_version", 1)
+            if format_version > SHARDED_FORMAT_VERSION:
+                raise NanoVecError(
+                    f"Database at {path} uses sharded format version {format_version}; "
+                    f"this NanoVec supports up to {SHARDED_FORMAT_VERSION}."
+                )
+        else:
+            if dimension is None:
+                raise FileNotFoundError(f"No sharded database at {path}; pass 'dimension' to create one.")
+            if index not in INDEX_TYPES:
+                raise ValueError(f"Unknown index type '{index}'. Expected one of {list(INDEX_TYPES)}.")
+            num_shards = num_shards or os.cpu_count() or 1
+            if num_shards <= 0:
+                raise ValueError("num_shards must be a positive integer.")
+            self.config = {
+                "format_version": SHARDED_FORMAT_VERSION,
+                "dimension": dimension,
+                "metric": metric,
+                "num_shards": num_shards,
+                "next_id": 0,
+            }
+            os.makedirs(path, exist_ok=True)
+            for shard in range(num_shards):
+                VectorDB(dimension, metric=metric, index=index, **index_params).save(self._shard_path(shard))
+            self._write_config()
+
+        self.dimension = self.config["dimension"]
+        self.metric = self.config["metric"]
+        self.num_shards = self.config["num_shards"]
+        self.next_id = self.config["next_id"]
+        self.processes = self.num_shards if processes is None else processes
+
+        # Writable shards, loaded on first write; shards with unsaved writes
+        self._shards: Dict[int, VectorDB] = {}
+        self._dirty: set = set()
+        # Worker caches reopen a shard when its version changes
+        self._token = os.urandom(8).hex()
+        self._versions = [0] * self.num_shards
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Commits wait until no search reads the shard files; new searches wait
+        # for pending commits, so a steady stream of searches cannot starve one
+        self._state = threading.Condition(threading.RLock())
+        self._searches = 0
+        self._commits = 0
+
+    def __len__(self) -> int:
+        return sum(len(self._shard(shard).ids) for shard in range(self.num_shards))
+
+    def _shard_path(self, shard: int) -> str:
+        return os.path.join(self.path, f"shard-{shard:04d}")
+
+    def _write_config(self):
+        config_path = os.path.join(self.path, SHARDS_FILE)
+        with open(config_path + ".tmp", "w") as f:
+            json.dump(self.config, f)
+        os.replace(config_path + ".tmp", config_path)
+
+    def _shard(self, shard: int) -> VectorDB:
+        db = self._shards.get(shard)
+        if db is None:
+            db = self._shards[shard] = VectorDB.load(self._shard_path(shard), mmap=True)
+        return db
+
+    def _route(self, ids: np.ndarray) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """Groups global IDs by shard: shard -> (positions in ``ids``, local IDs)."""
+        shards = ids % self.num_shards
+        routes = {}
+        for shard in np.unique(shards).tolist():
+            positions = np.flatnonzero(shards == shard)
+            routes[shard] = (positions, ids[positions] // self.num_shards)
+        return routes
+
+    # --- Writes ----------------------------------------------------------
+
+    def add(self, vector: List[float], metadata: Dict[str, Any] = {}) -> int:
+        """Adds a single vector and returns its global ID."""
+        return self.add_many([vector], [metadata])[0]
+
+    def add_many(self, vectors: List[List[float]], metadata_list: List[Dict[str, Any]]) -> List[int]:
+        """
+        Adds a batch of vectors, routing each one to its shard.
+
+        Returns:
+            List[int]: The global IDs of the new documents.
+        """
+        if len(vectors) != len(metadata_list):
+            raise ValueError("Number of vectors and metadata items must match.")
+        vecs_np = np.array(vectors, dtype=np.float32).reshape(len(metadata_list), -1)
+        if vecs_np.shape[0] and vecs_np.shape[1] != self.dimension:
+            raise DimensionMismatchError(
+                f"Expected dimension {self.dimension}, got {vecs_np.shape[1]}"
+            )
+        with self._state:
+            ids = np.arange(self.next_id, self.next_id + len(metadata_list), dtype=np.int64)
+            for shard, (positions, local_ids) in self._route(ids).items():
+                self._shard(shard).upsert_many(
+                    local_ids.tolist(), vecs_np[positions], [metadata_list[i] for i in positions.tolist()]
+                )
+                self._dirty.add(shard)
+            self.next_id += len(metadata_list)
+        logger.info(f"Routed {len(ids)} vectors to {self.num_shards} shards.")
+        return ids.tolist()
+
+    def delete(self, ids: Union[int, List[int]]) -> int:
+        """
+        Deletes documents by global ID; unknown IDs are ignored.
+
+        Returns:
+            int: The number of documents deleted.
+        """
+        ids = np.unique(np.atleast_1d(np.asarray(ids, dtype=np.int64)))
+        ids = ids[ids >= 0]
+        deleted = 0
+        with self._state:
+            for shard, (_, local_ids) in self._route(ids).items():
+                count = self._shard(shard).delete(local_ids.tolist())
+                if count:
+                    self._dirty.add(shard)
+                deleted += count
+        return deleted
+
+    def get(self, idx: int) -> Optional[Dict[str, Any]]:
+        """Retrieves the metadata of a document by global ID."""
+        if idx < 0:
+            return None
+        return self._shard(idx % self.num_shards).get(idx // self.num_shards)
+
+    def commit(self):
+        """
+        Saves the shards changed since the last commit, making the writes
+        visible to searches.
+
+        Waits for running searches, which read the shard files, to finish;
+        searches started meanwhile wait for the commit.
+        """
+        with self._state:
+            self._commits += 1
+            try:
+                self._state.wait_for(lambda: self._searches == 0)
+                if not self._dirty:
+                    return
+                for shard in sorted(self._dirty):
+                    self._shards[shard].save(self._shard_path(shard))
+                    self._versions[shard] += 1
+                self.config["next_id"] = self.next_id
+                self._write_config()
+                logger.info(f"Committed {len(self._dirty)} shards to {self.path}")
+                self._dirty.clear()
+            finally:
+                self._commits -= 1
+                self._state.notify_all()
+
+    # --- Search ----------------------------------------------------------
+
+    def search(self, query_vector: List[float], k: int = 5,
+               filter_meta: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Searches every shard for one query; see ``VectorDB.search``."""
+        vec_np = np.array(query_vector, dtype=np.float32)
+        if vec_np.shape != (self.dimension,):
+            raise DimensionMismatchError(
+                f"Query dimension {vec_np.shape} != index dimension {self.dimension}"
+            )
+        return self.search_many(vec_np[np.newaxis, :], k=k, filter_meta=filter_meta)[0]
+
+    def search_many(self, query_vectors: List[List[float]], k: int = 5,
+                    filter_meta: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Searches several queries at once: one task per shard scores the whole
+        batch, and the per-shard top-k are merged per query.
+
+        Writes not committed yet are not searched.
+        """
+        queries_np = np.array(query_vectors, dtype=np.float32)
+        if queries_np.ndim == 1 and queries_np.shape[0] == 0:
+            return []
+        if queries_np.ndim != 2 or queries_np.shape[1] != self.dimension:
+            raise DimensionMismatchError(
+                f"Query shape {queries_np.shape} != (Q, {self.dimension})"
+            )
+
+        with self._state:
+            self._state.wait_for(lambda: self._commits == 0)
+            self._searches += 1
+            versions = [f"{self._token}:{version}" for version in self._versions]
+        try:
+            tasks = [
+                (self._shard_path(shard), versions[shard], shard, self.num_shards, queries_np, k, filter_meta)
+                for shard in range(self.num_shards)
+            ]
+            if self.processes == 0:
+                shard_results = [_search_shard(*task) for task in tasks]
+            else:
+                executor = self._pool()
+                shard_results = [future.result() for future in [executor.submit(_search_shard, *task) for task in tasks]]
+        finally:
+            with self._state:
+                self._searches -= 1
+                self._state.notify_all()
+
+        merged = []
+        for per_query in zip(*shard_results):
+            best = heapq.nlargest(k, (hit for hits in per_query for hit in hits), key=lambda hit: hit[1])
+            merged.append([{"id": idx, "score": score, "metadata": metadata} for idx, score, metadata in best])
+        return merged
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._state:
+            if self._executor is None:
+                # spawn: workers must not inherit the parent's threads and locks
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def close(self):
+        """Commits pending writes and stops the worker processes."""
+        self.commit()
+        with self._state:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
@@ -1,49 +1,296 @@
+import os
 import logging
+import threading
 import numpy as np
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Callable, NamedTuple, Optional, Tuple, Union
 
 from .index import VectorIndex
+from .ivf import IVFIndex
+from .hnsw import HNSWIndex
+from .metadata import MetadataStore
+from .filters import MetadataIndex
+from .idmap import IdMap
+from .cache import QueryCache
+from .profiling import StageTimer
+from .ingest import ingest, DEFAULT_BATCH_SIZE, MetadataSource, VectorSource
+from .segments import SegmentStore
 from .utils import save_db_to_disk, load_db_from_disk
-from .exceptions import NanoVecError
+from .exceptions import NanoVecError, DimensionMismatchError
 
 logger = logging.getLogger(__name__)
 
+# Index implementations selectable with VectorDB(index=...)
+INDEX_TYPES = {
+    "flat": VectorIndex,
+    "ivf": IVFIndex,
+    "hnsw": HNSWIndex,
+}
+
+class _Snapshot(NamedTuple):
+    """The vectors and ID mapping a search runs against."""
+    index: VectorIndex
+    ids: IdMap
+
 class VectorDB:
     """
     Main interface for the NanoVec database.
     Manages the underlying VectorIndex and the Metadata store.
+    
+    Writes are serialized by a lock. With ``concurrent=True`` every write
+    also publishes an immutable snapshot of the index and ID map, and
+    searches run against the latest snapshot without taking the lock, so
+    queries can be served from a thread pool while ingestion runs. A
+    snapshot shares the vector buffers (rows are append-only); the few
+    arrays updated in place are copied on the first write after it.
+    Metadata filters and result records are read from the live metadata
+    store, which is internally locked. A result whose document was deleted,
+    or no longer matches the filter, by the time its record is read is
+    left out: a search may then return fewer than ``k`` results, but never
+    a document that is gone or outside the filter.
+    
+    With ``cache_size`` set, search results are kept in an LRU cache keyed
+    on the query vector, ``k`` and the filter (see ``QueryCache``). Every
+    write bumps a generation counter that invalidates the cache, so cached
+    results are never stale; metadata dicts edited in place without being
+    written back are not tracked.
+    
+    With ``profile=True`` (or ``db.profiler.enabled = True`` later) the
+    stages of every search are timed: ``search`` (the whole call),
+    ``filter``, ``score``, ``top_k``, ``rerank`` and ``format``, plus
+    ``probe`` for "ivf" and ``graph`` for "hnsw". See ``stats()``.
+    
+    Args:
+        dimension (int): The dimensionality of the vectors.
+        metric (str): Similarity metric: "cosine" (default), "ip" (inner product)
+            or "l2" (negated squared Euclidean distance).
+        index (str): Index type: "flat" (exact, default), "ivf" or "hnsw" (approximate).
+        **index_params: Extra index options, e.g. ``nlist``/``nprobe`` for "ivf",
+            ``M``/``ef_construction``/``ef_search`` for "hnsw", ``block_size``
+            for the exact scan, ``threads`` to shard the exact scan over several
+            cores (0 for all), or ``codec`` ("float16", "sq8", "pq" with ``pq_m``)
+            and ``rerank`` for compressed storage.
+        concurrent (bool): Publish snapshots so searches can run concurrently with writes.
+        cache_size (int): Maximum number of cached query results (0 disables the cache).
+        cache_ttl (Optional[float]): Seconds a cached result stays valid (no limit if None).
+        profile (bool): Time the stages of every search.
     """
-    def __init__(self, dimension: int):
+    def __init__(self, dimension: int, metric: str = "cosine", index: str = "flat", concurrent: bool = False,
+                 cache_size: int = 0, cache_ttl: Optional[float] = None, profile: bool = False,
+                 **index_params: Any):
+        if index not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index}'. Expected one of {list(INDEX_TYPES)}.")
+            
         self.dimension = dimension
-        self.index = VectorIndex(dimension)
+        self.metric = metric
+        self.index = INDEX_TYPES[index](dimension, metric=metric, **index_params)
+        # Per-stage search timings, shared with the index
+        self.profiler = StageTimer(enabled=profile)
+        self.index.profiler = self.profiler
         # Metadata map: ID -> Data
-        self.metadata_store: Dict[int, Dict[str, Any]] = {}
+        self.metadata_store = MetadataStore()
+        # Stable document IDs <-> index rows
+        self.ids = IdMap()
+        # Attached segmented storage (see open()); None for an in-memory database
+        self._segments: Optional[SegmentStore] = None
+        # Serializes writers; readers never take it
+        self._write_lock = threading.RLock()
+        self.concurrent = concurrent
+        self._snapshot: Optional[_Snapshot] = None
+        # Bumped by every write; cached results of older generations are dropped
+        self._generation = 0
+        self.cache: Optional[QueryCache] = None
+        self._set_cache(cache_size, cache_ttl)
+        self._publish()
         
     def add(self, vector: List[float], metadata: Dict[str, Any] = {}) -> int:
         """
         Add a single vector to the database.
+        Returns its ID, which stays valid until the document is deleted.
         """
         vec_np = np.array(vector, dtype=np.float32)
-        idx = self.index.add(vec_np)
-        self.metadata_store[idx] = metadata
+        if vec_np.shape != (self.dimension,):
+            raise DimensionMismatchError(
+                f"Expected dimension {self.dimension}, got {vec_np.shape}"
+            )
+        with self._write_lock:
+            idx = self.ids.next_id
+            self._put(np.array([idx], dtype=np.int64), vec_np[np.newaxis, :], [metadata])
         logger.debug(f"Added vector {idx} to database.")
         return idx
         
     def add_many(self, vectors: List[List[float]], metadata_list: List[Dict[str, Any]]) -> List[int]:
         """
         Add multiple vectors to the database in a batch.
+        A contiguous float32 array is used as is, without an intermediate copy.
         """
         if len(vectors) != len(metadata_list):
             raise ValueError("Number of vectors and metadata items must match.")
             
-        vecs_np = np.array(vectors, dtype=np.float32)
-        indices = self.index.add_many(vecs_np)
+        vecs_np = np.asarray(vectors, dtype=np.float32)
+        with self._write_lock:
+            ids = np.arange(self.ids.next_id, self.ids.next_id + len(metadata_list), dtype=np.int64)
+            self._put(ids, vecs_np, metadata_list)
+            
+        logger.info(f"Batch added {len(ids)} vectors.")
+        return ids.tolist()
+
+    def ingest(self, source: VectorSource, metadata: Optional[MetadataSource] = None,
+               batch_size: int = DEFAULT_BATCH_SIZE, key: Optional[str] = None,
+               progress: Optional[Callable[[Dict[str, float]], None]] = None) -> Dict[str, float]:
+        """
+        Streams vectors from an array, an .npy/.npz file (memory-mapped) or an
+        iterable into the database in bounded-memory batches.
         
-        for i, idx in enumerate(indices):
-            self.metadata_store[idx] = metadata_list[i]
+        Args:
+            source: The vectors: an array, an .npy/.npz path, or an iterable of vectors or 2D arrays.
+            metadata: A JSONL path or an iterable of dicts, one record per vector (empty if None).
+            batch_size (int): Vectors written per batch.
+            key (Optional[str]): The array to read from an .npz file (default: "vectors").
+            progress (Optional[Callable]): Called with the running statistics after every batch.
             
-        logger.info(f"Batch added {len(indices)} vectors.")
-        return indices
+        Returns:
+            Dict[str, float]: ``vectors``, ``batches``, ``seconds`` and ``vectors_per_second``.
+        """
+        return ingest(self, source, metadata=metadata, batch_size=batch_size, key=key, progress=progress)
+
+    def update(self, idx: int, vector: Optional[List[float]] = None, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Replaces the vector and/or the metadata of an existing document.
+        
+        A new vector is appended as a new row and the old row is tombstoned,
+        so the document keeps its ID. Omitted parts are left unchanged.
+        
+        Raises:
+            KeyError: If ``idx`` is not a live document ID.
+        """
+        with self._write_lock:
+            if idx not in self.ids:
+                raise KeyError(idx)
+            if vector is not None:
+                if metadata is None:
+                    metadata = self.metadata_store.get(idx, {})
+                self.upsert(idx, vector, metadata)
+            elif metadata is not None:
+                self._set_metadata(np.array([idx], dtype=np.int64), [metadata])
+
+    def upsert(self, idx: int, vector: List[float], metadata: Dict[str, Any] = {}):
+        """
+        Stores a document under ``idx``, replacing it if it exists.
+        
+        IDs are dense array positions: inserting an ID beyond the largest
+        one in use reserves the range up to it, so ``idx`` may be at most
+        ``MAX_ID_GAP`` (about a million) past ``ids.next_id``.
+        
+        Raises:
+            ValueError: If ``idx`` is negative or too far past the IDs in use.
+        """
+        if not isinstance(idx, (int, np.integer)) or idx < 0:
+            raise ValueError(f"IDs must be non-negative integers, got {idx!r}")
+        vec_np = np.array(vector, dtype=np.float32)
+        if vec_np.shape != (self.dimension,):
+            raise DimensionMismatchError(
+                f"Expected dimension {self.dimension}, got {vec_np.shape}"
+            )
+        ids_np = np.array([idx], dtype=np.int64)
+        with self._write_lock:
+            self.ids.check_new_ids(ids_np)
+            self._put(ids_np, vec_np[np.newaxis, :], [metadata])
+
+    def upsert_many(self, ids: List[int], vectors: List[List[float]], metadata_list: List[Dict[str, Any]]):
+        """
+        Stores a batch of documents under explicit IDs, replacing those that exist.
+        
+        Raises:
+            ValueError: If the lengths differ, or the IDs are negative, repeated
+                or too far past the IDs in use (see ``upsert``).
+        """
+        if not (len(ids) == len(vectors) == len(metadata_list)):
+            raise ValueError("Number of IDs, vectors and metadata items must match.")
+        if len(ids) == 0:
+            return
+        ids_np = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if ids_np.min() < 0:
+            raise ValueError("IDs must be non-negative integers.")
+        if np.unique(ids_np).shape[0] != ids_np.shape[0]:
+            raise ValueError("IDs in one batch must be unique.")
+        vecs_np = np.array(vectors, dtype=np.float32).reshape(len(ids), -1)
+        if vecs_np.shape[1] != self.dimension:
+            raise DimensionMismatchError(
+                f"Expected dimension {self.dimension}, got {vecs_np.shape[1]}"
+            )
+        with self._write_lock:
+            self.ids.check_new_ids(ids_np)
+            self._put(ids_np, vecs_np, metadata_list)
+
+    def delete(self, ids: Union[int, List[int]]) -> int:
+        """
+        Deletes documents by ID.
+        
+        Their rows are tombstoned (masked out of every search) until
+        ``compact()`` reclaims them. Unknown IDs are ignored.
+        
+        Returns:
+            int: The number of documents deleted.
+        """
+        ids = np.unique(np.atleast_1d(np.asarray(ids, dtype=np.int64)))
+        with self._write_lock:
+            rows = self.ids.rows_of(ids)
+            found = rows >= 0
+            ids, rows = ids[found], rows[found]
+            self.index.delete_rows(rows)
+            self.ids.unmap(ids)
+            for idx in ids.tolist():
+                del self.metadata_store[idx]
+            if self._segments is not None and ids.shape[0]:
+                self._segments.log_delete(ids)
+            self._publish()
+        logger.debug(f"Deleted {ids.shape[0]} documents.")
+        return int(ids.shape[0])
+
+    def _put(self, ids: np.ndarray, vectors: np.ndarray, metadata_list: Optional[List[Dict[str, Any]]]):
+        """
+        Appends rows for ``ids``, tombstoning any previous rows of the same IDs.
+        A ``metadata_list`` of None leaves the metadata store untouched.
+        Callers hold the write lock.
+        """
+        replaced = self.ids.rows_of(ids)
+        first_row = len(self.index)
+        try:
+            self.index.add_many(vectors)
+        except Exception:
+            # Training can fail after the rows were appended: keep the index in step with the ID map
+            self.index.truncate(first_row)
+            raise
+        self.index.delete_rows(replaced[replaced >= 0])
+        self.ids.assign(ids, first_row)
+        if metadata_list is not None:
+            for idx, metadata in zip(ids.tolist(), metadata_list):
+                self.metadata_store[idx] = metadata
+            if self._segments is not None:
+                self._segments.log_put(ids, vectors, metadata_list)
+        self._publish()
+
+    def _set_metadata(self, ids: np.ndarray, metadata_list: List[Dict[str, Any]]):
+        for idx, metadata in zip(ids.tolist(), metadata_list):
+            self.metadata_store[idx] = metadata
+        if self._segments is not None:
+            self._segments.log_set_metadata(ids, metadata_list)
+        self._generation += 1
+
+    def _publish(self):
+        """Publishes the current state to readers (concurrent mode only). Callers hold the write lock."""
+        if self.concurrent:
+            self._snapshot = _Snapshot(self.index.snapshot(), self.ids.snapshot())
+        else:
+            self._snapshot = None
+        # After the snapshot: a reader that saw the old generation may cache newer
+        # results under it (dropped early), never older results under the new one.
+        self._generation += 1
+
+    def _pinned(self) -> _Snapshot:
+        """The state a search runs against: the latest snapshot, or the live index."""
+        snapshot = self._snapshot
+        return snapshot if snapshot is not None else _Snapshot(self.index, self.ids)
         
     def get(self, idx: int) -> Optional[Dict[str, Any]]:
         """
@@ -53,47 +300,263 @@ class VectorDB:
 
     def search(self, query_vector: List[float], k: int = 5, filter_meta: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
-        Search for similar vectors. Optionally filter by exactly matching metadata fields.
+        Search for similar vectors. Optionally restrict the results with a metadata filter.
+        
+        ``filter_meta`` maps fields to required values (``{"genre": "scifi"}``)
+        or to operator clauses: ``$eq``, ``$ne``, ``$in``, ``$nin``, ``$gt``,
+        ``$gte``, ``$lt``, ``$lte``, combined with ``$and``/``$or``, e.g.
+        ``{"$or": [{"year": {"$gte": 2000}}, {"tags": {"$in": ["classic"]}}]}``.
+        The filter is evaluated on the metadata index before scoring, so up to
+        ``k`` matching results are returned however selective it is.
         """
-        vec_np = np.array(query_vector, dtype=np.float32)
-        raw_results = self.index.search(vec_np, k=k if not filter_meta else 1000) # Fetch more if filtering
+        with self.profiler.stage("search"):
+            return self._cached_search(np.array(query_vector, dtype=np.float32), k, filter_meta)
+
+    def _cached_search(self, vec_np: np.ndarray, k: int, filter_meta: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self.cache is None:
+            return self._search(vec_np, k, filter_meta)
+        generation = self._generation
+        key = QueryCache.key(vec_np, k, filter_meta)
+        results = self.cache.get(key, generation)
+        if results is None:
+            results = self._search(vec_np, k, filter_meta)
+            self.cache.put(key, generation, results)
+        return results
+
+    def _search(self, vec_np: np.ndarray, k: int, filter_meta: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        snapshot = self._pinned()
+        if not filter_meta:
+            return self._format_results(snapshot, snapshot.index.search(vec_np, k=k), None)
+        if len(snapshot.index) == 0:
+            return []
+        if vec_np.shape != (self.dimension,):
+            raise DimensionMismatchError(
+                f"Query dimension {vec_np.shape} != index dimension {self.dimension}"
+            )
+        return self._format_results(snapshot, self._filtered_search(snapshot, vec_np[np.newaxis, :], k, filter_meta)[0],
+                                    filter_meta)
         
-        formatted_results = []
-        count = 0
+    def search_many(self, query_vectors: List[List[float]], k: int = 5, filter_meta: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several query vectors at once.
+        All queries are scored against the index with a single matrix multiply.
+        Returns one result list per query, in the same format as `search`.
+        With the cache enabled, only the queries it cannot answer are searched.
+        """
+        queries_np = np.array(query_vectors, dtype=np.float32)
+        if queries_np.ndim == 1 and queries_np.shape[0] == 0:
+            return []
+        with self.profiler.stage("search"):
+            return self._cached_search_batch(queries_np, k, filter_meta)
+
+    def _cached_search_batch(self, queries_np: np.ndarray, k: int,
+                             filter_meta: Optional[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        if self.cache is None or queries_np.ndim != 2:
+            return self._search_batch(queries_np, k, filter_meta)
+        generation = self._generation
+        keys = [QueryCache.key(query, k, filter_meta) for query in queries_np]
+        results = [self.cache.get(key, generation) for key in keys]
+        missing = [i for i, found in enumerate(results) if found is None]
+        if missing:
+            for i, found in zip(missing, self._search_batch(queries_np[missing], k, filter_meta)):
+                results[i] = found
+                self.cache.put(keys[i], generation, found)
+        return results
+
+    def _search_batch(self, queries_np: np.ndarray, k: int,
+                      filter_meta: Optional[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        snapshot = self._pinned()
+        if filter_meta:
+            raw_batches = self._filtered_search(snapshot, queries_np, k, filter_meta)
+        else:
+            raw_batches = snapshot.index.search_many(queries_np, k=k)
+        return [self._format_results(snapshot, raw, filter_meta) for raw in raw_batches]
+
+    def _filtered_search(self, snapshot: _Snapshot, queries_np: np.ndarray, k: int,
+                         filter_meta: Dict[str, Any]) -> List[List[Tuple[int, float]]]:
+        """
+        Plans a filtered search from the number of matching rows.
         
-        for idx, score in raw_results:
-            meta = self.metadata_store.get(idx, {})
+        Few matches are scored directly (cost proportional to the matches);
+        otherwise the index searches with the non-matching rows masked out.
+        """
+        index = snapshot.index
+        with self.profiler.stage("filter"):
+            rows = snapshot.ids.rows_of(self.metadata_store.select(filter_meta))
+            rows = np.sort(rows[rows >= 0])
+        if rows.shape[0] == 0:
+            return [[] for _ in range(queries_np.shape[0])]
+        if rows.shape[0] <= index.max_subset_rows():
+            return index.search_rows(queries_np, rows, k=k)
             
-            # Simple exact match filtering
-            if filter_meta:
-                match = True
-                for key, val in filter_meta.items():
-                    if meta.get(key) != val:
-                        match = False
-                        break
-                if not match:
+        mask = np.zeros(len(index), dtype=bool)
+        mask[rows] = True
+        results = index.search_many(queries_np, k=k, mask=mask)
+        
+        # An approximate index can miss matches under a mask; score those queries exactly
+        expected = min(k, rows.shape[0])
+        short = [i for i, raw in enumerate(results) if len(raw) < expected]
+        if short:
+            for i, raw in zip(short, index.search_rows(queries_np[short], rows, k=k)):
+                results[i] = raw
+        return results
+
+    def _format_results(self, snapshot: _Snapshot, raw_results: List[Tuple[int, float]],
+                        filter_meta: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Index results are rows; callers see the stable IDs
+        row_ids = snapshot.ids.row_ids
+        results = []
+        with self.profiler.stage("format"):
+            for row, score in raw_results:
+                idx = int(row_ids[row])
+                metadata = self.metadata_store.get(idx, {})
+                # The snapshot may predate a delete or an update. A delete unmaps the ID
+                # before dropping its record, so a record read first is current if the ID is live.
+                if self.concurrent and (
+                    idx not in self.ids or (filter_meta and not MetadataIndex.matches(metadata, filter_meta))
+                ):
                     continue
-            
-            result = {
-                "id": idx,
-                "score": score,
-                "metadata": meta
-            }
-            formatted_results.append(result)
-            count += 1
-            if count >= k:
-                break
-                
-        return formatted_results
+                results.append({"id": idx, "score": score, "metadata": metadata})
+        return results
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per-stage search timings recorded while ``profiler.enabled`` is set:
+        for each stage its ``count``, ``total_ms``, ``mean_ms`` and ``max_ms``.
+        """
+        return self.profiler.stats()
+
+    def reset_stats(self):
+        """Clears the recorded search timings."""
+        self.profiler.reset()
 
     def save(self, path: str):
-        """Save database to disk."""
-        save_db_to_disk(self, path)
+        """
+        Save database to disk.
+        
+        For a database opened with ``open`` and saved to its own directory
+        this is ``flush()``: only the changes since the last flush are written.
+        """
+        if self._segments is not None and os.path.abspath(path) == os.path.abspath(self._segments.path):
+            self.flush()
+            return
+        if SegmentStore.exists(path):
+            raise NanoVecError(f"{path} holds a segmented database; open it with VectorDB.open() to write to it.")
+        with self._write_lock:
+            save_db_to_disk(self, path)
         logger.info(f"Database saved to {path}")
         
     @classmethod
-    def load(cls, path: str) -> 'VectorDB':
-        """Load database from disk."""
-        db = load_db_from_disk(cls, path)
+    def load(cls, path: str, mmap: bool = False, concurrent: bool = False, cache_size: int = 0,
+             cache_ttl: Optional[float] = None) -> 'VectorDB':
+        """
+        Load database from disk.
+        With mmap=True the arrays are memory-mapped read-only instead of read into RAM.
+        A segmented database (see ``open``) is opened with its log replayed.
+        ``concurrent``, ``cache_size`` and ``cache_ttl`` are as for ``VectorDB``.
+        """
+        if SegmentStore.exists(path):
+            return cls.open(path, concurrent=concurrent, cache_size=cache_size, cache_ttl=cache_ttl)
+        db = load_db_from_disk(cls, path, mmap=mmap)
+        db._set_concurrent(concurrent)
+        db._set_cache(cache_size, cache_ttl)
         logger.info(f"Database loaded from {path}")
         return db
+
+    @classmethod
+    def open(cls, path: str, dimension: Optional[int] = None, metric: str = "cosine", index: str = "flat",
+             sync: bool = False, concurrent: bool = False, cache_size: int = 0, cache_ttl: Optional[float] = None,
+             **index_params: Any) -> 'VectorDB':
+        """
+        Opens (or creates) a database with incremental, crash-safe persistence.
+        
+        Every write (add, update, upsert, delete) is appended to a write-ahead
+        log in ``path``; ``flush()`` moves the logged changes into an immutable
+        segment and ``compact()`` merges the segments. Opening an existing
+        database loads its segments and replays the log, so writes since the
+        last flush survive a crash.
+        
+        Args:
+            path (str): The database directory.
+            dimension (Optional[int]): Vector dimensionality; required to create a new database.
+            metric (str): Similarity metric for a new database.
+            index (str): Index type for a new database.
+            sync (bool): fsync the log after every write (slower, survives power loss).
+            concurrent (bool): Publish snapshots for concurrent searches (see ``VectorDB``).
+            cache_size (int): Maximum number of cached query results (0 disables the cache).
+            cache_ttl (Optional[float]): Seconds a cached result stays valid.
+            **index_params: Index options for a new database.
+            
+        Returns:
+            VectorDB: The opened database. Call ``close()`` when done.
+        """
+        store = SegmentStore(path, sync=sync)
+        if SegmentStore.exists(path):
+            db = store.open(cls)
+        else:
+            if dimension is None:
+                raise FileNotFoundError(f"No database at {path}; pass 'dimension' to create one.")
+            db = cls(dimension, metric=metric, index=index, **index_params)
+            store.create(db)
+        db._segments = store
+        db._set_concurrent(concurrent)
+        db._set_cache(cache_size, cache_ttl)
+        logger.info(f"Database opened at {path}")
+        return db
+
+    def _set_concurrent(self, concurrent: bool):
+        with self._write_lock:
+            self.concurrent = concurrent
+            self._publish()
+
+    def _set_cache(self, cache_size: int, cache_ttl: Optional[float]):
+        self.cache = QueryCache(cache_size, ttl=cache_ttl) if cache_size else None
+
+    def _require_segments(self) -> SegmentStore:
+        if self._segments is None:
+            raise NanoVecError("This database has no segmented storage; create it with VectorDB.open().")
+        return self._segments
+
+    def flush(self) -> Optional[str]:
+        """
+        Writes the changes made since the last flush into a new segment.
+        
+        Returns:
+            Optional[str]: The new segment's name, or None if no segment was needed.
+        """
+        with self._write_lock:
+            return self._require_segments().flush(self)
+
+    def compact(self, background: bool = False):
+        """
+        Reclaims the space of deleted and replaced documents in bulk.
+        
+        Tombstoned rows are dropped from the index and the remaining rows
+        renumbered; document IDs do not change. For a database opened with
+        ``open`` the index is also checkpointed and the on-disk segments are
+        merged into one without the dead rows.
+        
+        Args:
+            background (bool): Merge the on-disk segments in a background
+                thread and return it (the in-memory part always runs inline).
+        """
+        with self._write_lock:
+            if self._segments is not None:
+                self.flush()
+            kept = self.index.compact()
+            if kept is not None:
+                self.ids.keep_rows(kept)
+                self._publish()
+            if self._segments is None:
+                return None
+            self._segments.rows_compacted(len(self.index))
+            self._segments.checkpoint(self)
+            return self._segments.compact(self, background=background)
+
+    def close(self):
+        """Flushes pending writes and closes the segmented storage, if any."""
+        with self._write_lock:
+            if self._segments is not None:
+                self.flush()
+                self._segments.close()
+                self._segments = None
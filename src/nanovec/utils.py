@@ -2,10 +2,93 @@ import os
 import json
 import logging
 import numpy as np
-from typing import Any
+from typing import Any, List
+
+from .exceptions import NanoVecError
+from .metadata import MetadataStore
+from .idmap import IdMap
 
 logger = logging.getLogger(__name__)
 
+# Version of the on-disk layout written by save_db_to_disk.
+#   1: vectors.npy + metadata.json (implicit, no "format_version" key)
+#   2: binary offset-indexed metadata (metadata.bin + id/offset arrays)
+#   3: stable document IDs (ids.npy + "next_id") and row tombstones
+FORMAT_VERSION = 3
+
+def _save_array(file_path: str, array: np.ndarray):
+    """
+    Writes an .npy file via a temporary file and an atomic rename, so that
+    arrays memory-mapped from the previous version stay valid.
+    """
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, file_path)
+
+def _save_blocks(file_path: str, shape: tuple, blocks: Any):
+    """
+    Writes a float32 .npy file of ``shape`` from an iterable of row blocks,
+    holding one block in memory at a time (temporary file + atomic rename).
+    """
+    tmp_path = file_path + ".tmp"
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=shape)
+    start = 0
+    for block in blocks:
+        out[start:start + block.shape[0]] = block
+        start += block.shape[0]
+    out.flush()
+    del out
+    os.replace(tmp_path, file_path)
+
+def _save_index(db: Any, path: str) -> List[str]:
+    """
+    Writes the vectors, cached norms, row IDs and index structures of ``db``
+    into ``path``. Returns the names of the index state arrays written.
+    """
+    # Save Vectors (full precision; absent when a codec keeps only codes)
+    vector_path = os.path.join(path, "vectors.npy")
+    if db.index.has_full_vectors:
+        _save_blocks(vector_path, (len(db.index), db.dimension), db.index.iter_full_vectors())
+    elif os.path.exists(vector_path):
+        os.remove(vector_path)
+    
+    # Save cached norms so loading does not recompute them
+    norms_path = os.path.join(path, "sq_norms.npy")
+    _save_array(norms_path, db.index.sq_norms)
+    
+    # Save the document ID of every row
+    _save_array(os.path.join(path, "ids.npy"), db.ids.row_ids)
+    
+    # Save index structures (e.g. codes, codebooks, IVF lists, HNSW graph, tombstones)
+    index_state = db.index.state_arrays()
+    for name, array in index_state.items():
+        _save_array(os.path.join(path, f"{name}.npy"), array)
+    return sorted(index_state)
+
+def _load_index(db: Any, path: str, index_state: List[str], next_id: int, mmap: bool = False):
+    """Restores the index and ID map of ``db`` from the files written by ``_save_index``."""
+    array_mmap_mode = "r" if mmap else None
+    vector_path = os.path.join(path, "vectors.npy")
+    state = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=array_mmap_mode)
+        for name in index_state
+    }
+    if os.path.exists(vector_path) or state:
+        # Full-precision vectors kept only for reranking always stay on disk
+        vector_mmap_mode = "r" if mmap or db.index.mmap_full_vectors else None
+        vectors = np.load(vector_path, mmap_mode=vector_mmap_mode) if os.path.exists(vector_path) else None
+        norms_path = os.path.join(path, "sq_norms.npy")
+        sq_norms = np.load(norms_path, mmap_mode=array_mmap_mode) if os.path.exists(norms_path) else None
+        db.index.restore(vectors, sq_norms=sq_norms, state=state)
+    
+    # Load the ID map (before version 3, IDs were the row numbers)
+    ids_path = os.path.join(path, "ids.npy")
+    if os.path.exists(ids_path):
+        db.ids = IdMap.from_rows(np.load(ids_path), next_id, deleted=db.index.deleted)
+    else:
+        db.ids = IdMap.identity(len(db.index))
+
 def save_db_to_disk(db: Any, path: str):
     """
     Saves the VectorDB to a directory safely.
@@ -13,28 +96,39 @@ def save_db_to_disk(db: Any, path: str):
     if not os.path.exists(path):
         os.makedirs(path)
         
-    # Save Vectors
-    vector_path = os.path.join(path, "vectors.npy")
-    np.save(vector_path, db.index.vectors)
+    index_state = _save_index(db, path)
     
-    # Save Metadata
-    # Convert IDs to strings for JSON compatibility
-    meta_path = os.path.join(path, "metadata.json")
-    meta_json = {str(k): v for k, v in db.metadata_store.items()}
-    with open(meta_path, "w") as f:
-        json.dump(meta_json, f, indent=2)
+    # Save Metadata (binary records; drop a version 1 metadata.json if present)
+    db.metadata_store.save(path)
+    legacy_meta_path = os.path.join(path, "metadata.json")
+    if os.path.exists(legacy_meta_path):
+        os.remove(legacy_meta_path)
         
-    # Save Config
+    # Save Config last: it names the files that make up this version
     config_path = os.path.join(path, "config.json")
-    config = {"dimension": db.dimension}
-    with open(config_path, "w") as f:
+    config = {
+        "format_version": FORMAT_VERSION,
+        "dimension": db.dimension,
+        "metric": db.metric,
+        "index": db.index.index_type,
+        "index_params": db.index.get_params(),
+        "index_state": index_state,
+        "next_id": db.ids.next_id,
+    }
+    with open(config_path + ".tmp", "w") as f:
         json.dump(config, f)
+    os.replace(config_path + ".tmp", config_path)
         
     logger.debug(f"Saved DB artifacts to {path}")
 
-def load_db_from_disk(db_class: Any, path: str) -> Any:
+def load_db_from_disk(db_class: Any, path: str, mmap: bool = False) -> Any:
     """
     Loads a VectorDB from a directory.
+    
+    With ``mmap=True`` vectors, norms and index arrays are memory-mapped
+    read-only, so the OS page cache is shared between processes and opening
+    is close to constant time. Metadata records are decoded on access in
+    both modes.
     """
     if not os.path.exists(path):
         raise FileNotFoundError(f"Database path not found: {path}")
@@ -46,23 +140,36 @@ def load_db_from_disk(db_class: Any, path: str) -> Any:
     with open(config_path, "r") as f:
         config = json.load(f)
         
+    format_version = config.get("format_version", 1)
+    if format_version > FORMAT_VERSION:
+        raise NanoVecError(
+            f"Database at {path} uses format version {format_version}; "
+            f"this NanoVec supports up to {FORMAT_VERSION}."
+        )
+        
     dimension = config.get("dimension")
     if not dimension:
         raise ValueError("Invalid config: missing 'dimension'")
         
-    new_db = db_class(dimension=dimension)
+    new_db = db_class(
+        dimension=dimension,
+        metric=config.get("metric", "cosine"),
+        index=config.get("index", "flat"),
+        **config.get("index_params", {}),
+    )
     
-    # Load Vectors
-    vector_path = os.path.join(path, "vectors.npy")
-    if os.path.exists(vector_path):
-        new_db.index.vectors = np.load(vector_path)
+    # Load Vectors, cached norms, index structures and the ID map
+    _load_index(new_db, path, config.get("index_state", []), config.get("next_id", 0), mmap=mmap)
     
     # Load Metadata
-    meta_path = os.path.join(path, "metadata.json")
-    if os.path.exists(meta_path):
-        with open(meta_path, "r") as f:
-            meta_json = json.load(f)
-            # Convert keys back to int
-            new_db.metadata_store = {int(k): v for k, v in meta_json.items()}
+    if format_version >= 2:
+        new_db.metadata_store = MetadataStore.load(path, mmap_mode=mmap)
+    else:
+        meta_path = os.path.join(path, "metadata.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                meta_json = json.load(f)
+                # Convert keys back to int
+                new_db.metadata_store.update({int(k): v for k, v in meta_json.items()})
             
     return new_db
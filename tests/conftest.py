@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+@pytest.fixture
+def vectors():
+    """Factory of reproducible float32 test vectors: ``vectors(n, dimension=8, seed=0)``."""
+    def make(n, dimension=8, seed=0):
+        return np.random.default_rng(seed).standard_normal((n, dimension)).astype(np.float32)
+    return make
+
+@pytest.fixture
+def recall():
+    """``recall(db, exact, queries, k=10)``: the fraction of ``exact``'s top-k that ``db`` finds."""
+    def measure(db, exact, queries, k=10):
+        hits = 0
+        for query in queries:
+            expected = {r['id'] for r in exact.search(query.tolist(), k=k)}
+            hits += len(expected & {r['id'] for r in db.search(query.tolist(), k=k)})
+        return hits / (len(queries) * k)
+    return measure
@@ -0,0 +1,47 @@
+import asyncio
+import pytest
+from nanovec import AsyncVectorDB, VectorDB, DimensionMismatchError
+
+def test_concurrent_searches_are_batched(vectors):
+    data = vectors(200)
+    db = VectorDB(dimension=8)
+    db.add_many(data, [{"i": i, "even": i % 2 == 0} for i in range(200)])
+
+    async def main():
+        async with AsyncVectorDB(db, max_batch_size=16, max_wait_ms=50) as adb:
+            results = await asyncio.gather(*[adb.search(data[i].tolist(), k=3) for i in range(40)])
+            filtered = await asyncio.gather(
+                adb.search(data[1].tolist(), k=2, filter_meta={"even": True}),
+                adb.search(data[2].tolist(), k=2, filter_meta={"even": True}),
+                adb.search(data[2].tolist(), k=2),
+            )
+            with pytest.raises(DimensionMismatchError):
+                await adb.search([1.0, 2.0])
+            return results, filtered, adb.batches, adb.batched_queries
+
+    results, filtered, batches, batched = asyncio.run(main())
+    assert [r[0]["id"] for r in results] == list(range(40))
+    assert results[7] == db.search(data[7].tolist(), k=3)
+    assert all(r["metadata"]["even"] for r in filtered[0] + filtered[1])
+    assert filtered[2][0]["id"] == 2
+    # 40 queries in batches of at most 16, then one batch per (k, filter) group
+    assert batched == 43 and batches == 5
+
+def test_writes_run_off_the_loop(vectors):
+    data = vectors(20)
+    db = VectorDB(dimension=8, concurrent=True)
+
+    async def main():
+        adb = AsyncVectorDB(db, max_wait_ms=0)
+        ids = await adb.add_many(data[:10], [{"i": i} for i in range(10)])
+        new_id = await adb.add(data[10].tolist(), {"i": 10})
+        assert await adb.delete(ids[:2]) == 2
+        found = await adb.search(data[10].tolist(), k=1)
+        many = await adb.search_many(data[:3], k=1)
+        meta = await adb.get(new_id)
+        await adb.close()
+        return new_id, found, many, meta
+
+    new_id, found, many, meta = asyncio.run(main())
+    assert found[0]["id"] == new_id and meta == {"i": 10}
+    assert many[2][0]["id"] == 2 and many[0][0]["id"] not in (0, 1)
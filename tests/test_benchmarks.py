@@ -0,0 +1,52 @@
+import json
+import numpy as np
+import pytest
+from nanovec.benchmarks import from_files, recall_at_k, run_benchmark, summarize, synthetic
+from nanovec.benchmarks.__main__ import main
+
+def test_flat_benchmark_report():
+    dataset = synthetic(num_vectors=400, dimension=16, num_queries=20)
+    report = run_benchmark(dataset, k=5, batch_size=100, single_adds=50)
+    results = report["results"]
+    assert list(results) == ["add", "add_many", "search", "search_filtered", "save", "load", "load_mmap"]
+    assert results["add"]["count"] == 50 and results["add_many"]["count"] == 4
+    # The exact index matches the exact ground truth
+    assert results["search"]["recall"] == 1.0 and results["search_filtered"]["recall"] == 1.0
+    assert results["search"]["p99_ms"] >= results["search"]["p50_ms"] > 0
+    assert {"score", "top_k", "format"} <= set(results["search"]["stages"])
+    assert "filter" in results["search_filtered"]["stages"]
+    assert all(result["peak_alloc_mb"] >= 0 for result in results.values())
+    # A larger collection allocates more to load
+    bigger = run_benchmark(synthetic(num_vectors=4000, dimension=16, num_queries=5), k=5, batch_size=1000,
+                           single_adds=0)["results"]
+    assert bigger["load"]["peak_alloc_mb"] > results["load"]["peak_alloc_mb"]
+    assert report["dataset"]["vectors"] == 400 and report["config"]["index"] == "flat"
+    json.dumps(report)
+
+def test_approximate_recall_and_cli(tmp_path):
+    dataset = synthetic(num_vectors=600, dimension=8, num_queries=20)
+    np.save(tmp_path / "vectors.npy", dataset.vectors)
+    output = tmp_path / "report.json"
+    report = main([
+        "--vectors", str(tmp_path / "vectors.npy"), "--num-queries", "20", "--index", "ivf",
+        "--param", "nlist=8", "--param", "nprobe=2", "--k", "5", "--no-memory", "--output", str(output),
+    ])
+    assert json.loads(output.read_text()) == json.loads(json.dumps(report))
+    assert report["config"]["index_params"]["nprobe"] == 2
+    assert 0.3 < report["results"]["search"]["recall"] <= 1.0
+    assert "search_filtered" not in report["results"]
+    assert "probe" in report["results"]["search"]["stages"]
+    assert report["results"]["search"]["peak_alloc_mb"] is None
+    with pytest.raises(ValueError):
+        from_files(tmp_path / "vectors.npy", metadata_path=_write_jsonl(tmp_path, 3))
+
+def _write_jsonl(tmp_path, count):
+    path = tmp_path / "meta.jsonl"
+    path.write_text("".join(json.dumps({"i": i}) + "\n" for i in range(count)))
+    return path
+
+def test_summaries():
+    summary = summarize([0.001] * 99 + [0.1], items=1000)
+    assert summary["p50_ms"] == pytest.approx(1.0) and summary["p99_ms"] > 1.0
+    assert summary["qps"] == pytest.approx(100 / 0.199)
+    assert recall_at_k([[1, 2], [3, 4]], [[1, 5], []]) == 0.5
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from nanovec import VectorDB
+from nanovec.cache import QueryCache
+
+def test_repeated_queries_hit_the_cache(vectors):
+    data = vectors(100)
+    db = VectorDB(dimension=8, cache_size=16)
+    db.add_many(data, [{"i": i, "even": i % 2 == 0} for i in range(100)])
+    query = data[3].tolist()
+
+    first = db.search(query, k=3, filter_meta={"even": False})
+    assert db.search(query, k=3, filter_meta={"even": False}) == first
+    assert db.cache.stats()["hits"] == 1
+    # k and the filter are part of the key
+    db.search(query, k=4, filter_meta={"even": False})
+    db.search(query, k=3)
+    assert db.cache.stats() == {"hits": 1, "misses": 3, "evictions": 0, "invalidations": 0, "size": 3}
+
+    # Callers cannot corrupt cached entries
+    first[0]["id"] = -1
+    assert db.search(query, k=3, filter_meta={"even": False})[0]["id"] == 3
+
+    # search_many only searches the queries the cache cannot answer
+    batch = db.search_many([query, data[5].tolist()], k=3)
+    assert batch[0] == db.search(query, k=3)
+    assert db.cache.hits == 4 and db.cache.misses == 4
+
+def test_writes_invalidate_cached_results(vectors):
+    data = vectors(50)
+    db = VectorDB(dimension=8, cache_size=16)
+    db.add_many(data[:40], [{"i": i} for i in range(40)])
+    query = data[45].tolist()
+    assert db.search(query, k=1)[0]["id"] != 40
+
+    new_id = db.add(query, {"i": 40})
+    assert db.search(query, k=1)[0]["id"] == new_id
+    assert db.cache.invalidations == 1
+
+    db.update(new_id, metadata={"i": "updated"})
+    assert db.search(query, k=1)[0]["metadata"] == {"i": "updated"}
+    db.delete(new_id)
+    assert db.search(query, k=1)[0]["id"] != new_id
+    assert db.cache.hits == 0
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    cache = QueryCache(max_entries=2)
+    keys = [QueryCache.key(np.full(4, i, dtype=np.float32), 5, None) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, 0, [{"id": i}])
+        cache.get(keys[0], 0)
+    assert cache.get(keys[1], 0) is None
+    assert cache.get(keys[0], 0) == [{"id": 0}] and cache.evictions == 1
+    # Filters are canonicalized: key order does not matter
+    assert QueryCache.key(np.zeros(4), 1, {"a": 1, "b": 2}) == QueryCache.key(np.zeros(4), 1, {"b": 2, "a": 1})
+
+    clock = [100.0]
+    monkeypatch.setattr("nanovec.cache.time.monotonic", lambda: clock[0])
+    cache = QueryCache(max_entries=2, ttl=5.0)
+    cache.put(keys[0], 0, [])
+    clock[0] += 6.0
+    assert cache.get(keys[0], 0) is None and cache.evictions == 1
+    with pytest.raises(ValueError):
+        QueryCache(max_entries=0)
+
+def test_cache_options_on_load(tmp_path):
+    db = VectorDB(dimension=4)
+    db.add([1, 0, 0, 0], {"a": 1})
+    db.save(str(tmp_path / "db"))
+    assert VectorDB.load(str(tmp_path / "db")).cache is None
+    loaded = VectorDB.load(str(tmp_path / "db"), cache_size=8, cache_ttl=60.0)
+    assert loaded.cache.max_entries == 8 and loaded.cache.ttl == 60.0
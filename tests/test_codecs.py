@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from nanovec import VectorDB
+from nanovec.exceptions import DimensionMismatchError
+
+def _data(seed=0, n=2000, dimension=32):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(n, dimension)).astype(np.float32), rng.normal(size=(20, dimension)).astype(np.float32)
+
+@pytest.mark.parametrize("codec, params, min_recall", [
+    ("float16", {}, 0.95),
+    ("sq8", {"codec_train_size": 1000}, 0.95),
+    ("pq", {"pq_m": 8, "codec_train_size": 1000}, 0.95),
+])
+def test_codec_recall_with_rerank(codec, params, min_recall, recall):
+    data, queries = _data()
+    exact = VectorDB(dimension=32)
+    exact.add_many(data.tolist(), [{} for _ in data])
+    
+    db = VectorDB(dimension=32, codec=codec, rerank=10, **params)
+    db.add_many(data.tolist(), [{} for _ in data])
+    assert db.index.codes.dtype != np.float32
+    assert recall(db, exact, queries) >= min_recall
+
+def test_sq8_codes_are_compact_and_close():
+    data, _ = _data(n=1500)
+    db = VectorDB(dimension=32, metric="ip", codec="sq8", codec_train_size=1000)
+    db.add_many(data.tolist(), [{} for _ in data])
+    
+    assert db.index.codes.dtype == np.uint8
+    assert db.index.codes.nbytes == data.nbytes // 4
+    assert np.abs(db.index.vectors - data).max() < 0.05
+    assert db.index.full_vectors is None
+
+def test_codec_trains_after_threshold():
+    data, _ = _data(n=300, dimension=8)
+    db = VectorDB(dimension=8, codec="sq8", codec_train_size=200)
+    for vector in data[:150]:
+        db.add(vector.tolist(), {})
+    # Untrained: rows are still float32 and search is exact
+    assert db.index.codes.dtype == np.float32
+    assert db.search(data[3].tolist(), k=1)[0]['id'] == 3
+    
+    db.add_many(data[150:].tolist(), [{} for _ in range(150)])
+    assert db.index.codes.dtype == np.uint8
+    assert db.search(data[3].tolist(), k=1)[0]['id'] == 3
+
+def test_pq_requires_divisible_dimension():
+    with pytest.raises(DimensionMismatchError):
+        VectorDB(dimension=10, codec="pq", pq_m=4)
+
+def test_pq_rejects_a_train_size_below_its_codebook_size():
+    with pytest.raises(ValueError):
+        VectorDB(dimension=8, codec="pq", pq_m=2, codec_train_size=100)
+    db = VectorDB(dimension=8, codec="pq", pq_m=2, codec_train_size=256)
+    db.add_many(np.random.default_rng(0).normal(size=(256, 8)).tolist(), [{} for _ in range(256)])
+    assert db.index.codec.is_trained and len(db.index) == len(db.ids) == 256
+
+@pytest.mark.parametrize("index_params", [
+    {"codec": "pq", "pq_m": 4, "rerank": 4},
+    {"codec": "sq8", "index": "ivf", "nlist": 8, "nprobe": 8},
+    {"codec": "float16", "index": "hnsw", "M": 8, "ef_construction": 32},
+])
+def test_codec_persistence(tmp_path, index_params):
+    data, queries = _data(n=600, dimension=16)
+    db = VectorDB(dimension=16, codec_train_size=512, **index_params)
+    db.add_many(data.tolist(), [{"i": i} for i in range(600)])
+    
+    path = str(tmp_path / "codec_db")
+    db.save(path)
+    new_db = VectorDB.load(path)
+    
+    np.testing.assert_array_equal(new_db.index.codes, db.index.codes)
+    assert new_db.index.codec.name == db.index.codec.name
+    for query in queries[:5]:
+        assert new_db.search(query.tolist(), k=5) == db.search(query.tolist(), k=5)
+    
+    if db.index.rerank:
+        # Full-precision rows stay memory-mapped and new rows still rerank
+        assert isinstance(new_db.index._raw_base, np.memmap)
+        idx = new_db.add(data[0].tolist(), {"i": "copy"})
+        assert {r['id'] for r in new_db.search(data[0].tolist(), k=2)} == {0, idx}
+
+def test_rerank_vectors_stay_on_disk_through_compact_and_save(tmp_path):
+    data, _ = _data(n=600, dimension=16)
+    db = VectorDB(dimension=16, codec="sq8", rerank=4, codec_train_size=256, block_size=64)
+    db.add_many(data, [{"i": i} for i in range(600)])
+    db.save(str(tmp_path / "a"))
+
+    loaded = VectorDB.load(str(tmp_path / "a"))
+    loaded.add(data[1].tolist(), {"i": "copy"})
+    loaded.delete(list(range(0, 600, 3)))
+    loaded.compact()
+    # Kept rows were rewritten block by block into a new memory map
+    assert isinstance(loaded.index._raw_base, np.memmap)
+    assert loaded.index._raw_base.shape[0] == 401
+    np.testing.assert_array_equal(loaded.index.get_vectors(np.array([0, 400])), data[[1, 1]])
+
+    loaded.save(str(tmp_path / "b"))
+    reloaded = VectorDB.load(str(tmp_path / "b"))
+    np.testing.assert_array_equal(reloaded.index.vectors, loaded.index.vectors)
+    assert reloaded.search(data[5].tolist(), k=1)[0]["id"] == 5
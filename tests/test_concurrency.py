@@ -0,0 +1,112 @@
+import threading
+import numpy as np
+import pytest
+from nanovec import VectorDB
+from nanovec.index import VectorIndex
+
+@pytest.mark.parametrize("metric", ["cosine", "l2"])
+def test_sharded_scan_matches_single_thread(metric, vectors):
+    data = vectors(20000)
+    queries = vectors(5, seed=1)
+    mask = np.random.default_rng(2).random(20000) < 0.5
+
+    single = VectorIndex(8, metric=metric, block_size=1024)
+    sharded = VectorIndex(8, metric=metric, block_size=1024, threads=4)
+    single.add_many(data)
+    sharded.add_many(data)
+
+    expected = single.search_many(queries, k=10, mask=mask)
+    for got, want in zip(sharded.search_many(queries, k=10, mask=mask), expected):
+        assert [idx for idx, _ in got] == [idx for idx, _ in want]
+        np.testing.assert_allclose([s for _, s in got], [s for _, s in want], rtol=1e-5)
+
+def test_snapshot_is_isolated_from_later_writes():
+    index = VectorIndex(2)
+    index.add_many(np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32))
+    view = index.snapshot()
+
+    index.add_many(np.array([[1.0, 0.1]] * 100, dtype=np.float32))
+    index.delete_rows(np.array([0]))
+    assert len(view) == 2
+    assert view.search(np.array([1.0, 0.0], dtype=np.float32), k=5)[0][0] == 0
+    assert index.search(np.array([1.0, 0.0], dtype=np.float32), k=1)[0][0] >= 2
+
+    index.compact()
+    assert [idx for idx, _ in view.search(np.array([0.0, 1.0], dtype=np.float32), k=2)] == [1, 0]
+
+@pytest.mark.parametrize("index,params", [
+    ("flat", {}),
+    ("ivf", {"nlist": 8}),
+    ("hnsw", {"M": 8, "ef_construction": 32}),
+])
+def test_searches_run_concurrently_with_writes(index, params, vectors):
+    data = vectors(600)
+    db = VectorDB(dimension=8, index=index, concurrent=True, **params)
+    db.add_many(data[:200], [{"i": i} for i in range(200)])
+
+    errors = []
+    done = threading.Event()
+
+    def reader(seed):
+        rng = np.random.default_rng(seed)
+        try:
+            while not done.is_set():
+                i = int(rng.integers(200))
+                results = db.search(data[i].tolist(), k=5, filter_meta={"i": {"$lt": 1000}})
+                assert all(r["id"] < 600 for r in results)
+                db.search_many(data[i:i + 3], k=3)
+        except Exception as error:  # pragma: no cover - reported below
+            errors.append(error)
+
+    readers = [threading.Thread(target=reader, args=(seed,)) for seed in range(2)]
+    for thread in readers:
+        thread.start()
+    for start in range(200, 600, 50):
+        db.add_many(data[start:start + 50], [{"i": i} for i in range(start, start + 50)])
+        db.delete(list(range(start - 200, start - 190)))
+        db.update(start, metadata={"i": start, "updated": True})
+    db.compact()
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    assert not errors
+    assert len(db.ids) == 520
+    assert db.search(data[550].tolist(), k=1)[0]["id"] == 550
+
+def test_results_never_include_deleted_or_filtered_out_documents(vectors):
+    data = vectors(2000)
+    db = VectorDB(dimension=8, concurrent=True)
+    db.add_many(data, [{"g": i % 50} for i in range(2000)])
+
+    errors = []
+    done = threading.Event()
+
+    def reader(seed):
+        rng = np.random.default_rng(seed)
+        try:
+            while not done.is_set():
+                query = data[int(rng.integers(2000))]
+                for results in (db.search(query, k=10, filter_meta={"g": 1}),
+                                *db.search_many(query[np.newaxis, :], k=10, filter_meta={"g": 1})):
+                    # A document deleted meanwhile would come back with empty metadata
+                    assert all(r["metadata"] == {"g": 1} for r in results)
+        except Exception as error:  # pragma: no cover - reported below
+            errors.append(error)
+
+    readers = [threading.Thread(target=reader, args=(seed,)) for seed in range(2)]
+    for thread in readers:
+        thread.start()
+    # Churn the documents that match the filter: delete some, move others out of it
+    for i in range(1, 2000, 50):
+        db.delete([i])
+        if i + 50 < 2000:
+            db.update(i + 50, metadata={"g": 2})
+        db.upsert(i, data[i], {"g": 1})
+        db.delete([i])
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    assert not errors
+    assert db.search(data[1], k=10, filter_meta={"g": 1}) == []
@@ -1,6 +1,9 @@
+import json
 import numpy as np
 import pytest
 from nanovec import VectorDB, NanoVecError, DimensionMismatchError
+from nanovec.index import VectorIndex
+from nanovec.utils import FORMAT_VERSION
 
 def test_initialization():
     db = VectorDB(dimension=3)
@@ -65,3 +68,218 @@ def test_persistence(tmp_path):
     
     results = new_db.search([1.0, 0.0], k=1)
     assert results[0]['metadata']['data'] == "test"
+
+def test_incremental_add_grows_buffer():
+    db = VectorDB(dimension=2)
+    for i in range(100):
+        db.add([float(i), 1.0], {"i": i})
+    
+    assert db.index.vectors.shape == (100, 2)
+    assert db.index.capacity >= 100
+    assert db.index.vectors[42].tolist() == [42.0, 1.0]
+    
+    db.index.shrink_to_fit()
+    assert db.index.capacity == 100
+    
+    db.index.reserve(500)
+    assert db.index.capacity == 500
+    assert db.index.vectors.shape == (100, 2)
+
+def test_metrics():
+    vectors = [[1.0, 0.0], [3.0, 0.0], [0.0, 2.0]]
+    
+    cosine_db = VectorDB(dimension=2, metric="cosine")
+    cosine_db.add_many(vectors, [{}, {}, {}])
+    assert cosine_db.search([1.0, 0.0], k=1)[0]['score'] == pytest.approx(1.0)
+    
+    ip_db = VectorDB(dimension=2, metric="ip")
+    ip_db.add_many(vectors, [{}, {}, {}])
+    results = ip_db.search([1.0, 0.0], k=1)
+    assert results[0]['id'] == 1
+    assert results[0]['score'] == pytest.approx(3.0)
+    
+    l2_db = VectorDB(dimension=2, metric="l2")
+    l2_db.add_many(vectors, [{}, {}, {}])
+    results = l2_db.search([2.9, 0.0], k=2)
+    assert [r['id'] for r in results] == [1, 0]
+    assert results[0]['score'] == pytest.approx(-0.01, abs=1e-5)
+    
+    with pytest.raises(ValueError):
+        VectorDB(dimension=2, metric="hamming")
+
+def test_persistence_keeps_metric_and_norms(tmp_path):
+    db = VectorDB(dimension=2, metric="l2")
+    db.add_many([[3.0, 4.0], [0.0, 1.0]], [{}, {}])
+    
+    save_dir = tmp_path / "l2_db"
+    db.save(str(save_dir))
+    assert (save_dir / "sq_norms.npy").exists()
+    
+    new_db = VectorDB.load(str(save_dir))
+    assert new_db.metric == "l2"
+    assert new_db.index.norms.tolist() == [5.0, 1.0]
+    assert new_db.search([0.0, 1.0], k=1)[0]['id'] == 1
+
+def test_search_many_matches_search():
+    rng = np.random.default_rng(0)
+    db = VectorDB(dimension=8)
+    db.add_many(rng.normal(size=(200, 8)).tolist(), [{"i": i} for i in range(200)])
+    queries = rng.normal(size=(16, 8))
+    
+    batched = db.search_many(queries.tolist(), k=5)
+    assert len(batched) == 16
+    for query, results in zip(queries, batched):
+        single = db.search(query.tolist(), k=5)
+        assert [r['id'] for r in results] == [r['id'] for r in single]
+        assert [r['score'] for r in results] == pytest.approx([r['score'] for r in single], abs=1e-5)
+
+def test_search_many_with_filter():
+    db = VectorDB(dimension=2)
+    db.add([1.0, 0.0], {"type": "fruit"})
+    db.add([0.0, 1.0], {"type": "car"})
+    
+    results = db.search_many([[1.0, 0.0], [0.0, 1.0]], k=5, filter_meta={"type": "car"})
+    assert [[r['id'] for r in res] for res in results] == [[1], [1]]
+
+def test_blocked_scan_matches_full_sort():
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(1000, 16)).astype(np.float32)
+    query = rng.normal(size=16).astype(np.float32)
+    
+    index = VectorIndex(dimension=16, block_size=64)
+    index.add_many(vectors)
+    results = index.search(query, k=10)
+    
+    scores = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    expected = np.argsort(scores)[::-1][:10]
+    assert [idx for idx, _ in results] == expected.tolist()
+    assert [score for _, score in results] == pytest.approx(scores[expected].tolist(), abs=1e-5)
+
+def test_mmap_load(tmp_path):
+    db = VectorDB(dimension=2)
+    db.add_many([[1.0, 0.0], [0.0, 1.0]], [{"name": "A"}, {"name": "B"}])
+    save_dir = str(tmp_path / "mmap_db")
+    db.save(save_dir)
+    
+    new_db = VectorDB.load(save_dir, mmap=True)
+    assert isinstance(new_db.index.vectors, np.memmap)
+    assert new_db.search([0.0, 1.0], k=1)[0]['metadata'] == {"name": "B"}
+    assert new_db.get(0) == {"name": "A"}
+    
+    # Writes move the data into memory; the files are left untouched
+    idx = new_db.add([1.0, 1.0], {"name": "C"})
+    assert new_db.search([1.0, 1.0], k=1)[0]['id'] == idx
+    assert len(VectorDB.load(save_dir).metadata_store) == 2
+
+def test_load_legacy_format(tmp_path):
+    save_dir = tmp_path / "v1_db"
+    save_dir.mkdir()
+    np.save(save_dir / "vectors.npy", np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32))
+    (save_dir / "metadata.json").write_text(json.dumps({"0": {"name": "A"}, "1": {"name": "B"}}))
+    (save_dir / "config.json").write_text(json.dumps({"dimension": 2}))
+    
+    db = VectorDB.load(str(save_dir))
+    assert db.get(1) == {"name": "B"}
+    assert db.search([1.0, 0.0], k=1)[0]['metadata'] == {"name": "A"}
+    
+    # Saving upgrades the directory to the current format
+    db.save(str(save_dir))
+    assert not (save_dir / "metadata.json").exists()
+    assert json.loads((save_dir / "config.json").read_text())["format_version"] == FORMAT_VERSION
+
+def test_load_rejects_newer_format(tmp_path):
+    db = VectorDB(dimension=2)
+    save_dir = tmp_path / "future_db"
+    db.save(str(save_dir))
+    config = json.loads((save_dir / "config.json").read_text())
+    config["format_version"] = 99
+    (save_dir / "config.json").write_text(json.dumps(config))
+    
+    with pytest.raises(NanoVecError):
+        VectorDB.load(str(save_dir))
+
+def test_delete_update_and_upsert():
+    db = VectorDB(dimension=2)
+    db.add_many([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]], [{"i": 0}, {"i": 1}, {"i": 2}])
+    
+    assert db.delete([0, 7]) == 1
+    assert db.get(0) is None
+    assert [r["id"] for r in db.search([1.0, 0.0], k=3)] == [2, 1]
+    
+    # Updating appends a new row but keeps the ID
+    db.update(1, vector=[1.0, 0.0])
+    assert db.search([1.0, 0.0], k=1)[0] == {"id": 1, "score": pytest.approx(1.0), "metadata": {"i": 1}}
+    db.update(2, metadata={"i": 20})
+    assert db.get(2) == {"i": 20}
+    assert db.search([1.0, 1.0], k=1, filter_meta={"i": 20})[0]["id"] == 2
+    with pytest.raises(KeyError):
+        db.update(0, metadata={})
+    
+    db.upsert(0, [0.0, 1.0], {"i": 0})
+    db.upsert(5, [0.0, 1.0], {"i": 5})
+    assert db.add([1.0, 0.0]) == 6
+    assert len(db.ids) == 5
+
+    # IDs index dense arrays: a huge jump would allocate memory for every skipped ID
+    with pytest.raises(ValueError, match="too far"):
+        db.upsert(10**9, [0.0, 1.0])
+    with pytest.raises(ValueError, match="too far"):
+        db.upsert_many([8, 10**9], [[0.0, 1.0], [1.0, 0.0]], [{}, {}])
+    assert db.ids.next_id == 7 and len(db.ids) == 5
+
+def test_compact_keeps_ids(tmp_path):
+    db = VectorDB(dimension=2)
+    db.add_many([[float(i), 1.0] for i in range(10)], [{"i": i} for i in range(10)])
+    db.delete([0, 2, 4])
+    db.update(9, vector=[-1.0, 0.0])
+    assert len(db.index) == 11
+    
+    db.compact()
+    assert len(db.index) == 7
+    assert db.index.live_count == 7
+    assert db.search([-1.0, 0.0], k=1)[0]["id"] == 9
+    assert sorted(r["id"] for r in db.search([1.0, 1.0], k=10)) == [1, 3, 5, 6, 7, 8, 9]
+    assert db.add([1.0, 0.0]) == 10
+
+@pytest.mark.parametrize("index,params", [("flat", {}), ("ivf", {"nlist": 4}), ("hnsw", {})])
+def test_tombstones_persist(tmp_path, index, params):
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((300, 8)).astype(np.float32)
+    db = VectorDB(dimension=8, index=index, **params)
+    db.add_many(data.tolist(), [{"i": i} for i in range(300)])
+    db.delete(list(range(0, 300, 2)))
+    db.update(1, vector=data[0].tolist())
+    
+    db.save(str(tmp_path / "db"))
+    loaded = VectorDB.load(str(tmp_path / "db"))
+    assert len(loaded.ids) == 150
+    assert loaded.search(data[0].tolist(), k=1)[0]["id"] == 1
+    assert all(r["id"] % 2 for r in loaded.search(data[10].tolist(), k=20))
+    assert loaded.add(data[0].tolist()) == 300
+
+def test_unknown_index_options_are_rejected():
+    with pytest.raises(TypeError):
+        VectorDB(dimension=8, index="ivf", nprob=4)
+    with pytest.raises(TypeError):
+        VectorDB(dimension=8, nlist=4)
+    with pytest.raises(TypeError):
+        VectorDB(dimension=8, codec="sq8", pq_m=2)
+
+def test_search_stage_timings():
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((200, 8)).astype(np.float32)
+    db = VectorDB(dimension=8, block_size=64)
+    db.add_many(data, [{"even": i % 2 == 0} for i in range(200)])
+    db.search(data[0].tolist(), k=3)
+    assert db.stats() == {}
+
+    db.profiler.enabled = True
+    db.search(data[0].tolist(), k=3)
+    db.search_many(data[:5], k=3, filter_meta={"even": True})
+    stats = db.stats()
+    assert {"search", "filter", "score", "top_k", "rerank", "format"} <= set(stats)
+    assert stats["search"]["count"] == 2
+    assert stats["score"]["count"] >= 4  # one per block of the unfiltered scan
+    assert stats["search"]["total_ms"] >= stats["search"]["max_ms"] > 0
+    db.reset_stats()
+    assert db.stats() == {}
@@ -0,0 +1,152 @@
+import numpy as np
+import pytest
+from nanovec import VectorDB
+from nanovec.filters import MetadataIndex
+from nanovec.metadata import MetadataStore
+
+RECORDS = {
+    0: {"genre": "scifi", "year": 1984, "tags": ["classic"]},
+    1: {"genre": "drama", "year": 2001},
+    2: {"genre": "scifi", "year": 2015, "rating": 4.5},
+    3: {"genre": "horror", "year": 1999, "rating": None},
+    4: {"year": 2020, "tags": ["new", "hot"]},
+}
+
+@pytest.mark.parametrize("filter_meta, expected", [
+    ({"genre": "scifi"}, [0, 2]),
+    ({"genre": None}, [4]),
+    ({"rating": None}, [0, 1, 3, 4]),
+    ({"tags": ["new", "hot"]}, [4]),
+    ({"genre": {"$in": ["drama", "horror"]}}, [1, 3]),
+    ({"genre": {"$nin": ["scifi"]}}, [1, 3, 4]),
+    ({"genre": {"$ne": "scifi"}, "year": {"$lt": 2010}}, [1, 3]),
+    ({"year": {"$gte": 1999, "$lte": 2015}}, [1, 2, 3]),
+    ({"rating": {"$gt": 4}}, [2]),
+    ({"$or": [{"genre": "drama"}, {"year": {"$gt": 2016}}]}, [1, 4]),
+    ({"$and": [{"genre": "scifi"}, {"$or": [{"year": 1984}, {"rating": 4.5}]}]}, [0, 2]),
+    ({"missing": {"$gt": 0}}, []),
+])
+def test_filter_operators(filter_meta, expected):
+    index = MetadataIndex.build(RECORDS.items(), lookup=RECORDS.__getitem__)
+    assert index.select(filter_meta).tolist() == expected
+    assert [key for key, record in RECORDS.items() if MetadataIndex.matches(record, filter_meta)] == expected
+
+def test_invalid_filters_raise():
+    index = MetadataIndex.build(RECORDS.items(), lookup=RECORDS.__getitem__)
+    for bad in ({"$xor": []}, {"year": {"$near": 1}}, {"year": {"$gt": "x"}}, {"genre": {"$in": "scifi"}}):
+        with pytest.raises(ValueError):
+            index.select(bad)
+
+def test_index_tracks_store_writes_and_persists(tmp_path):
+    store = MetadataStore()
+    store.update(RECORDS)
+    assert store.select({"genre": "scifi"}).tolist() == [0, 2]
+    store[2] = {"genre": "drama", "year": 2015}
+    del store[0]
+    store[7] = {"genre": "scifi", "year": 1990}
+    assert store.select({"genre": "scifi"}).tolist() == [7]
+    assert store.select({"year": {"$gt": 2010}}).tolist() == [2, 4]
+    store.save(str(tmp_path))
+
+    loaded = MetadataStore.load(str(tmp_path))
+    # Opened on the first filter, with the writes made since loading applied
+    assert loaded._field_index is None
+    loaded[1] = {"genre": "horror", "year": 2001}
+    del loaded[3]
+    assert loaded.select({"genre": "drama"}).tolist() == [2]
+    assert loaded.select({"genre": "horror"}).tolist() == [1]
+    assert loaded._field_index is not None
+    assert loaded.select({"year": {"$lt": 2000}}).tolist() == [7]
+
+    # A field index that no longer matches the records is rebuilt instead of used
+    other = MetadataStore()
+    other[0] = {"genre": "scifi"}
+    other.save(str(tmp_path), keys=[0])
+    reloaded = MetadataStore.load(str(tmp_path))
+    assert reloaded.select({"genre": "scifi"}).tolist() == [0]
+    assert len(reloaded.field_index) == 1
+
+def test_long_and_nested_values_are_not_indexed(tmp_path):
+    store = MetadataStore()
+    text = "lorem ipsum " * 20
+    store.update({0: {"text": text, "tags": ["a"]}, 1: {"text": "short", "tags": ["b"]}, 2: {"tags": None}})
+    store.save(str(tmp_path))
+
+    loaded = MetadataStore.load(str(tmp_path))
+    assert loaded.select({"text": text}).tolist() == [0]
+    assert loaded.select({"tags": ["b"]}).tolist() == [1]
+    assert loaded.select({"text": None}).tolist() == [2]
+    assert loaded.select({"tags": {"$ne": ["a"]}}).tolist() == [1, 2]
+    index = loaded.field_index
+    assert set(index._postings["text"]) == {"short"} and set(index._postings.get("tags", {})) == {None}
+    # Posting lists stay memory-mapped until a write changes them
+    assert isinstance(index._postings["text"]["short"], np.memmap)
+
+def test_changing_a_record_dict_after_writing_it_does_not_reach_the_index():
+    db = VectorDB(dimension=4)
+    meta = {"genre": "scifi"}
+    idx = db.add(np.ones(4, dtype=np.float32), meta)
+    db.search(np.ones(4), k=1, filter_meta={"genre": "scifi"})
+    meta["genre"] = "drama"
+    db.get(idx)["genre"] = "drama"
+    assert db.search(np.ones(4), k=1, filter_meta={"genre": "drama"}) == []
+    db.delete([idx])
+    assert db.search(np.ones(4), k=1, filter_meta={"genre": "scifi"}) == []
+
+    # Removing a record that is not on its posting list is a no-op
+    index = MetadataIndex(lookup={}.__getitem__)
+    index.add(0, {"genre": "scifi"})
+    index.remove(0, {"genre": "drama", "year": 1999})
+    assert index.select({"genre": "scifi"}).tolist() == [0]
+
+def _corpus(n=3000, dimension=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dimension)).astype(np.float32)
+    metadata = [{"bucket": i % 100, "even": i % 2 == 0} for i in range(n)]
+    return vectors, metadata
+
+def _brute_force(vectors, query, rows, k):
+    scores = vectors[rows] @ query / (np.linalg.norm(vectors[rows], axis=1) * np.linalg.norm(query))
+    return rows[np.argsort(-scores)[:k]].tolist()
+
+@pytest.mark.parametrize("filter_meta", [
+    {"bucket": 7},                          # 1% selective: subset scoring
+    {"even": True},                         # 50%: masked scan
+    {"bucket": {"$in": [1, 2, 3]}, "even": False},
+])
+def test_filtered_search_is_exact_on_flat_index(filter_meta):
+    vectors, metadata = _corpus()
+    db = VectorDB(dimension=16)
+    db.add_many(vectors, metadata)
+    queries = np.random.default_rng(1).standard_normal((4, 16)).astype(np.float32)
+    rows = db.metadata_store.select(filter_meta)
+
+    for query, results in zip(queries, db.search_many(queries, k=10, filter_meta=filter_meta)):
+        assert [r["id"] for r in results] == _brute_force(vectors, query, rows, 10)
+    assert [r["id"] for r in db.search(queries[0], k=10, filter_meta=filter_meta)] == \
+        _brute_force(vectors, queries[0], rows, 10)
+
+def test_selective_filter_returns_k_matches_beyond_the_top_1000():
+    vectors, metadata = _corpus()
+    metadata[2999] = {"bucket": -1}
+    metadata[2998] = {"bucket": -1}
+    db = VectorDB(dimension=16)
+    db.add_many(vectors, metadata)
+    assert sorted(r["id"] for r in db.search(vectors[0], k=5, filter_meta={"bucket": -1})) == [2998, 2999]
+    assert db.search(vectors[0], k=5, filter_meta={"bucket": -2}) == []
+
+@pytest.mark.parametrize("index, params", [
+    ("ivf", {"nlist": 16, "nprobe": 4}),
+    ("hnsw", {"M": 8, "ef_construction": 40}),
+])
+def test_filtered_search_on_approximate_indexes(index, params):
+    vectors, metadata = _corpus(n=1500)
+    db = VectorDB(dimension=16, index=index, **params)
+    db.add_many(vectors, metadata)
+    if index == "ivf":
+        db.index.train()
+    for filter_meta, field, value in (({"bucket": 3}, "bucket", 3), ({"even": True}, "even", True)):
+        results = db.search(vectors[10], k=10, filter_meta=filter_meta)
+        assert len(results) == 10
+        assert all(r["metadata"][field] == value for r in results)
+    assert db.search(vectors[10], k=1, filter_meta={"even": True})[0]["id"] == 10
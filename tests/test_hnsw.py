@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from nanovec import VectorDB
+from nanovec.hnsw import HNSWIndex
+
+@pytest.mark.parametrize("metric", ["cosine", "l2"])
+def test_hnsw_recall(metric, recall):
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(600, 16)).astype(np.float32)
+    
+    db = VectorDB(dimension=16, metric=metric, index="hnsw", M=8, ef_construction=64, ef_search=64)
+    exact = VectorDB(dimension=16, metric=metric)
+    # Mix single and batched inserts
+    for vector in data[:100]:
+        db.add(vector.tolist(), {})
+    db.add_many(data[100:].tolist(), [{} for _ in range(500)])
+    exact.add_many(data.tolist(), [{} for _ in range(600)])
+    
+    assert db.index.entry_point >= 0
+    assert recall(db, exact, rng.normal(size=(20, 16)), k=10) >= 0.9
+    
+    # The graph never exceeds its degree bounds
+    assert (db.index._neighbors0[:600] >= 0).sum(axis=1).max() <= 16
+
+def test_hnsw_persistence(tmp_path):
+    rng = np.random.default_rng(1)
+    data = rng.normal(size=(200, 8)).astype(np.float32)
+    db = VectorDB(dimension=8, index="hnsw", M=6, ef_construction=32)
+    db.add_many(data.tolist(), [{"i": i} for i in range(200)])
+    
+    db.save(str(tmp_path / "hnsw_db"))
+    new_db = VectorDB.load(str(tmp_path / "hnsw_db"))
+    
+    assert isinstance(new_db.index, HNSWIndex)
+    assert new_db.index.M == 6
+    np.testing.assert_array_equal(new_db.index._neighbors0[:200], db.index._neighbors0[:200])
+    assert new_db.search(data[5].tolist(), k=3) == db.search(data[5].tolist(), k=3)
+    
+    # The reloaded graph keeps accepting inserts
+    idx = new_db.add((data[5] * 2).tolist(), {"i": "new"})
+    assert idx == 200
+    assert idx in {r['id'] for r in new_db.search(data[5].tolist(), k=3)}
+
+def test_compaction_repairs_the_graph_without_reinserting(monkeypatch, recall):
+    rng = np.random.default_rng(2)
+    data = rng.normal(size=(800, 16)).astype(np.float32)
+    db = VectorDB(dimension=16, index="hnsw", M=8, ef_construction=64, ef_search=64)
+    db.add_many(data.tolist(), [{} for _ in range(800)])
+    db.delete([i for i in range(800) if i % 2 == 0 or i < 200])
+
+    inserted = []
+    monkeypatch.setattr(HNSWIndex, "_insert", lambda index, node: inserted.append(node))
+    assert db.compact() is None
+    assert inserted == [] and len(db.index) == 300
+    monkeypatch.undo()
+
+    graph = db.index._neighbors0[:300]
+    assert graph.max() < 300 and (graph >= 0).sum(axis=1).min() > 0
+    assert db.index._upper[:db.index._upper_rows].max() < 300
+    assert db.index.entry_point < 300
+
+    exact = VectorDB(dimension=16)
+    exact.add_many(data.tolist(), [{} for _ in range(800)])
+    exact.delete([i for i in range(800) if i % 2 == 0 or i < 200])
+    assert recall(db, exact, rng.normal(size=(20, 16)), k=10) >= 0.9
+
+    # The renumbered graph keeps accepting inserts
+    idx = db.add(data[1].tolist(), {})
+    assert db.search(data[1].tolist(), k=1)[0]["id"] == idx
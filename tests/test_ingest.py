@@ -0,0 +1,63 @@
+import json
+import numpy as np
+import pytest
+from nanovec import VectorDB
+from nanovec.ingest import iter_vector_batches, open_vectors
+
+def test_ingest_npy_with_jsonl_metadata(tmp_path, vectors):
+    data = vectors(250)
+    np.save(tmp_path / "vectors.npy", data)
+    with open(tmp_path / "meta.jsonl", "w") as f:
+        for i in range(250):
+            f.write(json.dumps({"i": i}) + "\n")
+
+    db = VectorDB(dimension=8)
+    reports = []
+    stats = db.ingest(str(tmp_path / "vectors.npy"), metadata=str(tmp_path / "meta.jsonl"),
+                      batch_size=100, progress=reports.append)
+    assert stats["vectors"] == 250 and stats["batches"] == 3
+    assert [r["vectors"] for r in reports] == [100, 200, 250]
+    assert db.index.capacity == 250
+    np.testing.assert_array_equal(db.index.vectors, data)
+    assert db.get(199) == {"i": 199}
+
+def test_npz_members_are_memory_mapped(tmp_path, vectors):
+    data = vectors(40)
+    np.savez(tmp_path / "plain.npz", ids=np.arange(40), vectors=data)
+    np.savez_compressed(tmp_path / "packed.npz", emb=data)
+    mapped = open_vectors(tmp_path / "plain.npz")
+    assert isinstance(mapped, np.memmap)
+    np.testing.assert_array_equal(mapped, data)
+    np.testing.assert_array_equal(open_vectors(tmp_path / "packed.npz"), data)
+    with pytest.raises(KeyError):
+        open_vectors(tmp_path / "plain.npz", key="missing")
+
+    db = VectorDB(dimension=8)
+    db.ingest(str(tmp_path / "packed.npz"), key="emb")
+    assert len(db.index) == 40 and db.get(3) == {}
+
+def test_float32_batches_are_views(vectors):
+    data = vectors(10)
+    batches = list(iter_vector_batches(data, batch_size=4))
+    assert [b.shape[0] for b in batches] == [4, 4, 2]
+    assert all(np.shares_memory(b, data) for b in batches)
+    assert not np.shares_memory(next(iter_vector_batches(data.astype(np.float64), 4)), data)
+
+def test_ingest_from_generators(vectors):
+    data = vectors(30)
+
+    def rows():
+        for row in data[:15]:
+            yield row.tolist()
+        yield data[15:]
+
+    db = VectorDB(dimension=8, metric="l2")
+    stats = db.ingest(rows(), metadata=({"i": i} for i in range(30)), batch_size=8)
+    assert stats["vectors"] == 30
+    np.testing.assert_array_equal(db.index.vectors, data)
+    assert db.search(data[20].tolist(), k=1)[0]["metadata"] == {"i": 20}
+
+    with pytest.raises(ValueError):
+        db.ingest(data, metadata=[{}] * 5)
+    with pytest.raises(ValueError):
+        db.ingest(data[:2], metadata=[{}] * 3)
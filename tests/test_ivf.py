@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from nanovec import VectorDB
+from nanovec.exceptions import EmptyIndexError
+from nanovec.ivf import IVFIndex
+
+def _clustered(rng, n, dimension, centers=20):
+    means = rng.normal(size=(centers, dimension)) * 5
+    return (means[rng.integers(centers, size=n)] + rng.normal(size=(n, dimension))).astype(np.float32)
+
+def test_untrained_index_is_exact():
+    index = IVFIndex(dimension=2, nlist=4)
+    index.add(np.array([1.0, 0.0], dtype=np.float32))
+    index.add(np.array([0.0, 1.0], dtype=np.float32))
+    
+    assert not index.is_trained
+    assert index.search(np.array([1.0, 0.0], dtype=np.float32), k=1)[0][0] == 0
+    with pytest.raises(EmptyIndexError):
+        index.train()
+
+def test_failed_training_leaves_no_rows_behind(monkeypatch):
+    with pytest.raises(ValueError):
+        VectorDB(dimension=8, index="ivf", nlist=50, train_size=10)
+
+    rng = np.random.default_rng(0)
+    db = VectorDB(dimension=8, index="ivf", nlist=2, train_size=10)
+    db.add_many(rng.normal(size=(9, 8)).tolist(), [{} for _ in range(9)])
+    db.delete([3])
+    def fail(*args, **kwargs):
+        raise RuntimeError("training failed")
+    monkeypatch.setattr(db.index, "train", fail)
+    with pytest.raises(RuntimeError):
+        db.add(rng.normal(size=8).tolist())
+    assert len(db.index) == 9 and db.index.deleted.tolist() == [i == 3 for i in range(9)]
+
+    monkeypatch.undo()
+    idx = db.add(rng.normal(size=8).tolist(), {"i": 9})
+    assert db.index.is_trained and len(db.index) == 10
+    assert db.search(db.index.vectors[9].tolist(), k=1)[0]["id"] == idx
+
+def test_ivf_recall_and_incremental_adds(recall):
+    rng = np.random.default_rng(0)
+    data = _clustered(rng, 3000, 16)
+    
+    db = VectorDB(dimension=16, index="ivf", nlist=16, nprobe=4)
+    db.add_many(data[:2000].tolist(), [{"i": i} for i in range(2000)])
+    assert db.index.is_trained
+    
+    # Vectors added after training land in the inverted lists too
+    db.add_many(data[2000:].tolist(), [{"i": i} for i in range(2000, 3000)])
+    assert sum(len(db.index.list_ids(l)) for l in range(16)) == 3000
+    
+    exact = VectorDB(dimension=16)
+    exact.add_many(data.tolist(), [{} for _ in range(3000)])
+    
+    queries = data[rng.choice(3000, size=20, replace=False)] + 0.1
+    assert recall(db, exact, queries, k=10) >= 0.9
+
+def test_ivf_persistence(tmp_path):
+    rng = np.random.default_rng(1)
+    data = _clustered(rng, 500, 8)
+    db = VectorDB(dimension=8, metric="l2", index="ivf", nlist=8, nprobe=2)
+    db.add_many(data.tolist(), [{"i": i} for i in range(500)])
+    
+    db.save(str(tmp_path / "ivf_db"))
+    new_db = VectorDB.load(str(tmp_path / "ivf_db"))
+    
+    assert isinstance(new_db.index, IVFIndex)
+    assert new_db.index.nprobe == 2
+    np.testing.assert_array_equal(new_db.index.centroids, db.index.centroids)
+    np.testing.assert_array_equal(new_db.index.assignments, db.index.assignments)
+    assert new_db.search(data[7].tolist(), k=3) == db.search(data[7].tolist(), k=3)
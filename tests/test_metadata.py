@@ -0,0 +1,60 @@
+import json
+from nanovec.metadata import MetadataStore
+
+def test_store_roundtrip_and_overlay(tmp_path):
+    store = MetadataStore()
+    store[0] = {"name": "a"}
+    store[1] = {"name": "b", "tags": [1, 2]}
+    store[5] = {}
+    store.save(str(tmp_path))
+    
+    for mmap_mode in (False, True):
+        loaded = MetadataStore.load(str(tmp_path), mmap_mode=mmap_mode)
+        assert len(loaded) == 3
+        assert list(loaded) == [0, 1, 5]
+        assert loaded[1] == {"name": "b", "tags": [1, 2]}
+        assert 5 in loaded and 2 not in loaded
+        assert loaded.get(2) is None
+        
+        # Writes shadow the on-disk records until the next save
+        loaded[1] = {"name": "B"}
+        loaded[7] = {"name": "c"}
+        del loaded[0]
+        assert len(loaded) == 3
+        assert dict(loaded.items()) == {1: {"name": "B"}, 5: {}, 7: {"name": "c"}}
+    
+    loaded.save(str(tmp_path))
+    reloaded = MetadataStore.load(str(tmp_path))
+    assert dict(reloaded.items()) == {1: {"name": "B"}, 5: {}, 7: {"name": "c"}}
+
+def test_records_are_decoded_lazily(tmp_path, monkeypatch):
+    store = MetadataStore()
+    for i in range(100):
+        store[i] = {"i": i}
+    store.save(str(tmp_path))
+    
+    loaded = MetadataStore.load(str(tmp_path), mmap_mode=True)
+    decoded = []
+    original_loads = json.loads
+    monkeypatch.setattr(json, "loads", lambda blob, **kwargs: decoded.append(blob) or original_loads(blob, **kwargs))
+    assert len(loaded) == 100
+    assert loaded[42] == {"i": 42}
+    assert len(decoded) == 1
+
+def test_attach_counts_only_the_new_ids(tmp_path, monkeypatch):
+    store = MetadataStore()
+    for step, keys in enumerate([[0, 1, 2], [2, 3], [1, 4]]):
+        part = MetadataStore()
+        part.update({key: {"step": step} for key in keys})
+        (tmp_path / str(step)).mkdir()
+        part.save(str(tmp_path / str(step)))
+    store.attach(str(tmp_path / "0"))
+    del store[0]
+    store[3] = {"step": "memory"}
+    # Attaching never enumerates the keys already on disk
+    monkeypatch.setattr(MetadataStore, "_disk_keys", None)
+    store.attach(str(tmp_path / "1"))
+    store.attach(str(tmp_path / "2"))
+    monkeypatch.undo()
+    assert len(store) == 4
+    assert dict(store.items()) == {1: {"step": 2}, 2: {"step": 1}, 3: {"step": 1}, 4: {"step": 2}}
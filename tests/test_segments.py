@@ -0,0 +1,200 @@
+import os
+import json
+import numpy as np
+import pytest
+from nanovec import VectorDB, NanoVecError
+from nanovec.hnsw import HNSWIndex
+from nanovec.segments import MANIFEST_FILE
+
+def _manifest(path):
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+def test_flush_writes_only_new_rows(tmp_path, vectors):
+    path = str(tmp_path / "db")
+    db = VectorDB.open(path, dimension=8)
+    db.add_many(vectors(100), [{"i": i} for i in range(100)])
+    assert db.flush() is not None
+    db.add_many(vectors(10, seed=1), [{"i": 100 + i} for i in range(10)])
+    db.save(path)
+    assert db.flush() is None
+
+    segments = _manifest(path)["segments"]
+    assert [(s["start"], s["count"]) for s in segments] == [(0, 100), (100, 10)]
+    assert np.load(os.path.join(path, segments[1]["name"], "vectors.npy")).shape == (10, 8)
+    assert db.get(105) == {"i": 105}
+    db.close()
+
+    loaded = VectorDB.load(path)
+    assert len(loaded.index) == 110
+    assert loaded.get(42) == {"i": 42}
+    np.testing.assert_array_equal(loaded.index.vectors[100:], vectors(10, seed=1))
+    loaded.close()
+
+def test_unflushed_writes_are_replayed_from_the_log(tmp_path, vectors):
+    path = str(tmp_path / "db")
+    data = vectors(20)
+    db = VectorDB.open(path, dimension=8, metric="l2")
+    db.add_many(data[:15], [{"i": i} for i in range(15)])
+    db.flush()
+    for i in range(15, 20):
+        db.add(data[i].tolist(), {"i": i})
+    # Simulate a crash: no flush or close, plus a torn record at the log tail
+    wal_path = os.path.join(path, _manifest(path)["wal"])
+    with open(wal_path, "ab") as f:
+        f.write(b"\x01\x00\x00")
+
+    reopened = VectorDB.open(path)
+    assert reopened.metric == "l2"
+    assert len(reopened.index) == 20
+    np.testing.assert_array_equal(reopened.index.vectors, data)
+    assert reopened.get(19) == {"i": 19}
+    assert reopened.search(data[17].tolist(), k=1)[0]["id"] == 17
+
+    # Appends continue after the replayed rows
+    assert reopened.add(data[0].tolist(), {"i": 20}) == 20
+    reopened.close()
+    assert len(VectorDB.open(path).index) == 21
+
+def test_compaction_merges_segments(tmp_path, vectors):
+    path = str(tmp_path / "db")
+    db = VectorDB.open(path, dimension=8)
+    for batch in range(4):
+        db.add_many(vectors(25, seed=batch), [{"batch": batch}] * 25)
+        db.flush()
+    old_names = [s["name"] for s in _manifest(path)["segments"]]
+
+    db.compact(background=True).join()
+    segments = _manifest(path)["segments"]
+    assert [(s["start"], s["count"]) for s in segments] == [(0, 100)]
+    assert not any(os.path.exists(os.path.join(path, name)) for name in old_names)
+
+    # The open database keeps serving reads after its segments were merged, from the merged segment only
+    assert db.get(60) == {"batch": 2}
+    parts = db.metadata_store._parts
+    assert [part.path for part in parts] == [os.path.join(path, segments[0]["name"])]
+    assert len(db.metadata_store) == 100
+    db.close()
+
+    reopened = VectorDB.open(path)
+    assert reopened.get(99) == {"batch": 3}
+    np.testing.assert_array_equal(reopened.index.vectors[25:50], vectors(25, seed=1))
+
+def test_compactions_do_not_overlap(tmp_path, vectors):
+    path = str(tmp_path / "db")
+    db = VectorDB.open(path, dimension=8)
+    for batch in range(4):
+        db.add_many(vectors(25, seed=batch), [{"batch": batch}] * 25)
+        db.flush()
+    db.delete(list(range(10)))
+    db.flush()
+
+    first = db._segments.compact(db, background=True)
+    second = db._segments.compact(db, background=True)
+    db._segments.compact(db)
+    first.join()
+    second.join()
+
+    segments = _manifest(path)["segments"]
+    assert [(s["start"], s["count"]) for s in segments] == [(0, 90)]
+    assert sorted(name for name in os.listdir(path) if name.startswith("seg-")) == [segments[0]["name"]]
+    assert len(db.metadata_store._parts) == 1 and len(db.metadata_store) == 90 and db.get(5) is None
+    db.close()
+    assert VectorDB.open(path).get(50) == {"batch": 2}
+
+def test_segmented_and_snapshot_layouts_do_not_mix(tmp_path):
+    db = VectorDB(dimension=4)
+    db.add([1, 0, 0, 0], {"a": 1})
+    with pytest.raises(NanoVecError):
+        db.flush()
+    db.save(str(tmp_path / "snapshot"))
+    with pytest.raises(NanoVecError):
+        VectorDB.open(str(tmp_path / "snapshot"), dimension=4)
+    with pytest.raises(FileNotFoundError):
+        VectorDB.open(str(tmp_path / "missing"))
+
+    segmented = VectorDB.open(str(tmp_path / "segmented"), dimension=4)
+    with pytest.raises(NanoVecError):
+        db.save(str(tmp_path / "segmented"))
+    segmented.close()
+
+@pytest.mark.parametrize("index,params", [
+    ("flat", {}),
+    ("hnsw", {}),
+    ("flat", {"codec": "sq8", "codec_train_size": 20}),
+])
+def test_deletes_and_updates_survive_reopen_and_compaction(tmp_path, index, params, vectors):
+    path = str(tmp_path / "db")
+    data = vectors(50)
+    db = VectorDB.open(path, dimension=8, index=index, **params)
+    db.add_many(data, [{"i": i} for i in range(50)])
+    db.flush()
+    db.delete([0, 1, 2])
+    db.update(10, vector=data[0].tolist())
+    db.update(11, metadata={"i": -11})
+    db.upsert(2, data[2].tolist(), {"i": 2})
+    db.flush()
+    # Unflushed: replayed from the log
+    db.delete([20])
+    db.upsert(60, data[20].tolist(), {"i": 60})
+
+    def check(reopened):
+        assert len(reopened.ids) == 48
+        assert reopened.get(0) is None and reopened.get(20) is None
+        assert reopened.get(11) == {"i": -11}
+        assert reopened.search(data[0].tolist(), k=1)[0]["id"] == 10
+        assert reopened.search(data[20].tolist(), k=1)[0]["id"] == 60
+        assert reopened.ids.next_id == 61
+
+    # Read-only look while db is still open, as after a crash
+    check(VectorDB.open(path))
+    db.compact()
+    assert _manifest(path)["segments"][0]["count"] == 48
+    db.close()
+    reopened = VectorDB.open(path)
+    check(reopened)
+    reopened.close()
+
+def test_open_restores_the_hnsw_graph_from_the_checkpoint(tmp_path, monkeypatch, vectors):
+    path = str(tmp_path / "db")
+    db = VectorDB.open(path, dimension=8, index="hnsw")
+    db.add_many(vectors(200), [{}] * 200)
+    db.flush()
+    assert _manifest(path)["checkpoint"]["segments"] == 1
+    # Too little growth for a new checkpoint: this segment is replayed on open
+    db.add_many(vectors(20, seed=1), [{}] * 20)
+    db.flush()
+    db.add_many(vectors(5, seed=2), [{}] * 5)
+    queries = vectors(10, seed=3)
+    expected = [[r["id"] for r in results] for results in db.search_many(queries, k=5)]
+    db.close()
+    assert _manifest(path)["checkpoint"]["segments"] == 1
+
+    inserted = []
+    original_insert = HNSWIndex._insert
+    monkeypatch.setattr(HNSWIndex, "_insert", lambda index, node: inserted.append(node) or original_insert(index, node))
+    reopened = VectorDB.open(path)
+    assert inserted == list(range(200, 225))
+    assert [[r["id"] for r in results] for results in reopened.search_many(queries, k=5)] == expected
+
+    # compact checkpoints everything, so the merged segment stays covered
+    reopened.delete(list(range(100)))
+    reopened.compact()
+    manifest = _manifest(path)
+    assert manifest["checkpoint"]["segments"] == len(manifest["segments"]) == 1
+    reopened.close()
+    assert len([name for name in os.listdir(path) if name.startswith("ckpt-")]) == 1
+
+def test_lossy_codes_survive_reopen_unchanged(tmp_path, vectors):
+    path = str(tmp_path / "db")
+    db = VectorDB.open(path, dimension=8, codec="pq", pq_m=2, codec_train_size=256)
+    db.add_many(vectors(300), [{}] * 300)
+    db.flush()
+    codes = db.index.codes.copy()
+    db.close()
+
+    for _ in range(2):
+        reopened = VectorDB.open(path)
+        np.testing.assert_array_equal(reopened.index.codes, codes)
+        reopened.compact()
+        reopened.close()
@@ -0,0 +1,98 @@
+import time
+import threading
+import pytest
+from nanovec import ShardedVectorDB, VectorDB, DimensionMismatchError
+from nanovec import sharded
+from nanovec.sharded import _OPEN_SHARDS
+
+def test_sharded_search_matches_single_database(tmp_path, vectors):
+    data = vectors(300)
+    metadata = [{"i": i, "even": i % 2 == 0} for i in range(300)]
+    sharded = ShardedVectorDB(str(tmp_path / "db"), dimension=8, num_shards=4, processes=0)
+    assert sharded.add_many(data, metadata) == list(range(300))
+    sharded.commit()
+    single = VectorDB(dimension=8)
+    single.add_many(data, metadata)
+
+    queries = vectors(5, seed=1)
+    for filter_meta in (None, {"even": True}):
+        expected = single.search_many(queries, k=7, filter_meta=filter_meta)
+        results = sharded.search_many(queries, k=7, filter_meta=filter_meta)
+        assert [[r["id"] for r in rs] for rs in results] == [[r["id"] for r in rs] for rs in expected]
+    assert sharded.search(data[123].tolist(), k=1)[0] == {"id": 123, "score": pytest.approx(1.0), "metadata": metadata[123]}
+    assert sharded.get(123) == metadata[123]
+    with pytest.raises(DimensionMismatchError):
+        sharded.search([1.0, 2.0], k=1)
+    sharded.close()
+
+def test_sharded_writes_persist(tmp_path, vectors):
+    path = str(tmp_path / "db")
+    data = vectors(40)
+    db = ShardedVectorDB(path, dimension=8, num_shards=3, metric="l2", processes=0)
+    db.add_many(data, [{"i": i} for i in range(40)])
+    db.commit()
+    assert db.search(data[5].tolist(), k=1)[0]["id"] == 5
+    opened = [_OPEN_SHARDS[db._shard_path(shard)][1] for shard in range(3)]
+    assert db.delete([5, 6, 100]) == 2
+    # Searches see the last commit
+    assert db.search(data[5].tolist(), k=1)[0]["id"] == 5
+    db.commit()
+    assert db.search(data[5].tolist(), k=1)[0]["id"] != 5
+    # Only the shards of IDs 5 and 6 were rewritten and reopened
+    reopened_shards = [_OPEN_SHARDS[db._shard_path(shard)][1] is not opened[shard] for shard in range(3)]
+    assert reopened_shards == [True, False, True]
+    db.close()
+
+    reopened = ShardedVectorDB(path, processes=0)
+    assert (reopened.num_shards, reopened.metric) == (3, "l2")
+    assert len(reopened) == 38 and reopened.get(5) is None
+    assert reopened.add(data[5].tolist(), {"i": 40}) == 40
+    reopened.commit()
+    assert reopened.search(data[5].tolist(), k=1)[0]["id"] == 40
+    reopened.close()
+    with pytest.raises(FileNotFoundError):
+        ShardedVectorDB(str(tmp_path / "missing"))
+
+def test_sharded_search_in_worker_processes(tmp_path, vectors):
+    data = vectors(200)
+    db = ShardedVectorDB(str(tmp_path / "db"), dimension=8, num_shards=2, processes=2)
+    db.add_many(data, [{"i": i} for i in range(200)])
+    db.commit()
+    assert [r["id"] for r in db.search(data[17].tolist(), k=1)] == [17]
+    # Workers reopen shards changed by a later commit
+    db.delete([17])
+    db.commit()
+    assert db.search(data[17].tolist(), k=1)[0]["id"] != 17
+    db.close()
+
+def test_searches_wait_for_a_pending_commit(tmp_path, vectors, monkeypatch):
+    data = vectors(20)
+    db = ShardedVectorDB(str(tmp_path / "db"), dimension=8, num_shards=2, processes=0)
+    db.add_many(data, [{"i": i} for i in range(20)])
+    db.commit()
+
+    search_shard = sharded._search_shard
+    release, events = threading.Event(), []
+    def slow_search_shard(*args):
+        events.append("search")
+        release.wait(5)
+        return search_shard(*args)
+    monkeypatch.setattr(sharded, "_search_shard", slow_search_shard)
+
+    first = threading.Thread(target=db.search, args=(data[0],))
+    first.start()
+    while not events:
+        time.sleep(0.001)
+    db.delete([3])
+    committer = threading.Thread(target=lambda: (db.commit(), events.append("commit")))
+    committer.start()
+    while db._commits == 0:
+        time.sleep(0.001)
+    # A search started while the commit waits runs after it instead of delaying it further
+    second = threading.Thread(target=db.search, args=(data[0],))
+    second.start()
+    release.set()
+    for thread in (first, committer, second):
+        thread.join(5)
+    assert events == ["search", "search", "commit", "search", "search"]
+    db.close()